@@ -4,7 +4,7 @@ import sys
 import argparse
 
 import compass
-from compass import list, setup, clean, suite, run
+from compass import list, setup, clean, suite, run, perf
 
 
 def main():
@@ -23,6 +23,7 @@ The available compass commands are:
     clean   Clean up a test case
     suite   Manage a regression test suite
     run     Run a suite, test case or step
+    perf    Show performance trends and regressions
 
  To get help on an individual command, run:
 
@@ -44,7 +45,8 @@ The available compass commands are:
                 'setup': setup.main,
                 'clean': clean.main,
                 'suite': suite.main,
-                'run': run.main}
+                'run': run.main,
+                'perf': perf.main}
     if args.command not in commands:
         print('Unrecognized command {}'.format(args.command))
         parser.print_help()
@@ -0,0 +1,393 @@
+import os
+import hashlib
+import json
+import inspect
+import shutil
+import tempfile
+
+import mpas_tools
+
+import compass
+
+
+def get_step_cache_key(step):
+    """
+    Get a key for the outputs of a step in the step-output cache: a hash of
+    the step's class and the source code of its module, the ``compass`` and
+    ``mpas_tools`` versions, the contents of all files in the ``compass``
+    package (so edits to shared helpers in a development checkout are taken
+    into account), the step attributes and resolved config sections that the
+    step has declared determine its outputs, and the names and contents of its
+    input files
+
+    Parameters
+    ----------
+    step : compass.Step
+        A step that has been set up
+
+    Returns
+    -------
+    key : str or None
+        The key for the step's outputs, or ``None`` if the step does not use
+        the cache, caching is disabled, or the step has outputs outside its
+        work directory
+    """
+    if step.output_cache is None or _get_cache_directory(step) is None:
+        return None
+
+    for output in step.outputs:
+        if _get_relative_path(step, output) is None:
+            return None
+
+    hasher = hashlib.sha256()
+    step_class = type(step)
+    _update(hasher, '{}.{}'.format(step_class.__module__,
+                                   step_class.__qualname__))
+    _update(hasher, compass.__version__)
+    _update(hasher, mpas_tools.__version__)
+    _update(hasher, _get_package_hash())
+    _update_file(hasher, inspect.getsourcefile(step_class))
+
+    for attribute in step.output_cache['attributes']:
+        _update(hasher, '{} = {!r}'.format(attribute,
+                                           getattr(step, attribute)))
+
+    config = step.config
+    for section in step.output_cache['config_sections']:
+        _update(hasher, '[{}]'.format(section))
+        if config.has_section(section):
+            for option, value in config.items(section):
+                _update(hasher, '{} = {}'.format(option, value))
+
+    for input_file in step.inputs:
+        _update(hasher, os.path.basename(input_file))
+        _update(hasher, _get_file_hash(input_file))
+
+    for output in step.outputs:
+        _update(hasher, _get_relative_path(step, output))
+
+    return hasher.hexdigest()
+
+
+def restore_step_outputs(step, key):
+    """
+    Hard link (or copy) the outputs of a step from the step-output cache into
+    the step's work directory, if they have been cached
+
+    Parameters
+    ----------
+    step : compass.Step
+        A step that has been set up
+
+    key : str
+        The key for the step's outputs from
+        :py:func:`compass.cache.get_step_cache_key()`
+
+    Returns
+    -------
+    restored : bool
+        Whether the outputs were found in the cache and restored
+    """
+    entry = os.path.join(_get_cache_directory(step), key)
+    if not os.path.isdir(entry):
+        return False
+
+    sources = list()
+    for output in step.outputs:
+        source = os.path.join(entry, _get_relative_path(step, output))
+        if not os.path.exists(source):
+            return False
+        sources.append(source)
+
+    for source, output in zip(sources, step.outputs):
+        if os.path.lexists(output):
+            os.remove(output)
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        _link_or_copy(source, output)
+
+    return True
+
+
+def store_step_outputs(step, key):
+    """
+    Add the outputs of a step that has been run to the step-output cache,
+    unless they are already there
+
+    Parameters
+    ----------
+    step : compass.Step
+        A step that has been run
+
+    key : str
+        The key for the step's outputs from
+        :py:func:`compass.cache.get_step_cache_key()`
+    """
+    cache_dir = _get_cache_directory(step)
+    entry = os.path.join(cache_dir, key)
+    if os.path.isdir(entry):
+        return
+
+    # the outputs are gathered in a temporary directory that is renamed to
+    # the entry at the end, so other processes never see a partial entry
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix='.{}.'.format(key))
+    for output in step.outputs:
+        target = os.path.join(tmp_dir, _get_relative_path(step, output))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _link_or_copy(output, target)
+
+    try:
+        os.rename(tmp_dir, entry)
+    except OSError:
+        # another process has added the same entry in the meantime
+        shutil.rmtree(tmp_dir)
+
+
+def remove_linked_outputs(step):
+    """
+    Remove outputs of a step that are hard links (e.g. to entries in the
+    step-output cache), so running the step cannot modify them in place
+
+    Parameters
+    ----------
+    step : compass.Step
+        A step that is about to be run
+    """
+    for output in step.outputs:
+        if os.path.isfile(output) and not os.path.islink(output) and \
+                os.stat(output).st_nlink > 1:
+            os.remove(output)
+
+
+def get_step_fingerprint(step):
+    """
+    Get a fingerprint of everything that a step's run depends on: a hash of
+    the step's class and the source code of its module, the ``compass`` and
+    ``mpas_tools`` versions, the contents of all files in the ``compass``
+    package (so edits to shared helpers in a development checkout are taken
+    into account), the resolved config options (except those in
+    ``[test_case]``, which only control which steps run), the step's namelist
+    and streams files and the contents of its input files
+
+    Parameters
+    ----------
+    step : compass.Step
+        A step that has been set up
+
+    Returns
+    -------
+    fingerprint : str
+        The fingerprint of the step
+    """
+    hasher = hashlib.sha256()
+    step_class = type(step)
+    _update(hasher, '{}.{}'.format(step_class.__module__,
+                                   step_class.__qualname__))
+    _update(hasher, compass.__version__)
+    _update(hasher, mpas_tools.__version__)
+    _update(hasher, _get_package_hash())
+    _update_file(hasher, inspect.getsourcefile(step_class))
+
+    config = step.config
+    for section in config.sections():
+        if section == 'test_case':
+            continue
+        _update(hasher, '[{}]'.format(section))
+        for option, value in config.items(section):
+            _update(hasher, '{} = {}'.format(option, value))
+
+    for filename in list(step.namelist_data) + list(step.streams_data):
+        _update(hasher, filename)
+        filename = os.path.join(step.work_dir, filename)
+        if os.path.exists(filename):
+            _update_file(hasher, filename)
+
+    for input_file in step.inputs:
+        _update(hasher, input_file)
+        _update(hasher, _get_file_hash(input_file))
+
+    return hasher.hexdigest()
+
+
+def write_step_fingerprint(step, fingerprint=None):
+    """
+    Record the fingerprint of a step that has run successfully, along with the
+    size and modification time of each of its outputs
+
+    Parameters
+    ----------
+    step : compass.Step
+        A step that has been run
+
+    fingerprint : str, optional
+        The fingerprint of the step computed before it ran, so the inputs
+        don't need to be hashed again
+    """
+    if fingerprint is None:
+        fingerprint = get_step_fingerprint(step)
+    record = {'fingerprint': fingerprint,
+              'outputs': {output: _get_file_stats(output)
+                          for output in step.outputs}}
+    with open(os.path.join(step.work_dir, _fingerprint_filename), 'w') as f:
+        json.dump(record, f, indent=2)
+
+
+def check_step_fingerprint(step, fingerprint=None):
+    """
+    Check if a step is up to date: its fingerprint is unchanged since it last
+    ran successfully and none of its outputs are missing or have changed
+
+    Parameters
+    ----------
+    step : compass.Step
+        A step that has been set up
+
+    fingerprint : str, optional
+        The current fingerprint of the step, if it has already been computed
+
+    Returns
+    -------
+    up_to_date : bool
+        Whether the step can be skipped
+    """
+    filename = os.path.join(step.work_dir, _fingerprint_filename)
+    if not os.path.exists(filename):
+        return False
+    with open(filename) as f:
+        record = json.load(f)
+
+    outputs = record['outputs']
+    if set(outputs) != set(step.outputs):
+        return False
+    for output in step.outputs:
+        if not os.path.exists(output) or \
+                _get_file_stats(output) != outputs[output]:
+            return False
+
+    if fingerprint is None:
+        fingerprint = get_step_fingerprint(step)
+    return record['fingerprint'] == fingerprint
+
+
+def remove_step_fingerprint(step):
+    """
+    Remove the record of a step's fingerprint (e.g. before running the step
+    again) so the step is not considered up to date if it fails
+
+    Parameters
+    ----------
+    step : compass.Step
+        A step that has been set up
+    """
+    filename = os.path.join(step.work_dir, _fingerprint_filename)
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+# the file in a step's work directory where its fingerprint is recorded
+_fingerprint_filename = 'step_fingerprint.json'
+
+
+def _get_cache_directory(step):
+    """
+    Get the absolute path of the step-output cache, or ``None`` if caching is
+    disabled
+    """
+    config = step.config
+    if not config.has_option('step_cache', 'directory'):
+        return None
+    directory = config.get('step_cache', 'directory')
+    if directory == '':
+        return None
+    return os.path.abspath(os.path.join(step.base_work_dir, directory))
+
+
+def _get_package_hash():
+    """
+    Get a hash of the names and contents of all files in the ``compass``
+    package, computed once per process
+    """
+    package_dir = os.path.dirname(os.path.abspath(compass.__file__))
+    if package_dir not in _package_hashes:
+        hasher = hashlib.sha256()
+        for root, dirs, files in os.walk(package_dir):
+            dirs[:] = sorted(directory for directory in dirs
+                             if directory != '__pycache__')
+            for filename in sorted(files):
+                filename = os.path.join(root, filename)
+                _update(hasher, os.path.relpath(filename, package_dir))
+                _update_file(hasher, filename)
+        _package_hashes[package_dir] = hasher.hexdigest()
+
+    return _package_hashes[package_dir]
+
+
+# hashes of the contents of the compass package, indexed by its location
+_package_hashes = dict()
+
+
+def _get_relative_path(step, output):
+    """
+    Get the path of an output relative to the step's work directory, or
+    ``None`` if it is outside the work directory
+    """
+    path = os.path.relpath(output, step.work_dir)
+    if path == os.pardir or path.startswith(os.pardir + os.sep):
+        return None
+    return path
+
+
+def _update(hasher, text):
+    """ Add a line of text to a hash """
+    hasher.update('{}\n'.format(text).encode('utf-8'))
+
+
+def _update_file(hasher, filename):
+    """ Add the contents of a file to a hash, a block at a time """
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(_hash_block_size), b''):
+            hasher.update(block)
+
+
+def _get_file_hash(filename):
+    """
+    Get a hash of the contents of a file, computed only once per process
+    unless the file's size or modification time changes, so that inputs
+    shared by a step's fingerprint and cache key are only read once
+    """
+    filename = os.path.abspath(filename)
+    stats = _get_file_stats(filename)
+    if filename in _file_hashes and _file_hashes[filename][0] == stats:
+        return _file_hashes[filename][1]
+
+    hasher = hashlib.sha256()
+    _update_file(hasher, filename)
+    file_hash = hasher.hexdigest()
+    _file_hashes[filename] = (stats, file_hash)
+    return file_hash
+
+
+# hashes of the contents of input files, along with their size and
+# modification time, indexed by their absolute paths
+_file_hashes = dict()
+
+
+def _get_file_stats(filename):
+    """ Get the size and modification time of a file """
+    stats = os.stat(filename)
+    return [stats.st_size, stats.st_mtime_ns]
+
+
+# the number of bytes of a file to hash at once
+_hash_block_size = 1048576
+
+
+def _link_or_copy(source, target):
+    """
+    Hard link a file, falling back on a copy if the two paths are on
+    different file systems
+    """
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
@@ -3,7 +3,7 @@ import sys
 import os
 import shutil
 
-from compass.mpas_cores import get_mpas_cores
+from compass.mpas_cores import get_test_case_index, get_test_cases
 from compass import provenance
 
 
@@ -29,29 +29,29 @@ def clean_cases(tests=None, numbers=None, work_dir=None):
     if work_dir is None:
         work_dir = os.getcwd()
 
-    mpas_cores = get_mpas_cores()
-    all_test_cases = dict()
-    for mpas_core in mpas_cores:
-        for test_group in mpas_core.test_groups.values():
-            for test_case in test_group.test_cases.values():
-                all_test_cases[test_case.path] = test_case
+    # only the test groups of the requested test cases are imported
+    all_paths = [test_case['path'] for test_case in get_test_case_index()]
 
-    test_cases = dict()
+    paths = list()
     if numbers is not None:
-        keys = list(all_test_cases)
         for number in numbers:
-            if number >= len(keys):
+            if number >= len(all_paths):
                 raise ValueError('test number {} is out of range.  There are '
-                                 'only {} tests.'.format(number, len(keys)))
-            path = keys[number]
-            test_cases[path] = all_test_cases[path]
+                                 'only {} tests.'.format(number,
+                                                         len(all_paths)))
+            path = all_paths[number]
+            if path not in paths:
+                paths.append(path)
 
     if tests is not None:
         for path in tests:
-            if path not in all_test_cases:
+            if path not in all_paths:
                 raise ValueError('Test case with path {} is not in '
                                  'the list of test cases'.format(path))
-            test_cases[path] = all_test_cases[path]
+            if path not in paths:
+                paths.append(path)
+
+    test_cases = get_test_cases(paths)
 
     provenance.write(work_dir, test_cases)
 
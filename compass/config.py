@@ -1,6 +1,5 @@
 import os
 import configparser
-from io import StringIO
 from importlib import resources
 
 
@@ -20,13 +19,11 @@ def duplicate_config(config):
         Deep copy of configuration options
     """
 
-    config_string = StringIO()
-    config.write(config_string)
-    # We must reset the buffer to make it ready for reading.
-    config_string.seek(0)
     new_config = configparser.ConfigParser(
         interpolation=configparser.ExtendedInterpolation())
-    new_config.read_file(config_string)
+    # copy the raw (uninterpolated) values directly, rather than writing them
+    # out and parsing them again
+    new_config.read_dict(_get_raw_options(config))
     return new_config
 
 
@@ -51,12 +48,43 @@ def add_config(config, package, config_file, exception=True):
     """
     try:
         with resources.path(package, config_file) as path:
-            config.read(path)
+            add_config_file(config, path)
     except (ModuleNotFoundError, FileNotFoundError, TypeError):
         if exception:
             raise
 
 
+def add_config_file(config, filename):
+    """
+    Add the contents of a config file to the current config parser.  Each
+    file is only parsed once per process (and again if it changes), so
+    setting up many test cases that share config files is fast.  As with
+    ``config.read()``, the file is skipped if it doesn't exist.
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+        Configuration options
+
+    filename : str
+        The path of the config file to add
+    """
+    try:
+        stats = os.stat(filename)
+    except OSError:
+        return
+
+    key = os.path.abspath(filename)
+    version = (stats.st_size, stats.st_mtime_ns)
+    if key not in _config_file_cache or \
+            _config_file_cache[key][0] != version:
+        parser = configparser.ConfigParser(interpolation=None)
+        parser.read(filename)
+        _config_file_cache[key] = (version, _get_raw_options(parser))
+
+    config.read_dict(_config_file_cache[key][1], source=key)
+
+
 def ensure_absolute_paths(config):
     """
     make sure all paths in the paths, namelists and streams sections are
@@ -98,3 +126,21 @@ def get_source_file(source_path, source, config):
     source_file = '{}/{}'.format(source_path, source)
     source_file = os.path.abspath(source_file)
     return source_file
+
+
+# the raw options from each config file that has been parsed, with the size
+# and modification time of the file when it was parsed
+_config_file_cache = dict()
+
+
+def _get_raw_options(config):
+    """
+    Get a dictionary of sections, each a dictionary of the raw (uninterpolated)
+    values of the options in that section
+    """
+    options = dict()
+    if len(config.defaults()) > 0:
+        options[config.default_section] = dict(config.defaults())
+    for section in config.sections():
+        options[section] = dict(config.items(section, raw=True))
+    return options
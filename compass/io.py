@@ -1,11 +1,18 @@
 import os
 import tempfile
+import hashlib
+import json
+import threading
+import fcntl
+import contextlib
 import requests
 import progressbar
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 
 
-def download(url, dest_path, config, exceptions=True):
+def download(url, dest_path, config, exceptions=True, session=None,
+             progress=True):
     """
     Download a file from a URL to the given path or path name
 
@@ -25,15 +32,20 @@ def download(url, dest_path, config, exceptions=True):
     exceptions : bool, optional
         Whether to raise exceptions when the download fails
 
+    session : requests.Session, optional
+        A session to use for the download, allowing connections to be reused
+        across downloads.  By default, a new session is created.
+
+    progress : bool, optional
+        Whether to display a progress bar
+
     Returns
     -------
     dest_path : str
         The resulting file name if the download was successful, or None if not
     """
 
-    in_file_name = os.path.basename(urlparse(url).path)
     dest_path = os.path.abspath(dest_path)
-    out_file_name = os.path.basename(dest_path)
 
     do_download = config.getboolean('download', 'download')
     check_size = config.getboolean('download', 'check_size')
@@ -48,9 +60,9 @@ def download(url, dest_path, config, exceptions=True):
     if not check_size and os.path.exists(dest_path):
         return dest_path
 
-    session = requests.Session()
-    if not verify:
-        session.verify = False
+    if _in_manifest(url, dest_path):
+        # we already checked this file against the remote file
+        return dest_path
 
     # dest_path contains full path, so we need to make the relevant
     # subdirectories if they do not exist already
@@ -60,77 +72,73 @@ def download(url, dest_path, config, exceptions=True):
     except OSError:
         pass
 
-    try:
-        response = session.get(url, stream=True)
-        totalSize = response.headers.get('content-length')
-    except requests.exceptions.RequestException:
-        if exceptions:
-            raise
-        else:
-            print('  {} could not be reached!'.format(url))
-            return None
+    if session is None:
+        session = requests.Session()
+        if not verify:
+            session.verify = False
 
-    try:
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
-        if exceptions:
-            raise
-        else:
-            print('ERROR while downloading {}:'.format(in_file_name))
-            print(e)
-            return None
+    with _file_lock(dest_path):
+        # another process may have downloaded the file while we waited
+        if not check_size and os.path.exists(dest_path):
+            return dest_path
+        if _in_manifest(url, dest_path):
+            return dest_path
 
-    if totalSize is None:
-        # no content length header
-        if not os.path.exists(dest_path):
-            with open(dest_path, 'wb') as f:
-                print('Downloading {}...'.format(in_file_name))
-                try:
-                    f.write(response.content)
-                except requests.exceptions.RequestException:
-                    if exceptions:
-                        raise
-                    else:
-                        print('  {} failed!'.format(in_file_name))
-                        return None
-                else:
-                    print('  {} done.'.format(in_file_name))
-    else:
-        # we can do the download in chunks and use a progress bar, yay!
+        return _download_locked(url, dest_path, session, exceptions,
+                                progress)
 
-        totalSize = int(totalSize)
-        if os.path.exists(dest_path) and \
-                totalSize == os.path.getsize(dest_path):
-            # we already have the file, so just return
-            return dest_path
 
-        if out_file_name == in_file_name:
-            file_names = in_file_name
+def download_files(downloads, config, workers=None):
+    """
+    Download several files concurrently, sharing a pool of connections.  Each
+    file is only downloaded once even if it appears more than once.
+
+    Parameters
+    ----------
+    downloads : list of tuple
+        The URL (including file name) and the path (including file name) where
+        each downloaded file should be saved
+
+    config : configparser.ConfigParser
+        Configuration options for downloading
+
+    workers : int, optional
+        The number of files to download at once.  By default, the ``workers``
+        config option in the ``download`` section is used.
+    """
+    unique = dict()
+    for url, dest_path in downloads:
+        dest_path = os.path.abspath(dest_path)
+        if dest_path not in unique:
+            unique[dest_path] = url
+
+    if workers is None:
+        if config.has_option('download', 'workers'):
+            workers = config.getint('download', 'workers')
         else:
-            file_names = '{} as {}'.format(in_file_name, out_file_name)
-        print('Downloading {} ({})...'.format(file_names,
-                                              _sizeof_fmt(totalSize)))
-        widgets = [progressbar.Percentage(), ' ', progressbar.Bar(),
-                   ' ', progressbar.ETA()]
-        bar = progressbar.ProgressBar(widgets=widgets,
-                                      max_value=totalSize).start()
-        size = 0
-        with open(dest_path, 'wb') as f:
-            try:
-                for data in response.iter_content(chunk_size=4096):
-                    size += len(data)
-                    f.write(data)
-                    bar.update(size)
-                bar.finish()
-            except requests.exceptions.RequestException:
-                if exceptions:
-                    raise
-                else:
-                    print('  {} failed!'.format(in_file_name))
-                    return None
-            else:
-                print('  {} done.'.format(in_file_name))
-    return dest_path
+            workers = 1
+    workers = max(1, min(workers, len(unique)))
+
+    if len(unique) == 0:
+        return
+
+    session = requests.Session()
+    if not config.getboolean('download', 'verify'):
+        session.verify = False
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers,
+                                            pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    # progress bars from different threads would be garbled
+    progress = workers == 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(download, url, dest_path, config,
+                                   session=session, progress=progress)
+                   for dest_path, url in unique.items()]
+        for future in futures:
+            future.result()
+    session.close()
 
 
 def symlink(target, link_name, overwrite=True):
@@ -195,3 +203,332 @@ def _sizeof_fmt(num, suffix='B'):
             return "%3.1f%s%s" % (num, unit, suffix)
         num /= 1024.0
     return "%.1f%s%s" % (num, 'Yi', suffix)
+
+
+# the number of bytes to read from a download at a time
+_chunk_size = 1024 * 1024
+
+# the name of the file in each download directory where the size and checksum
+# of downloaded files are recorded
+_manifest_name = 'compass_download_manifest.json'
+
+_manifest_lock = threading.Lock()
+
+
+def _download_locked(url, dest_path, session, exceptions, progress):
+    """
+    Download a file once the lock on the destination has been acquired,
+    resuming a previous partial download if there is one
+    """
+    in_file_name = os.path.basename(urlparse(url).path)
+    out_file_name = os.path.basename(dest_path)
+    part_path = _get_part_path(dest_path)
+
+    if os.path.exists(part_path):
+        offset = os.path.getsize(part_path)
+    else:
+        offset = 0
+
+    try:
+        response = _get_response(session, url, offset)
+        if response.status_code == 416:
+            # the partial file is no good (e.g. it is already complete or
+            # the remote file is now smaller), so start over
+            response.close()
+            os.remove(part_path)
+            offset = 0
+            response = _get_response(session, url, offset)
+    except requests.exceptions.RequestException:
+        if exceptions:
+            raise
+        else:
+            print('  {} could not be reached!'.format(url))
+            return None
+
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        if exceptions:
+            raise
+        else:
+            print('ERROR while downloading {}:'.format(in_file_name))
+            print(e)
+            return None
+
+    if response.status_code == 206:
+        # Content-Range: bytes <start>-<end>/<total>, where the total may be
+        # "*" (or the header may be missing) if the size is unknown
+        content_range = response.headers.get('content-range')
+        if content_range is None:
+            totalSize = None
+        else:
+            totalSize = content_range.split('/')[-1]
+        if totalSize == '*':
+            totalSize = None
+    else:
+        # the server sent the whole file, so any partial file is useless
+        offset = 0
+        totalSize = response.headers.get('content-length')
+
+    if totalSize is not None:
+        totalSize = int(totalSize)
+        if os.path.exists(dest_path) and \
+                totalSize == os.path.getsize(dest_path):
+            # we already have the file, so just record it and return
+            response.close()
+            _add_to_manifest(url, dest_path)
+            return dest_path
+
+    if out_file_name == in_file_name:
+        file_names = in_file_name
+    else:
+        file_names = '{} as {}'.format(in_file_name, out_file_name)
+
+    if totalSize is None:
+        # no content length header
+        print('Downloading {}...'.format(file_names))
+        bar = None
+    else:
+        # we can do the download in chunks and use a progress bar, yay!
+        if offset > 0:
+            print('Resuming download of {} at {} of {}...'.format(
+                file_names, _sizeof_fmt(offset), _sizeof_fmt(totalSize)))
+        else:
+            print('Downloading {} ({})...'.format(file_names,
+                                                  _sizeof_fmt(totalSize)))
+        if progress:
+            widgets = [progressbar.Percentage(), ' ', progressbar.Bar(),
+                       ' ', progressbar.ETA()]
+            bar = progressbar.ProgressBar(widgets=widgets,
+                                          max_value=totalSize).start()
+            bar.update(offset)
+        else:
+            bar = None
+
+    try:
+        checksum = _write_partial(
+            part_path, response.iter_content(chunk_size=_chunk_size),
+            offset, totalSize, bar)
+        if bar is not None:
+            bar.finish()
+    except (requests.exceptions.RequestException, OSError):
+        if exceptions:
+            raise
+        else:
+            print('  {} failed!'.format(in_file_name))
+            return None
+
+    expected = _get_expected_checksum(url, dest_path, totalSize)
+    if expected is not None and checksum != expected:
+        if offset > 0:
+            # the remote file may have changed since the partial download,
+            # so we need to start over
+            print('  {} does not match its previous checksum, downloading '
+                  'again...'.format(in_file_name))
+            os.remove(part_path)
+            return _download_locked(url, dest_path, session, exceptions,
+                                    progress)
+        print('  Warning: {} has changed since it was last '
+              'downloaded.'.format(in_file_name))
+
+    os.replace(part_path, dest_path)
+    print('  {} done.'.format(in_file_name))
+    _add_to_manifest(url, dest_path, checksum)
+    return dest_path
+
+
+def _get_response(session, url, offset):
+    """
+    Start streaming a download, asking for the part of the file after
+    ``offset`` if a partial download exists
+    """
+    if offset > 0:
+        headers = {'Range': 'bytes={}-'.format(offset)}
+    else:
+        headers = None
+    return session.get(url, stream=True, headers=headers)
+
+
+def _get_part_path(dest_path):
+    """
+    The path of the partial file that a download is written to until it is
+    complete
+    """
+    directory, filename = os.path.split(dest_path)
+    return os.path.join(directory, '.{}.part'.format(filename))
+
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """
+    Hold an exclusive lock on a hidden lock file next to ``path`` so that
+    other threads and processes (e.g. several calls to ``compass setup``
+    sharing a database) do not write to the same file at the same time.  The
+    lock file is removed when the lock is released.  If the lock file cannot
+    be created (e.g. in a read-only database), no lock is held.
+    """
+    directory, filename = os.path.split(path)
+    lock_path = os.path.join(directory, '.{}.lock'.format(filename))
+    while True:
+        try:
+            lock_file = open(lock_path, 'a')
+        except OSError:
+            yield
+            return
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # the lock file may have been removed by the previous holder while we
+        # waited, in which case we need to lock the new one instead
+        try:
+            locked = os.path.samestat(os.fstat(lock_file.fileno()),
+                                      os.stat(lock_path))
+        except OSError:
+            locked = False
+        if locked:
+            break
+        lock_file.close()
+
+    try:
+        yield
+    finally:
+        # remove the lock file while we still hold the lock so that nobody
+        # else can lock it in the meantime
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+def _get_expected_checksum(url, dest_path, size):
+    """
+    The checksum recorded in the manifest for a previous download of the same
+    URL with the same size, if any
+    """
+    manifest = _read_manifest(os.path.dirname(dest_path))
+    entry = manifest.get(os.path.basename(dest_path))
+    if entry is None or entry['url'] != url or entry['size'] != size:
+        return None
+    return entry['sha256']
+
+
+def _write_partial(part_path, chunks, offset, size, bar=None):
+    """
+    Append chunks of data to a partial download starting at ``offset`` and
+    check that the result has the expected size, returning the sha256
+    checksum of the complete file.  The partial file is kept if the download
+    is interrupted so it can be resumed.
+    """
+    checksum = hashlib.sha256()
+    if offset > 0:
+        with open(part_path, 'rb') as f:
+            for data in iter(lambda: f.read(_chunk_size), b''):
+                checksum.update(data)
+        mode = 'ab'
+    else:
+        mode = 'wb'
+
+    written = offset
+    with open(part_path, mode) as f:
+        for data in chunks:
+            f.write(data)
+            checksum.update(data)
+            written += len(data)
+            if bar is not None:
+                bar.update(written)
+
+    if size is not None and written != size:
+        raise OSError('Download of {} is incomplete ({} of {} bytes), set up '
+                      'again to resume'.format(part_path, written, size))
+
+    return checksum.hexdigest()
+
+
+def _write_atomic(dest_path, chunks):
+    """
+    Write chunks of data to a temporary file that is renamed to
+    ``dest_path`` once it is complete, returning the sha256 checksum
+    """
+    directory = os.path.dirname(dest_path)
+    checksum = hashlib.sha256()
+    handle, temp_path = tempfile.mkstemp(
+        dir=directory, prefix='.{}.'.format(os.path.basename(dest_path)),
+        suffix='.part')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            for data in chunks:
+                f.write(data)
+                checksum.update(data)
+        # mkstemp creates files that only the owner can read
+        mask = os.umask(0)
+        os.umask(mask)
+        os.chmod(temp_path, 0o666 & ~mask)
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return checksum.hexdigest()
+
+
+def _compute_checksum(filename):
+    """ Compute the sha256 checksum of a file """
+    checksum = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for data in iter(lambda: f.read(_chunk_size), b''):
+            checksum.update(data)
+    return checksum.hexdigest()
+
+
+def _read_manifest(directory):
+    """ Read the download manifest in a directory (if any) """
+    manifest_path = os.path.join(directory, _manifest_name)
+    if not os.path.exists(manifest_path):
+        return dict()
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # an unreadable manifest just means files need to be checked again
+        return dict()
+
+
+def _in_manifest(url, dest_path):
+    """
+    Whether a file has already been downloaded from the given URL and is
+    unchanged since it was recorded in the manifest
+    """
+    if not os.path.exists(dest_path):
+        return False
+    manifest = _read_manifest(os.path.dirname(dest_path))
+    filename = os.path.basename(dest_path)
+    if filename not in manifest:
+        return False
+    entry = manifest[filename]
+    stat = os.stat(dest_path)
+    return (entry['url'] == url and entry['size'] == stat.st_size and
+            entry['mtime'] == stat.st_mtime)
+
+
+def _add_to_manifest(url, dest_path, checksum=None):
+    """
+    Record the URL, size, modification time and checksum of a downloaded
+    file in the manifest in its directory
+    """
+    if checksum is None:
+        checksum = _compute_checksum(dest_path)
+    directory = os.path.dirname(dest_path)
+    stat = os.stat(dest_path)
+    entry = {'url': url, 'size': stat.st_size, 'mtime': stat.st_mtime,
+             'sha256': checksum}
+    manifest_path = os.path.join(directory, _manifest_name)
+    with _manifest_lock, _file_lock(manifest_path):
+        manifest = _read_manifest(directory)
+        manifest[os.path.basename(dest_path)] = entry
+        try:
+            _write_atomic(manifest_path,
+                          [json.dumps(manifest, indent=1).encode('utf-8')])
+        except OSError:
+            # we may not have write access to a shared database, in which
+            # case the file will just be checked again next time
+            pass
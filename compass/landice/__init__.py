@@ -1,11 +1,4 @@
 from compass.mpas_core import MpasCore
-from compass.landice.tests.circular_shelf import CircularShelf
-from compass.landice.tests.dome import Dome
-from compass.landice.tests.eismint2 import Eismint2
-from compass.landice.tests.enthalpy_benchmark import EnthalpyBenchmark
-from compass.landice.tests.greenland import Greenland
-from compass.landice.tests.hydro_radial import HydroRadial
-from compass.landice.tests.thwaites import Thwaites
 
 
 class Landice(MpasCore):
@@ -13,16 +6,26 @@ class Landice(MpasCore):
     The collection of all test case for the MALI core
     """
 
-    def __init__(self):
+    def __init__(self, test_groups=None):
         """
         Construct the collection of MALI test cases
+
+        Parameters
+        ----------
+        test_groups : list of str, optional
+            The names of the test groups to construct.  By default, all test
+            groups are constructed
         """
         super().__init__(name='landice')
 
-        self.add_test_group(CircularShelf(mpas_core=self))
-        self.add_test_group(Dome(mpas_core=self))
-        self.add_test_group(Eismint2(mpas_core=self))
-        self.add_test_group(EnthalpyBenchmark(mpas_core=self))
-        self.add_test_group(Greenland(mpas_core=self))
-        self.add_test_group(HydroRadial(mpas_core=self))
-        self.add_test_group(Thwaites(mpas_core=self))
+        self.add_test_groups({
+            'circular_shelf':
+                'compass.landice.tests.circular_shelf.CircularShelf',
+            'dome': 'compass.landice.tests.dome.Dome',
+            'eismint2': 'compass.landice.tests.eismint2.Eismint2',
+            'enthalpy_benchmark':
+                'compass.landice.tests.enthalpy_benchmark.EnthalpyBenchmark',
+            'greenland': 'compass.landice.tests.greenland.Greenland',
+            'hydro_radial': 'compass.landice.tests.hydro_radial.HydroRadial',
+            'thwaites': 'compass.landice.tests.thwaites.Thwaites'},
+            names=test_groups)
@@ -1,5 +1,4 @@
 import netCDF4
-import matplotlib.pyplot as plt
 import numpy as np
 
 from compass.step import Step
@@ -68,6 +67,8 @@ def visualize_circular_shelf(config, logger, filename):
     filename : str
         file to visualize
     """
+    import matplotlib.pyplot as plt
+
     section = config['circular_shelf_viz']
 
     time_slice = section.getint('time_slice')
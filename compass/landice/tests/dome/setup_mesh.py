@@ -44,6 +44,9 @@ class SetupMesh(Step):
         self.add_output_file(filename='graph.info')
         self.add_output_file(filename='landice_grid.nc')
 
+        # the mesh is identical across dome test cases with the same mesh type
+        self.use_output_cache(attributes=['mesh_type'])
+
     # no setup() method is needed
 
     def run(self):
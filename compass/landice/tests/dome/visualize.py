@@ -1,6 +1,5 @@
 import numpy
 import netCDF4
-import matplotlib.pyplot as plt
 
 from compass.step import Step
 
@@ -71,6 +70,8 @@ def visualize_dome(config, logger, filename):
     filename : str
         file to visualize
     """
+    import matplotlib.pyplot as plt
+
     section = config['dome_viz']
 
     time_slice = section.getint('time_slice')
@@ -27,6 +27,9 @@ class SetupMesh(Step):
         self.add_output_file(filename='graph.info')
         self.add_output_file(filename='landice_grid.nc')
 
+        # the mesh is identical across eismint2 test cases
+        self.use_output_cache()
+
     # no setup() method is needed
 
     def run(self):
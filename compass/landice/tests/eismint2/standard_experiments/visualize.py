@@ -1,8 +1,6 @@
 import datetime
 import netCDF4
-import matplotlib.pyplot as plt
 import numpy as np
-from scipy.interpolate import griddata
 
 from compass.step import Step
 
@@ -61,6 +59,7 @@ def visualize_eismint2(config, logger, experiment):
     experiment : {'a', 'b', 'c', 'd', 'f', 'g'}
         The name of the experiment
     """
+    import matplotlib.pyplot as plt
 
     section = config['eismint2_viz']
     save_images = section.getboolean('save_images')
@@ -454,6 +453,8 @@ def _xtime_get_year(xtime):
 
 def _contour_mpas(field, nCells, xCell, yCell, contour_levs=None):
     """Contours irregular MPAS data on cells"""
+    import matplotlib.pyplot as plt
+    from scipy.interpolate import griddata
 
     if contour_levs is None:
         contour_levs = np.array([0])
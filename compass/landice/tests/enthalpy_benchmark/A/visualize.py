@@ -1,7 +1,5 @@
 import numpy as np
 from netCDF4 import Dataset
-import matplotlib.pyplot as plt
-from scipy.io import loadmat
 
 from compass.step import Step
 
@@ -35,6 +33,9 @@ class Visualize(Step):
         """
         Run this step of the test case
         """
+        import matplotlib.pyplot as plt
+        from scipy.io import loadmat
+
         logger = self.logger
         section = self.config['enthalpy_benchmark_viz']
 
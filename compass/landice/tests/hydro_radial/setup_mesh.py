@@ -48,6 +48,10 @@ class SetupMesh(Step):
         self.add_output_file(filename='graph.info')
         self.add_output_file(filename='landice_grid.nc')
 
+        # the mesh is identical across hydro_radial test cases with the same
+        # initial condition
+        self.use_output_cache(attributes=['initial_condition'])
+
     # no setup() method is needed
 
     def run(self):
@@ -1,6 +1,5 @@
 import numpy as np
 import netCDF4
-import matplotlib.pyplot as plt
 
 from compass.step import Step
 
@@ -64,6 +63,8 @@ def visualize_hydro_radial(config, logger):
     logger : logging.Logger
         A logger for output from the step
     """
+    import matplotlib.pyplot as plt
+
     section = config['hydro_radial_viz']
 
     time_slice = section.getint('time_slice')
@@ -103,7 +104,8 @@ def visualize_hydro_radial(config, logger):
     centerY = unique_ys[len(unique_ys) // 2]
     logger.info("number of ys={}, center y index={}, center Y value={}".format(
         len(unique_ys), len(unique_ys) // 2, centerY))
-    ind = np.nonzero(yCell[:] == centerY)
+    ind = np.nonzero(yCell[:] == centerY)[0]
+    ind = ind[np.argsort(xCell[ind])]
     x = xCell[ind] / 1000.0
 
     logger.info("start plotting.")
@@ -143,15 +145,13 @@ def visualize_hydro_radial(config, logger):
     # plot how close to SS we are
     fig = plt.figure(2, facecolor='w')
     ax1 = fig.add_subplot(211)
-    for i in ind:
-        plt.plot(days / 365.0, f.variables['waterThickness'][:, i])
+    plt.plot(days / 365.0, f.variables['waterThickness'][:, ind])
     plt.xlabel('Years since start')
     plt.ylabel('water thickness (m)')
     plt.grid(True)
 
     fig.add_subplot(212, sharex=ax1)
-    for i in ind:
-        plt.plot(days / 365.0, f.variables['effectivePressure'][:, i] / 1.0e6)
+    plt.plot(days / 365.0, f.variables['effectivePressure'][:, ind] / 1.0e6)
     plt.xlabel('Years since start')
     plt.ylabel('effective pressure (MPa)')
     plt.grid(True)
@@ -5,7 +5,7 @@ import os
 from importlib import resources
 from importlib.resources import contents
 
-from compass.mpas_cores import get_mpas_cores
+from compass.mpas_cores import get_mpas_core_names, get_test_case_index
 
 
 def list_cases(test_expr=None, number=None, verbose=False):
@@ -24,24 +24,19 @@ def list_cases(test_expr=None, number=None, verbose=False):
         Whether to print details of each test or just the subdirectories.
         When applied to suites, verbose will list the tests in the suite.
     """
-    mpas_cores = get_mpas_cores()
+    # the index lets us list test cases without importing them
+    test_cases = get_test_case_index()
 
     if number is None:
         print('Testcases:')
 
-    test_cases = []
-    for mpas_core in mpas_cores:
-        for test_group in mpas_core.test_groups.values():
-            for test_case in test_group.test_cases.values():
-                test_cases.append(test_case)
-
     for test_number, test_case in enumerate(test_cases):
         print_number = False
         print_test = False
         if number is not None:
             if number == test_number:
                 print_test = True
-        elif test_expr is None or re.match(test_expr, test_case.path):
+        elif test_expr is None or re.match(test_expr, test_case['path']):
             print_test = True
             print_number = True
 
@@ -53,11 +48,11 @@ def list_cases(test_expr=None, number=None, verbose=False):
                 prefix = ''
             if verbose:
                 lines = list()
-                to_print = {'path': test_case.path,
-                            'name': test_case.name,
-                            'MPAS core': test_case.mpas_core.name,
-                            'test group': test_case.test_group.name,
-                            'subdir': test_case.subdir}
+                to_print = {'path': test_case['path'],
+                            'name': test_case['name'],
+                            'MPAS core': test_case['mpas_core'],
+                            'test group': test_case['test_group'],
+                            'subdir': test_case['subdir']}
                 for key in to_print:
                     key_string = '{}: '.format(key).ljust(15)
                     lines.append('{}{}{}'.format(prefix, key_string,
@@ -65,16 +60,16 @@ def list_cases(test_expr=None, number=None, verbose=False):
                     if print_number:
                         prefix = '      '
                 lines.append('{}steps:'.format(prefix))
-                for step in test_case.steps.values():
-                    if step.name == step.subdir:
-                        lines.append('{} - {}'.format(prefix, step.name))
+                for step in test_case['steps']:
+                    if step['name'] == step['subdir']:
+                        lines.append('{} - {}'.format(prefix, step['name']))
                     else:
-                        lines.append('{} - {}: {}'.format(prefix, step.name,
-                                                          step.subdir))
+                        lines.append('{} - {}: {}'.format(
+                            prefix, step['name'], step['subdir']))
                 lines.append('')
                 print_string = '\n'.join(lines)
             else:
-                print_string = '{}{}'.format(prefix, test_case.path)
+                print_string = '{}{}'.format(prefix, test_case['path'])
 
             print(print_string)
 
@@ -89,7 +84,7 @@ def list_machines():
 
 def list_suites(cores=None, verbose=False):
     if cores is None:
-        cores = [mpas_core.name for mpas_core in get_mpas_cores()]
+        cores = get_mpas_core_names()
     print('Suites:')
     for core in cores:
         try:
@@ -1,4 +1,5 @@
 import os
+import numpy
 import xarray
 
 from mpas_tools.logging import check_call
@@ -119,36 +120,64 @@ def make_graph_file(mesh_filename, graph_filename='graph.info',
         nEdgesOnCell = ds.nEdgesOnCell.values
         cellsOnCell = ds.cellsOnCell.values - 1
         if weight_field is not None:
-            if weight_field in ds:
+            if weight_field not in ds:
                 raise ValueError('weight_field {} not found in {}'.format(
                     weight_field, mesh_filename))
             weights = ds[weight_field].values
         else:
             weights = None
 
-    nEdges = 0
-    for i in range(nCells):
-        for j in range(nEdgesOnCell[i]):
-            if cellsOnCell[i][j] != -1:
-                nEdges = nEdges + 1
+    maxEdges = cellsOnCell.shape[1]
+    valid = numpy.arange(maxEdges) < nEdgesOnCell[:, numpy.newaxis]
 
+    nEdges = int(numpy.count_nonzero(
+        numpy.logical_and(valid, cellsOnCell != -1)))
     nEdges = nEdges/2
 
+    valid = numpy.logical_and(valid, cellsOnCell >= 0)
+
     with open(graph_filename, 'w+') as graph:
         if weights is None:
             graph.write('{} {}\n'.format(nCells, nEdges))
-
-            for i in range(nCells):
-                for j in range(0, nEdgesOnCell[i]):
-                    if cellsOnCell[i][j] >= 0:
-                        graph.write('{} '.format(cellsOnCell[i][j]+1))
-                graph.write('\n')
         else:
             graph.write('{} {} 010\n'.format(nCells, nEdges))
+            weights = weights.astype(int)
+
+        # write the adjacency in blocks of cells to limit memory usage
+        for start in range(0, nCells, _graph_block_size):
+            end = min(start + _graph_block_size, nCells)
+            if weights is None:
+                block_weights = None
+            else:
+                block_weights = weights[start:end]
+            graph.write(_graph_lines(cellsOnCell[start:end, :] + 1,
+                                     valid[start:end, :], block_weights))
+
 
-            for i in range(nCells):
-                graph.write('{} '.format(int(weights[i])))
-                for j in range(0, nEdgesOnCell[i]):
-                    if cellsOnCell[i][j] >= 0:
-                        graph.write('{} '.format(cellsOnCell[i][j] + 1))
-                graph.write('\n')
+# the number of cells per block of the graph file to write at once
+_graph_block_size = 100000
+
+
+def _graph_lines(neighbors, valid, weights):
+    """
+    Get the lines of a graph file for a block of cells, each with an optional
+    weight followed by the (1-based) indices of valid neighbors, each followed
+    by a space
+    """
+    maxEdges = valid.shape[1]
+    counts = numpy.count_nonzero(valid, axis=1)
+    values = neighbors[valid]
+    if weights is None:
+        prefix = ''
+    else:
+        prefix = '{} '
+        # put the weight of each cell before its neighbors
+        starts = numpy.cumsum(counts) - counts
+        values = numpy.insert(values, starts, weights)
+
+    # a format string for each possible number of neighbors
+    line_formats = numpy.array(
+        ['{}{}\n'.format(prefix, '{} ' * count)
+         for count in range(maxEdges + 1)], dtype=object)
+
+    return ''.join(line_formats[counts]).format(*values.tolist())
@@ -1,3 +1,6 @@
+import importlib
+
+
 class MpasCore:
     """
     The base class for housing all the tests for a given MPAS core, such as
@@ -36,3 +39,27 @@ class MpasCore:
             the test group to add
         """
         self.test_groups[test_group.name] = test_group
+
+    def add_test_groups(self, test_groups, names=None):
+        """
+        Import and add test groups to the MPAS core.  Test groups are only
+        imported if they are added, since they may depend on many other
+        packages.
+
+        Parameters
+        ----------
+        test_groups : dict
+            The test groups that belong to the MPAS core, with their names as
+            keys and the full python paths of their classes as values
+
+        names : list of str, optional
+            The names of the test groups to add.  By default, all test groups
+            are added
+        """
+        for name, class_path in test_groups.items():
+            if names is not None and name not in names:
+                continue
+            module_name, class_name = class_path.rsplit('.', 1)
+            test_group_class = getattr(importlib.import_module(module_name),
+                                       class_name)
+            self.add_test_group(test_group_class(mpas_core=self))
@@ -1,6 +1,14 @@
-# import new MPAS cores here
-from compass.landice import Landice
-from compass.ocean import Ocean
+import os
+import json
+import hashlib
+import importlib
+
+import compass
+
+
+# add new MPAS cores here, with the full python paths of their classes
+_mpas_cores = {'landice': 'compass.landice.Landice',
+               'ocean': 'compass.ocean.Ocean'}
 
 
 def get_mpas_cores():
@@ -12,6 +20,149 @@ def get_mpas_cores():
     mpas_cores : list of compass.MpasCore
         A list of MPAS cores containing all available tests
     """
-    # add new MPAS cores here
-    mpas_cores = [Landice(), Ocean()]
+    mpas_cores = [_get_mpas_core_class(name)() for name in _mpas_cores]
     return mpas_cores
+
+
+def get_mpas_core_names():
+    """
+    Get the names of all MPAS cores without importing their tests
+
+    Returns
+    -------
+    names : list of str
+        The names of the MPAS cores
+    """
+    return list(_mpas_cores)
+
+
+def get_test_case_index():
+    """
+    Get an index of all test cases without importing their test groups.  The
+    index is generated by constructing all test cases the first time it is
+    needed and whenever a file in the ``compass`` package changes, and is
+    cached in the user's cache directory in between.
+
+    Returns
+    -------
+    index : list of dict
+        Each test case in the order they are listed, with the test case's
+        ``path``, ``name``, ``mpas_core``, ``test_group``, ``subdir`` and
+        ``steps``, a list of the ``name`` and ``subdir`` of each step
+    """
+    fingerprint = _get_package_fingerprint()
+    filename = _get_index_filename()
+    try:
+        with open(filename) as f:
+            record = json.load(f)
+        if record['fingerprint'] == fingerprint:
+            return record['test_cases']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = list()
+    for mpas_core in get_mpas_cores():
+        for test_group in mpas_core.test_groups.values():
+            for test_case in test_group.test_cases.values():
+                steps = [{'name': step.name, 'subdir': step.subdir}
+                         for step in test_case.steps.values()]
+                index.append({'path': test_case.path,
+                              'name': test_case.name,
+                              'mpas_core': mpas_core.name,
+                              'test_group': test_group.name,
+                              'subdir': test_case.subdir,
+                              'steps': steps})
+
+    # the cache is just an optimization, so it doesn't matter if it can't be
+    # written
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp_filename = '{}.{}'.format(filename, os.getpid())
+        with open(tmp_filename, 'w') as f:
+            json.dump({'fingerprint': fingerprint, 'test_cases': index}, f)
+        os.replace(tmp_filename, filename)
+    except OSError:
+        pass
+
+    return index
+
+
+def get_test_cases(paths):
+    """
+    Construct the test cases with the given paths, importing only the MPAS
+    cores and test groups they belong to
+
+    Parameters
+    ----------
+    paths : list of str
+        The relative paths of test cases, as listed by ``compass list``
+
+    Returns
+    -------
+    test_cases : dict of compass.TestCase
+        A dictionary of test cases, with the paths as keys in the order given
+    """
+    index = {entry['path']: entry for entry in get_test_case_index()}
+
+    test_groups = dict()
+    for path in paths:
+        if path not in index:
+            raise ValueError('Test case with path {} is not in the list of '
+                             'test cases'.format(path))
+        entry = index[path]
+        mpas_core = entry['mpas_core']
+        if mpas_core not in test_groups:
+            test_groups[mpas_core] = list()
+        if entry['test_group'] not in test_groups[mpas_core]:
+            test_groups[mpas_core].append(entry['test_group'])
+
+    all_test_cases = dict()
+    for name, names in test_groups.items():
+        mpas_core = _get_mpas_core_class(name)(test_groups=names)
+        for test_group in mpas_core.test_groups.values():
+            for test_case in test_group.test_cases.values():
+                all_test_cases[test_case.path] = test_case
+
+    test_cases = dict()
+    for path in paths:
+        test_cases[path] = all_test_cases[path]
+    return test_cases
+
+
+def _get_mpas_core_class(name):
+    """ Import the class for an MPAS core """
+    module_name, class_name = _mpas_cores[name].rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _get_package_fingerprint():
+    """
+    Get a hash of the ``compass`` version and the names, sizes and
+    modification times of the files in the ``compass`` package, which changes
+    whenever test cases might have changed
+    """
+    package_dir = os.path.dirname(os.path.abspath(compass.__file__))
+    hasher = hashlib.sha256()
+    hasher.update(compass.__version__.encode('utf-8'))
+    for root, dirs, files in os.walk(package_dir):
+        dirs[:] = sorted(directory for directory in dirs
+                         if directory != '__pycache__')
+        for filename in sorted(files):
+            stats = os.stat(os.path.join(root, filename))
+            hasher.update('{} {} {}\n'.format(
+                os.path.relpath(os.path.join(root, filename), package_dir),
+                stats.st_size, stats.st_mtime_ns).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def _get_index_filename():
+    """
+    Get the name of the file where the test-case index is cached, unique to
+    the location of the ``compass`` package
+    """
+    cache_dir = os.environ.get('XDG_CACHE_HOME',
+                               os.path.join(os.path.expanduser('~'), '.cache'))
+    package_dir = os.path.dirname(os.path.abspath(compass.__file__))
+    package_hash = hashlib.sha1(package_dir.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, 'compass',
+                        'test_cases_{}.json'.format(package_hash[:16]))
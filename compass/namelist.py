@@ -1,3 +1,4 @@
+import os
 from importlib import resources
 
 
@@ -31,30 +32,67 @@ def parse_replacements(package, namelist):
 
 def ingest(defaults_filename):
     """ Read the defaults file """
-    with open(defaults_filename, 'r') as f:
-        lines = f.readlines()
+    return _parse(defaults_filename)
 
-    namelist = dict()
-    record = None
-    for line in lines:
-        if '&' in line:
-            record = line.strip('&').strip('\n').strip()
-            namelist[record] = dict()
-        elif '=' in line:
-            if record is not None:
-                opt, val = line.strip('\n').split('=')
-                namelist[record][opt.strip()] = val.strip()
 
-    return namelist
+def read_defaults(defaults_filename):
+    """
+    Read a defaults namelist file.  Parsed files are cached by their path,
+    size and modification time, so each defaults file is only parsed once no
+    matter how many steps use it.
+
+    Parameters
+    ----------
+    defaults_filename : str
+        The name of the namelist file to read
+
+    Returns
+    -------
+    namelist : dict
+        A dictionary of namelist records, each a dictionary of options.  This
+        is a copy that the caller is free to modify.
+    """
+    stats = os.stat(defaults_filename)
+    key = os.path.abspath(defaults_filename)
+    version = (stats.st_size, stats.st_mtime_ns)
+    if key not in _defaults_cache or _defaults_cache[key][0] != version:
+        _defaults_cache[key] = (version, _parse(defaults_filename))
+
+    namelist = _defaults_cache[key][1]
+    return {record: dict(options) for record, options in namelist.items()}
 
 
 def replace(namelist, replacements):
-    """ Replace entries in the namelist using the replacements dict """
-    new = dict(namelist)
-    for record in new:
-        for key in replacements:
-            if key in new[record]:
-                new[record][key] = replacements[key]
+    """
+    Replace entries in the namelist using the replacements dict
+
+    Parameters
+    ----------
+    namelist : dict
+        A dictionary of namelist records, each a dictionary of options
+
+    replacements : dict
+        A dictionary of new values for namelist options
+
+    Returns
+    -------
+    new : dict
+        A copy of the namelist with the replacements made
+    """
+    new = {record: dict(options) for record, options in namelist.items()}
+
+    # find the records each option belongs to once, rather than searching
+    # every record for every replacement
+    records = dict()
+    for record, options in new.items():
+        for key in options:
+            if key not in records:
+                records[key] = list()
+            records[key].append(record)
+
+    for key, value in replacements.items():
+        for record in records.get(key, []):
+            new[record][key] = value
 
     return new
 
@@ -69,3 +107,27 @@ def write(namelist, filename):
             for key in rec:
                 f.write('    {} = {}\n'.format(key.strip(), rec[key].strip()))
             f.write('/\n')
+
+
+# parsed namelist files, with the size and modification time of each file
+# when it was parsed
+_defaults_cache = dict()
+
+
+def _parse(filename):
+    """ Parse the records and options of a namelist file """
+    with open(filename, 'r') as f:
+        lines = f.readlines()
+
+    namelist = dict()
+    record = None
+    for line in lines:
+        if '&' in line:
+            record = line.strip('&').strip('\n').strip()
+            namelist[record] = dict()
+        elif '=' in line:
+            if record is not None:
+                opt, val = line.strip('\n').split('=')
+                namelist[record][opt.strip()] = val.strip()
+
+    return namelist
@@ -1,11 +1,4 @@
 from compass.mpas_core import MpasCore
-from compass.ocean.tests.baroclinic_channel import BaroclinicChannel
-from compass.ocean.tests.global_convergence import GlobalConvergence
-from compass.ocean.tests.global_ocean import GlobalOcean
-from compass.ocean.tests.gotm import Gotm
-from compass.ocean.tests.ice_shelf_2d import IceShelf2d
-from compass.ocean.tests.isomip_plus import IsomipPlus
-from compass.ocean.tests.ziso import Ziso
 
 
 class Ocean(MpasCore):
@@ -13,16 +6,26 @@ class Ocean(MpasCore):
     The collection of all test case for the MPAS-Ocean core
     """
 
-    def __init__(self):
+    def __init__(self, test_groups=None):
         """
         Construct the collection of MPAS-Ocean test cases
+
+        Parameters
+        ----------
+        test_groups : list of str, optional
+            The names of the test groups to construct.  By default, all test
+            groups are constructed
         """
         super().__init__(name='ocean')
 
-        self.add_test_group(BaroclinicChannel(mpas_core=self))
-        self.add_test_group(GlobalConvergence(mpas_core=self))
-        self.add_test_group(GlobalOcean(mpas_core=self))
-        self.add_test_group(Gotm(mpas_core=self))
-        self.add_test_group(IceShelf2d(mpas_core=self))
-        self.add_test_group(IsomipPlus(mpas_core=self))
-        self.add_test_group(Ziso(mpas_core=self))
+        self.add_test_groups({
+            'baroclinic_channel':
+                'compass.ocean.tests.baroclinic_channel.BaroclinicChannel',
+            'global_convergence':
+                'compass.ocean.tests.global_convergence.GlobalConvergence',
+            'global_ocean': 'compass.ocean.tests.global_ocean.GlobalOcean',
+            'gotm': 'compass.ocean.tests.gotm.Gotm',
+            'ice_shelf_2d': 'compass.ocean.tests.ice_shelf_2d.IceShelf2d',
+            'isomip_plus': 'compass.ocean.tests.isomip_plus.IsomipPlus',
+            'ziso': 'compass.ocean.tests.ziso.Ziso'},
+            names=test_groups)
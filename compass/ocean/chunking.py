@@ -0,0 +1,35 @@
+def chunk_mesh(dsMesh, chunk_size=None):
+    """
+    Chunk a mesh data set along cells, edges and vertices so that fields
+    computed from it (e.g. the vertical coordinate and analytic initial
+    conditions) are evaluated lazily, one block at a time, and are written
+    to a file incrementally.  This keeps memory usage bounded by the size of
+    a block, rather than growing with the full 3D fields on high-resolution
+    meshes.
+
+    Parameters
+    ----------
+    dsMesh : xarray.Dataset
+        The MPAS mesh
+
+    chunk_size : int, optional
+        The number of cells, edges or vertices in each block
+
+    Returns
+    -------
+    dsMesh : xarray.Dataset
+        The mesh with variables backed by dask arrays, or a copy of the mesh
+        if it fits in a single block
+    """
+    if chunk_size is None:
+        chunk_size = _chunk_size
+    chunks = {dim: chunk_size for dim in ['nCells', 'nEdges', 'nVertices']
+              if dim in dsMesh.dims}
+    if dsMesh.sizes['nCells'] <= chunk_size:
+        # evaluating fields lazily only adds overhead for small meshes
+        return dsMesh.copy()
+    return dsMesh.chunk(chunks)
+
+
+# the default number of cells, edges or vertices in a block
+_chunk_size = 32768
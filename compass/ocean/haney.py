@@ -34,19 +34,21 @@ def compute_haney_number(ds_mesh, layer_thickness, ssh, show_progress=False):
     nEdges = ds_mesh.sizes['nEdges']
     nCells = ds_mesh.sizes['nCells']
     nVertLevels = ds_mesh.sizes['nVertLevels']
-    if 'Time' in layer_thickness.dims:
+    has_time = 'Time' in layer_thickness.dims
+    if has_time:
         nTime = layer_thickness.sizes['Time']
     else:
         nTime = 1
         show_progress = False
+        layer_thickness = layer_thickness.expand_dims(dim='Time')
 
     cellsOnEdge = ds_mesh.cellsOnEdge - 1
     minLevelCell = ds_mesh.minLevelCell - 1
     maxLevelCell = ds_mesh.maxLevelCell - 1
-    edgesOnCell = ds_mesh.edgesOnCell - 1
+    edgesOnCell = ds_mesh.edgesOnCell.values - 1
 
     internal_mask = numpy.logical_and(cellsOnEdge[:, 0] >= 0,
-                                      cellsOnEdge[:, 1] >= 1)
+                                      cellsOnEdge[:, 1] >= 1).values
 
     cell0 = cellsOnEdge[:, 0]
     cell1 = cellsOnEdge[:, 1]
@@ -67,18 +69,19 @@ def compute_haney_number(ds_mesh, layer_thickness, ssh, show_progress=False):
 
     cell_mask = numpy.logical_and(vert_index >= minLevelCell,
                                   vert_index <= maxLevelCell)
+    cell_mask = cell_mask.transpose('nCells', 'nVertLevels').values
 
     edge_mask = numpy.logical_and(vert_index >= minLevelEdge,
                                   vert_index <= maxLevelEdge)
+    edge_mask = edge_mask.transpose('nEdges', 'nVertLevels').values
 
-    cell0 = cell0[internal_mask]
-    cell1 = cell1[internal_mask]
+    cell0 = cell0.values[internal_mask]
+    cell1 = cell1.values[internal_mask]
 
-    haney_edge = xarray.DataArray(numpy.zeros((nTime, nEdges, nVertLevels)),
-                                  dims=('Time', 'nEdges', 'nVertLevels'))
+    bottom_depth = ds_mesh.bottomDepth.values
 
-    haney_cell = xarray.DataArray(numpy.zeros((nTime, nCells, nVertLevels)),
-                                  dims=('Time', 'nCells', 'nVertLevels'))
+    haney_edge = numpy.zeros((nTime, nEdges, nVertLevels))
+    haney_cell = numpy.zeros((nTime, nCells, nVertLevels))
 
     if show_progress:
         widgets = ['Haney number: ', progressbar.Percentage(), ' ',
@@ -88,54 +91,79 @@ def compute_haney_number(ds_mesh, layer_thickness, ssh, show_progress=False):
     else:
         bar = None
 
-    for tIndex in range(nTime):
+    # compute blocks of times at once, limiting the size of each block
+    time_chunk = max(1, _max_block_size // (nEdges*(nVertLevels+1)))
 
-        z_mid = numpy.zeros((nCells, nVertLevels+1))
-        if 'Time' in layer_thickness.dims:
-            local_thickness = layer_thickness.isel(Time=tIndex)
-        else:
-            local_thickness = layer_thickness
-        local_thickness = local_thickness.where(cell_mask, 0.).values
+    for start in range(0, nTime, time_chunk):
+        end = min(start + time_chunk, nTime)
+        nBlock = end - start
+
+        # arrays have cells or edges as their first dimension so that values
+        # can be gathered from cells on edges and edges on cells efficiently
+        local_thickness = layer_thickness.isel(Time=slice(start, end))
+        local_thickness = local_thickness.transpose(
+            'nCells', 'Time', 'nVertLevels').values
+        local_thickness = numpy.where(cell_mask[:, numpy.newaxis, :],
+                                      local_thickness, 0.)
         if 'Time' in ssh.dims:
-            local_ssh = ssh.isel(Time=tIndex)
+            local_ssh = ssh.isel(Time=slice(start, end))
+            local_ssh = local_ssh.transpose('nCells', 'Time').values
         else:
-            local_ssh = ssh
-        local_ssh = local_ssh.values
-        bottom_depth = ds_mesh.bottomDepth.values
-        z_bot = -bottom_depth
-        for zIndex in range(nVertLevels-1, -1, -1):
-            z_mid[:, zIndex+1] = z_bot + 0.5*local_thickness[:, zIndex]
-            z_bot += local_thickness[:, zIndex]
-        z_mid[:, 0] = local_ssh
+            local_ssh = ssh.values[:, numpy.newaxis]
+
+        # the bottom of each layer, accumulating thicknesses from the
+        # bottom of the column up
+        z_bot = numpy.concatenate(
+            (numpy.broadcast_to(-bottom_depth[:, numpy.newaxis, numpy.newaxis],
+                                (nCells, nBlock, 1)),
+             local_thickness[:, :, ::-1]), axis=2)
+        z_bot = numpy.cumsum(z_bot, axis=2)[:, :, 0:nVertLevels]
+        z_bot = z_bot[:, :, ::-1]
 
-        dz_vert1 = z_mid[cell0, 0:-1] - z_mid[cell0, 1:]
-        dz_vert2 = z_mid[cell1, 0:-1] - z_mid[cell1, 1:]
-        dz_edge = z_mid[cell1, :] - z_mid[cell0, :]
+        z_mid = numpy.zeros((nCells, nBlock, nVertLevels+1))
+        z_mid[:, :, 1:] = z_bot + 0.5*local_thickness
+        z_mid[:, :, 0] = local_ssh
 
-        dz_vert1[:, 0] *= 2
-        dz_vert2[:, 0] *= 2
+        dz_vert = z_mid[:, :, 0:-1] - z_mid[:, :, 1:]
+        dz_vert[:, :, 0] *= 2
 
-        rx1 = numpy.zeros((nEdges, nVertLevels))
+        dz_edge = z_mid[cell1, :, :] - z_mid[cell0, :, :]
 
         epsilon = 1e-10
-        denom = dz_vert1 + dz_vert2
+        denom = dz_vert[cell0, :, :] + dz_vert[cell1, :, :]
         denom[numpy.abs(denom) < epsilon] = epsilon
 
-        rx1[internal_mask, :] = (numpy.abs(dz_edge[:, 0:-1] + dz_edge[:, 1:]) /
-                                 denom)
+        rx1 = numpy.zeros((nEdges, nBlock, nVertLevels))
+        rx1[internal_mask, :, :] = \
+            numpy.abs(dz_edge[:, :, 0:-1] + dz_edge[:, :, 1:]) / denom
+
+        rx1 = numpy.where(edge_mask[:, numpy.newaxis, :], rx1, numpy.nan)
+        haney_edge[start:end, :, :] = rx1.transpose((1, 0, 2))
+
+        # the maximum over the edges of each cell, ignoring masked values
+        cell_max = rx1[edgesOnCell[:, 0], :, :]
+        for iEdge in range(1, edgesOnCell.shape[1]):
+            numpy.fmax(cell_max, rx1[edgesOnCell[:, iEdge], :, :],
+                       out=cell_max)
+        haney_cell[start:end, :, :] = cell_max.transpose((1, 0, 2))
 
-        haney_edge[tIndex, :, :] = rx1
-        haney_edge[tIndex, :, :] = haney_edge[tIndex, :, :].where(edge_mask)
-        haney_cell[tIndex, :, :] = haney_edge[tIndex, edgesOnCell, :].max(
-            dim='maxEdges')
         if show_progress:
-            bar.update(tIndex+1)
+            bar.update(end)
     if show_progress:
         bar.finish()
 
-    if 'Time' not in layer_thickness.dims:
+    haney_edge = xarray.DataArray(haney_edge,
+                                  dims=('Time', 'nEdges', 'nVertLevels'))
+    haney_cell = xarray.DataArray(haney_cell,
+                                  dims=('Time', 'nCells', 'nVertLevels'))
+
+    if not has_time:
         # don't need the time dimension
         haney_edge = haney_edge.isel(Time=0)
         haney_cell = haney_cell.isel(Time=0)
 
     return haney_edge, haney_cell
+
+
+# the maximum number of values in a block of the Haney number at edges
+_max_block_size = 10000000
@@ -1,3 +1,5 @@
+import hashlib
+
 import netCDF4
 import numpy as np
 from pyamg.classical import interpolate as amginterp
@@ -20,7 +22,8 @@ def write(init_filename, graph_filename, particle_filename, types='all',
           n_vert_levels=10, vert_seed_type='linear', n_buoy_surf=11,
           pot_dens_min=1028.5, pot_dens_max=1030.0, spatial_filter=None,
           downsample=0, seed_center=True, seed_vertex=False,
-          add_noise=False, cfl_min=0.005):
+          add_noise=False, cfl_min=0.005, seed=None,
+          format='NETCDF3_64BIT_OFFSET'):
     """
     Write an initial condition for particles partitioned across cores
 
@@ -73,12 +76,20 @@ def write(init_filename, graph_filename, particle_filename, types='all',
     cfl_min : float, optional
         minimum assumed CFL, which is used in perturbing particles if
         ``seed_vertex=True`` or ``add_noise=True``
+
+    seed : int, optional
+        a seed for the random number generator used if ``add_noise=True``,
+        so the noise can be reproduced
+
+    format : str, optional
+        the netCDF format of the particle file.  Variables are chunked along
+        particles if a ``NETCDF4`` format is used.
     """
 
     buoy_surf = np.linspace(pot_dens_min, pot_dens_max, n_buoy_surf)
     cpts, xCell, yCell, zCell = _particle_coords(
         init_filename, downsample, seed_center, seed_vertex, add_noise,
-        cfl_min)
+        cfl_min, seed)
 
     # build particles
     particlelist = []
@@ -96,7 +107,8 @@ def write(init_filename, graph_filename, particle_filename, types='all',
             cpts, xCell, yCell, zCell, spatial_filter))
 
     # write particles to disk
-    ParticleList(particlelist).write(particle_filename, graph_filename)
+    ParticleList(particlelist).write(particle_filename, graph_filename,
+                                     format=format)
 
 
 def remap_particles(init_filename, particle_filename, graph_filename):
@@ -205,38 +217,76 @@ def _downsample_points(x, y, z, tri, nsplit):
     # https://www.mathworks.com/matlabcentral/answers/
     # 369143-how-to-do-delaunay-triangulation-and-return-an-adjacency-matrix
 
-    # allocate the memory
     Np = x.shape[0]
-    A = sparse.lil_matrix((Np, Np))
 
     # cleanup impartial cells (don't include the triangles on boundary)
+    tri = np.asarray(tri)
     tri = tri[np.logical_not(np.any(tri == -1, axis=1)), :]
 
-    # handle one direction for triangles
-    A[tri[:, 0], tri[:, 1]] = 1
-    A[tri[:, 1], tri[:, 2]] = 1
-    A[tri[:, 2], tri[:, 0]] = 1
+    # the coarsening depends only on the triangles, so it can be reused for
+    # other numbers of splits on the same mesh
+    key = (Np, hashlib.sha1(np.ascontiguousarray(tri)).hexdigest())
+    if key not in _coarsening_cache:
+        # only keep the hierarchy of the most recent mesh, since the sparse
+        # matrices for large meshes take up a lot of memory
+        _coarsening_cache.clear()
+        _coarsening_cache[key] = _CoarseningHierarchy(_adjacency(tri, Np))
 
-    # handle other direction (bi-directional graph)
-    A[tri[:, 1], tri[:, 0]] = 1
-    A[tri[:, 2], tri[:, 1]] = 1
-    A[tri[:, 0], tri[:, 2]] = 1
+    Cpts = _coarsening_cache[key].coarse_points(nsplit)
+
+    return Cpts, x[Cpts], y[Cpts], z[Cpts]
 
-    A = A.tocsr()
 
-    Cpts = np.arange(Np)
-    # Grab root-nodes (i.e., Coarse / Fine splitting)
-    for ii in np.arange(nsplit):
-        splitting = split.PMIS(A)
-        # convert to index for subsetting particles
-        Cpts = Cpts[np.asarray(splitting, dtype=bool)]
+def _adjacency(tri, Np):
+    """
+    Build the (bi-directional) adjacency matrix of the points from triangles
+    """
+    # handle both directions for triangles
+    rows = np.concatenate((tri[:, 0], tri[:, 1], tri[:, 2],
+                           tri[:, 1], tri[:, 2], tri[:, 0]))
+    cols = np.concatenate((tri[:, 1], tri[:, 2], tri[:, 0],
+                           tri[:, 0], tri[:, 1], tri[:, 2]))
+    # edges shared by 2 triangles are summed on conversion to CSR, but the
+    # graph is unweighted
+    A = sparse.coo_matrix((np.ones(len(rows)), (rows, cols)),
+                          shape=(Np, Np)).tocsr()
+    A.data[:] = 1.
+    return A
+
+
+class _CoarseningHierarchy:
+    """
+    The levels of algebraic multigrid coarsening of a mesh, computed only as
+    they are needed
+    """
+    def __init__(self, A):
+        # the operator of the coarsest level so far and its splitting, if the
+        # level has been split
+        self.A = A
+        self.splitting = None
+        # the indices of the points remaining at each level
+        self.Cpts = [np.arange(A.shape[0])]
 
-        if ii < nsplit - 1:
-            P = amginterp.direct_interpolation(A, A, splitting)
-            R = P.T.tocsr()
-            A = R * A * P
+    def coarse_points(self, nsplit):
+        while len(self.Cpts) <= nsplit:
+            if self.splitting is not None:
+                P = amginterp.direct_interpolation(self.A, self.A,
+                                                   self.splitting)
+                R = P.T.tocsr()
+                self.A = R @ self.A @ P
 
-    return Cpts, x[Cpts], y[Cpts], z[Cpts]
+            # Grab root-nodes (i.e., Coarse / Fine splitting)
+            self.splitting = split.PMIS(self.A)
+            # convert to index for subsetting particles
+            self.Cpts.append(
+                self.Cpts[-1][np.asarray(self.splitting, dtype=bool)])
+
+        return self.Cpts[nsplit]
+
+
+# the cached coarsening hierarchy for the most recently downsampled mesh,
+# indexed by the number of points and a hash of the triangles
+_coarsening_cache = dict()
 
 
 class Particles:
@@ -361,86 +411,94 @@ class ParticleList:
         for alist in self.particlelist:
             alist.compute_lat_lon()
 
-    def write(self, f_name, f_decomp):
+    def write(self, f_name, f_decomp, format="NETCDF3_64BIT_OFFSET"):
 
         decomp = np.genfromtxt(f_decomp)
 
         self.aggregate()
+        nparticles = self.nparticles
         assert (
-            max(decomp) < self.nparticles
+            max(decomp) < nparticles
         ), "Number of particles must be larger than decomposition!"
 
-        f_out = netCDF4.Dataset(f_name, "w", format="NETCDF3_64BIT_OFFSET")
+        # concatenate each field across particle types only once
+        self.compute_lat_lon()
+        x = self.x
+        y = self.y
+        z = self.z
+        zlevel = self.zlevel
+        block = decomp[self.cellindices]
+        has_buoysurf = self.buoysurf is not None and len(self.buoysurf) > 0
+        if has_buoysurf:
+            buoypart = self.buoypart
+        else:
+            buoypart = None
+
+        # the type, dimensions and (in-memory) values of each variable, with
+        # the resets taken from the initial values.  Unwritten variables are
+        # left as fill values.
+        record = ("Time", "nParticles")
+        variables = {
+            "xParticle": ("f8", record, x),
+            "yParticle": ("f8", record, y),
+            "zParticle": ("f8", record, z),
+            "lonParticle": ("f8", record, self.lonParticle),
+            "latParticle": ("f8", record, self.latParticle),
+            "zLevelParticle": ("f8", record, zlevel),
+            "dtParticle": ("f8", record, DEFAULTS["dt"]),
+            "buoyancyParticle": ("f8", record, buoypart),
+            # assume single-processor mode for now
+            "currentBlock": ("i", record, block),
+            "currentCell": ("i", record, -1),
+            "currentCellGlobalID": ("i", record, self.cellGlobalID + 1),
+            "indexToParticleID": ("i", ("nParticles",),
+                                  np.arange(nparticles)),
+            "verticalTreatment": ("i", record, self.verticaltreatment),
+            "indexLevel": ("i", record, 1),
+            # reset each day
+            "resetTime": ("i", ("nParticles",), DEFAULTS["resettime"]),
+            "currentBlockReset": ("i", ("nParticles",), block),
+            "currentCellReset": ("i", ("nParticles",), -1),
+            "xParticleReset": ("f8", ("nParticles",), x),
+            "yParticleReset": ("f8", ("nParticles",), y),
+            "zParticleReset": ("f8", ("nParticles",), z),
+            "zLevelParticleReset": ("f8", ("nParticles",), zlevel),
+        }
+        if has_buoysurf:
+            variables["buoyancySurfaceValues"] = \
+                ("f8", ("nBuoyancySurfaces",), self.buoysurf)
+
+        f_out = netCDF4.Dataset(f_name, "w", format=format)
 
         f_out.createDimension("Time")
-        f_out.createDimension("nParticles", self.nparticles)
-
-        f_out.createVariable("xParticle", "f8", ("Time", "nParticles"))
-        f_out.createVariable("yParticle", "f8", ("Time", "nParticles"))
-        f_out.createVariable("zParticle", "f8", ("Time", "nParticles"))
-        f_out.createVariable("lonParticle", "f8", ("Time", "nParticles"))
-        f_out.createVariable("latParticle", "f8", ("Time", "nParticles"))
-        f_out.createVariable("zLevelParticle", "f8", ("Time", "nParticles"))
-        f_out.createVariable("dtParticle", "f8", ("Time", "nParticles"))
-        f_out.createVariable("buoyancyParticle", "f8", ("Time", "nParticles"))
-        f_out.createVariable("currentBlock", "i", ("Time", "nParticles"))
-        f_out.createVariable("currentCell", "i", ("Time", "nParticles"))
-        f_out.createVariable("currentCellGlobalID", "i", ("Time",
-                                                          "nParticles"))
-        f_out.createVariable("indexToParticleID", "i", ("nParticles",))
-        f_out.createVariable("verticalTreatment", "i", ("Time", "nParticles"))
-        f_out.createVariable("indexLevel", "i", ("Time", "nParticles"))
-        f_out.createVariable("resetTime", "i", ("nParticles",))
-        f_out.createVariable("currentBlockReset", "i", ("nParticles",))
-        f_out.createVariable("currentCellReset", "i", ("nParticles",))
-        f_out.createVariable("xParticleReset", "f8", ("nParticles",))
-        f_out.createVariable("yParticleReset", "f8", ("nParticles",))
-        f_out.createVariable("zParticleReset", "f8", ("nParticles",))
-        f_out.createVariable("zLevelParticleReset", "f8", ("nParticles",))
-
-        f_out.variables["xParticle"][0, :] = self.x
-        f_out.variables["yParticle"][0, :] = self.y
-        f_out.variables["zParticle"][0, :] = self.z
-
-        self.compute_lat_lon()
-        f_out.variables["lonParticle"][0, :] = self.lonParticle
-        f_out.variables["latParticle"][0, :] = self.latParticle
+        f_out.createDimension("nParticles", nparticles)
+        if has_buoysurf:
+            f_out.createDimension("nBuoyancySurfaces", len(self.buoysurf))
 
-        f_out.variables["verticalTreatment"][0, :] = self.verticaltreatment
+        # define all variables before writing any so the file is only laid
+        # out once
+        chunk = min(nparticles, _max_particle_chunk_size)
+        for varname, (dtype, dims, _) in variables.items():
+            if format.startswith("NETCDF4") and "nParticles" in dims:
+                chunksizes = (1,) * (len(dims) - 1) + (chunk,)
+                f_out.createVariable(varname, dtype, dims,
+                                     chunksizes=chunksizes)
+            else:
+                f_out.createVariable(varname, dtype, dims)
+
+        for varname, (_, dims, values) in variables.items():
+            if values is None:
+                continue
+            if dims[0] == "Time":
+                f_out.variables[varname][0, :] = values
+            else:
+                f_out.variables[varname][:] = values
 
-        f_out.variables["zLevelParticle"][0, :] = self.zlevel
+        f_out.close()
 
-        if self.buoysurf is not None and len(self.buoysurf) > 0:
-            f_out.createDimension("nBuoyancySurfaces", len(self.buoysurf))
-            f_out.createVariable("buoyancySurfaceValues", "f8",
-                                 ("nBuoyancySurfaces"))
-            f_out.variables["buoyancyParticle"][0, :] = self.buoypart
-            f_out.variables["buoyancySurfaceValues"][:] = self.buoysurf
-
-        f_out.variables["dtParticle"][0, :] = DEFAULTS["dt"]
-        # assume single-processor mode for now
-        f_out.variables["currentBlock"][:] = 0
-        # reset each day
-        f_out.variables["resetTime"][:] = DEFAULTS["resettime"]
-        f_out.variables["indexLevel"][:] = 1
-        f_out.variables["indexToParticleID"][:] = np.arange(self.nparticles)
-
-        # resets
-        f_out.variables["currentBlock"][0, :] = decomp[self.cellindices]
-        f_out.variables["currentBlockReset"][:] = decomp[self.cellindices]
-        f_out.variables["currentCell"][0, :] = -1
-        f_out.variables["currentCellGlobalID"][0, :] = self.cellGlobalID + 1
-        f_out.variables["currentCellReset"][:] = -1
-        f_out.variables["xParticleReset"][:] = \
-            f_out.variables["xParticle"][0, :]
-        f_out.variables["yParticleReset"][:] = \
-            f_out.variables["yParticle"][0, :]
-        f_out.variables["zParticleReset"][:] = \
-            f_out.variables["zParticle"][0, :]
-        f_out.variables["zLevelParticleReset"][:] = \
-            f_out.variables["zLevelParticle"][0, :]
 
-        f_out.close()
+# the maximum number of particles in a chunk of a NETCDF4 particle file
+_max_particle_chunk_size = 1048576
 
 
 def _rescale_for_shell(f_init, x, y, z):
@@ -453,7 +511,7 @@ def _rescale_for_shell(f_init, x, y, z):
 
 
 def _get_particle_coords(f_init, seed_center=True, seed_vertex=False,
-                         add_noise=False, CFLmin=None):
+                         add_noise=False, CFLmin=None, seed=None):
     xCell = f_init.variables["xCell"][:]
     yCell = f_init.variables["yCell"][:]
     zCell = f_init.variables["zCell"][:]
@@ -469,50 +527,27 @@ def _get_particle_coords(f_init, seed_center=True, seed_vertex=False,
         cellsOnCell = f_init.variables["cellsOnCell"][:, :]
 
         nCells = len(f_init.dimensions["nCells"])
-        perturbation = CFLmin * np.ones((nCells,))
+        rng = np.random.default_rng(seed)
 
-        allx = []
-        ally = []
-        allz = []
-        allcpts = []
         # There are six potential cell neighbors to perturb the particles for.
         # This selects three random directions (without replacement) at every
-        # cell.
-        cellDirs = np.stack(
-            [
-                np.random.choice(np.arange(6), size=3, replace=False)
-                for _ in range(nCells)
-            ]
-        )
-        for ci in np.arange(3):
-            epsilon = np.abs(np.random.normal(size=nCells))
-            epsilon /= epsilon.max()
-            # Adds gaussian noise at each cell, creating range of
-            # [CFLMin, 2*CFLMin]
-            theta = perturbation * epsilon + perturbation
-
-            x = (1.0 - theta) * xCell + theta * xCell[
-                cellsOnCell[range(nCells), cellDirs[:, ci]] - 1
-            ]
-            y = (1.0 - theta) * yCell + theta * yCell[
-                cellsOnCell[range(nCells), cellDirs[:, ci]] - 1
-            ]
-            z = (1.0 - theta) * zCell + theta * zCell[
-                cellsOnCell[range(nCells), cellDirs[:, ci]] - 1
-            ]
+        # cell by sorting random keys for each cell.
+        cellDirs = np.argsort(rng.random((nCells, 6)), axis=1)[:, :3]
+        neighbors = cellsOnCell[np.arange(nCells)[:, np.newaxis],
+                                cellDirs].T - 1
 
-            x, y, z = _rescale_for_shell(f_init, x, y, z)
+        epsilon = np.abs(rng.normal(size=(3, nCells)))
+        epsilon /= epsilon.max(axis=1, keepdims=True)
+        # Adds gaussian noise at each cell, creating range of
+        # [CFLMin, 2*CFLMin]
+        theta = CFLmin * epsilon + CFLmin
 
-            allx.append(x)
-            ally.append(y)
-            allz.append(z)
-            allcpts.append(cellsOnCell[:, ci] - 1)
-        cells_center = (
-            np.concatenate(allx),
-            np.concatenate(ally),
-            np.concatenate(allz),
-        )
-        cpts_center = np.concatenate(allcpts)
+        x = ((1.0 - theta) * xCell + theta * xCell[neighbors]).ravel()
+        y = ((1.0 - theta) * yCell + theta * yCell[neighbors]).ravel()
+        z = ((1.0 - theta) * zCell + theta * zCell[neighbors]).ravel()
+
+        cells_center = _rescale_for_shell(f_init, x, y, z)
+        cpts_center = (cellsOnCell[:, 0:3].T - 1).ravel()
 
     # Case of seeding 3 particles by a small epsilon around the vertices.
     if seed_vertex:
@@ -574,12 +609,12 @@ def _expand_nlevels(x, n):
 
 
 def _particle_coords(
-    f_init, downsample, seed_center, seed_vertex, add_noise, CFLmin
+    f_init, downsample, seed_center, seed_vertex, add_noise, CFLmin, seed=None
 ):
 
     f_init = netCDF4.Dataset(f_init, "r")
     cells, cpts = _get_particle_coords(
-        f_init, seed_center, seed_vertex, add_noise, CFLmin
+        f_init, seed_center, seed_vertex, add_noise, CFLmin, seed
     )
     xCell, yCell, zCell = cells
     if downsample:
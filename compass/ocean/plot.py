@@ -2,8 +2,6 @@ import xarray
 import xarray.plot
 import numpy as np
 import datetime
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
 
 
 def plot_initial_state(input_file_name='initial_state.nc',
@@ -19,6 +17,8 @@ def plot_initial_state(input_file_name='initial_state.nc',
     output_file_name: str, optional
         The path to the output image file
     """
+    import matplotlib.pyplot as plt
+    from matplotlib.font_manager import FontProperties
 
     # load mesh variables
     chunks = {'nCells': 32768, 'nEdges': 32768}
@@ -138,6 +138,7 @@ def plot_vertical_grid(grid_filename, config,
     out_filename : str, optional
         The name of the image file to write to
     """
+    import matplotlib.pyplot as plt
 
     ds = xarray.open_dataset(grid_filename)
     nVertLevels = ds.sizes['nVertLevels']
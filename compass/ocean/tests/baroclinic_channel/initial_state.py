@@ -5,6 +5,7 @@ from mpas_tools.planar_hex import make_planar_hex_mesh
 from mpas_tools.io import write_netcdf
 from mpas_tools.mesh.conversion import convert, cull
 
+from compass.ocean.chunking import chunk_mesh
 from compass.ocean.vertical import init_vertical_coord
 from compass.step import Step
 
@@ -38,6 +39,12 @@ class InitialState(Step):
                      'ocean.nc']:
             self.add_output_file(file)
 
+        # the mesh and initial condition are identical across baroclinic
+        # channel test cases with the same resolution
+        self.use_output_cache(
+            attributes=['resolution'],
+            config_sections=['baroclinic_channel', 'vertical_grid'])
+
     def run(self):
         """
         Run this step of the test case
@@ -69,7 +76,10 @@ class InitialState(Step):
         salinity = section.getfloat('salinity')
         coriolis_parameter = section.getfloat('coriolis_parameter')
 
-        ds = dsMesh.copy()
+        # only the extent of the domain is computed right away; the
+        # perturbed temperature field is evaluated block by block when
+        # ocean.nc is written
+        ds = chunk_mesh(dsMesh)
         xCell = ds.xCell
         yCell = ds.yCell
 
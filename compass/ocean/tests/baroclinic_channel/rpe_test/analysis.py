@@ -1,7 +1,5 @@
 import numpy as np
 from netCDF4 import Dataset
-import matplotlib.pyplot as plt
-import cmocean
 
 from compass.step import Step
 
@@ -74,6 +72,7 @@ def _plot(nx, ny, filename, nus):
     nus : list of float
         The viscosity values
     """
+    import matplotlib.pyplot as plt
 
     plt.switch_backend('Agg')
 
@@ -1,6 +1,5 @@
 import numpy as np
 import xarray as xr
-import matplotlib.pyplot as plt
 
 from compass.step import Step
 
@@ -46,6 +45,8 @@ class Analysis(Step):
         """
         Run this step of the test case
         """
+        import matplotlib.pyplot as plt
+
         plt.switch_backend('Agg')
         resolutions = self.resolutions
         xdata = list()
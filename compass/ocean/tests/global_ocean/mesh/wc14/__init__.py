@@ -1,7 +1,4 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-import cartopy.feature as cfeature
 
 import mpas_tools.mesh.creation.mesh_definition_tools as mdt
 from mpas_tools.mesh.creation.signed_distance import \
@@ -67,6 +64,7 @@ class WC14Mesh(MeshStep):
         lat : numpy.array
             longitude in degrees (length m and between -90 and 90)
         """
+        import matplotlib.pyplot as plt
 
         dlon = 0.1
         dlat = dlon
@@ -217,6 +215,10 @@ class WC14Mesh(MeshStep):
 
 
 def _plot_cartopy(nPlot, varName, var, map_name):
+    import matplotlib.pyplot as plt
+    import cartopy.crs as ccrs
+    import cartopy.feature as cfeature
+
     ax = plt.subplot(6, 2, nPlot, projection=ccrs.PlateCarree())
     ax.set_global()
 
@@ -1,6 +1,5 @@
 import numpy as np
 import xarray as xr
-import matplotlib.pyplot as plt
 
 from compass.step import Step
 
@@ -33,6 +32,7 @@ class Analysis(Step):
         """
         Run this step of the test case
         """
+        import matplotlib.pyplot as plt
 
         # render statically by default
         plt.switch_backend('agg')
@@ -7,6 +7,7 @@ from mpas_tools.cime.constants import constants
 
 from compass.step import Step
 from compass.ocean.vertical import init_vertical_coord
+from compass.ocean.chunking import chunk_mesh
 from compass.ocean.iceshelf import compute_land_ice_pressure_and_draft
 
 
@@ -77,7 +78,9 @@ class InitialState(Step):
         d2 = d1 + section.getfloat('slope_height')
         d3 = bottom_depth
 
-        ds = dsMesh.copy()
+        # the cavity geometry, vertical coordinate and salinity profile are
+        # built lazily on blocks of cells
+        ds = chunk_mesh(dsMesh)
 
         ds['bottomDepth'] = bottom_depth * xarray.ones_like(ds.xCell)
 
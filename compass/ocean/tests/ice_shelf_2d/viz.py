@@ -1,6 +1,5 @@
 import xarray
 import numpy
-import matplotlib.pyplot as plt
 
 from compass.step import Step
 
@@ -28,6 +27,7 @@ class Viz(Step):
         """
         Run this step of the test case
         """
+        import matplotlib.pyplot as plt
 
         ds = xarray.open_dataset('initial_state.nc')
 
@@ -1,11 +1,13 @@
 import numpy
 from netCDF4 import Dataset
-from shapely.geometry import Polygon, LineString
+import shapely
 
 from progressbar import ProgressBar, Percentage, Bar, ETA
 
 import os
 import glob
+import shutil
+import hashlib
 
 from compass.step import Step
 
@@ -68,155 +70,35 @@ class Misomip(Step):
         # show progress only if we're not writing to a log file
         show_progress = self.log_filename is None
 
-        _compute_misomip_interp_coeffs(in_dir=in_dir,
-                                       show_progress=show_progress)
+        cache_dir = self.config.get('isomip_plus_misomip', 'weights_cache')
+        if cache_dir == '':
+            cache_dir = None
+        else:
+            cache_dir = os.path.join(self.base_work_dir, cache_dir)
+
+        _compute_misomip_interp_coeffs(in_dir=in_dir, cache_dir=cache_dir)
         _interp_misomip(in_dir=in_dir, sf_dir=sf_dir,
                         out_file_name=self.outputs[0],
                         show_progress=show_progress)
 
 
-def _compute_misomip_interp_coeffs(in_dir, show_progress):
-    def getTransectWeights(outFileName, axis):
-
-        if show_progress:
-            pbar = ProgressBar(
-                widgets=[
-                    'compute MPAS and MISOMIP {} transect '
-                    'intersections'.format(axis),
-                    Percentage(),
-                    Bar(),
-                    ETA()],
-                maxval=nCells).start()
-        else:
-            pbar = None
-
-        if axis == 'x':
-            slicePos = xTransect
-            outNOther = outNy
-            outOtherAxis = y
-        else:
-            slicePos = yTransect
-            outNOther = outNx
-            outOtherAxis = x
-
-        sliceCount = numpy.zeros(outNOther, int)
-        cellIndices = []
-        otherIndices = []
-        weights = []
-        sliceIndices = []
-
-        for iCell in range(nCells):
-            verts = verticesOnCell[iCell, 0:nEdgesOnCell[iCell]]
-            verts = numpy.append(verts, verts[0])
-            xVert = xVertex[verts]
-            yVert = yVertex[verts]
-
-            if axis == 'x':
-                sliceAxisVerts = xVert
-                otherAxisVerts = yVert
-            else:
-                sliceAxisVerts = yVert
-                otherAxisVerts = xVert
-
-            if(numpy.amax(sliceAxisVerts) < slicePos) or \
-                    (numpy.amin(sliceAxisVerts) > slicePos):
-                # this polygon doesn't intersect the slice
-                continue
-
-            mpasPolygon = Polygon(zip(xVert, yVert))
-
-            indices = numpy.nonzero(
-                outOtherAxis < numpy.amin(otherAxisVerts))[0]
-            if len(indices) == 0:
-                lower = 0
-            else:
-                lower = indices[-1]
-
-            indices = numpy.nonzero(
-                outOtherAxis > numpy.amax(otherAxisVerts))[0]
-            if len(indices) == 0:
-                upper = outNOther
-            else:
-                upper = indices[0]
-
-            for otherIndex in range(lower, upper):
-                if axis == 'x':
-                    vertices = ((slicePos, outOtherAxis[otherIndex]),
-                                (slicePos, outOtherAxis[otherIndex + 1]))
-                else:
-                    vertices = ((outOtherAxis[otherIndex], slicePos),
-                                (outOtherAxis[otherIndex + 1], slicePos))
-
-                line = LineString(vertices)
-                if not mpasPolygon.intersects(line):
-                    continue
-                length = mpasPolygon.intersection(line).length
-                if length == 0.0:
-                    continue
-
-                cellIndices.append(iCell)
-                otherIndices.append(otherIndex)
-
-                weights.append(length / outDx)
-
-                sliceIndex = sliceCount[otherIndex]
-                sliceCount[otherIndex] += 1
-                sliceIndices.append(sliceIndex)
-            if show_progress:
-                pbar.update(iCell + 1)
-
-        if show_progress:
-            pbar.finish()
-
-        cellIndices = numpy.array(cellIndices)
-        otherIndices = numpy.array(otherIndices)
-        sliceIndices = numpy.array(sliceIndices)
-        weights = numpy.array(weights)
-
-        # sort the intersections first by otherIndex, then by sliceIndex
-        # for efficiency
-        nSlices = numpy.amax(sliceCount)
-        sortedIndices = numpy.zeros(0, int)
-        for sliceIndex in range(nSlices):
-            intersectionsInSlice = numpy.nonzero(sliceIndices == sliceIndex)[0]
-            indices = numpy.argsort(otherIndices[intersectionsInSlice])
-            sortedIndices = numpy.append(
-                sortedIndices, intersectionsInSlice[indices])
-
-        outFile = Dataset(outFileName, 'w', format='NETCDF4')
-        outFile.createDimension('nIntersections', len(cellIndices))
-        outFile.createVariable('cellIndices', 'i4', ('nIntersections',))
-        if axis == 'x':
-            outFile.createVariable('yIndices', 'i4', ('nIntersections',))
-        else:
-            outFile.createVariable('xIndices', 'i4', ('nIntersections',))
-        outFile.createVariable('sliceIndices', 'i4', ('nIntersections',))
-        outFile.createVariable(
-            'mpasToMisomipWeights', 'f8', ('nIntersections',))
-
-        outVars = outFile.variables
-        outVars['cellIndices'][:] = cellIndices[sortedIndices]
-        if axis == 'x':
-            outVars['yIndices'][:] = otherIndices[sortedIndices]
-        else:
-            outVars['xIndices'][:] = otherIndices[sortedIndices]
-
-        outVars['sliceIndices'][:] = sliceIndices[sortedIndices]
-        outVars['mpasToMisomipWeights'][:] = weights[sortedIndices]
-
-        outFile.close()
-
+def _compute_misomip_interp_coeffs(in_dir, cache_dir=None):
+    """
+    Compute the weights for interpolating from MPAS cells to the MISOMIP grid
+    and to the x and y transects, reusing weights from the cache directory
+    (if any) that were computed for the same mesh
+    """
     meshFileName = '{}/init.nc'.format(in_dir)
     interpWeightsFileName = 'horiz_map.nc'
     xTransectFileName = 'x_trans_map.nc'
     yTransectFileName = 'y_trans_map.nc'
+    fileNames = [interpWeightsFileName, xTransectFileName, yTransectFileName]
 
     outNx, outNy, outNz, x, y, z, xTransect, yTransect, outDx, outDz = \
         _get_out_grid(corners=True)
 
     inFile = Dataset(meshFileName, 'r')
 
-    nCells = len(inFile.dimensions['nCells'])
     inVars = inFile.variables
     nEdgesOnCell = inVars['nEdgesOnCell'][:]
     verticesOnCell = inVars['verticesOnCell'][:, :] - 1
@@ -224,128 +106,151 @@ def _compute_misomip_interp_coeffs(in_dir, show_progress):
     yVertex = inVars['yVertex'][:]
 
     inFile.close()
-    if(not os.path.exists(interpWeightsFileName)):
 
-        cellIndices = []
-        xIndices = []
-        yIndices = []
-        weights = []
-        sliceIndices = []
+    if cache_dir is not None:
+        meshHash = hashlib.sha256()
+        for array in [nEdgesOnCell, verticesOnCell, xVertex, yVertex, x, y,
+                      numpy.array([xTransect, yTransect])]:
+            meshHash.update(numpy.ascontiguousarray(array).tobytes())
+        cache_dir = os.path.join(cache_dir, meshHash.hexdigest())
+        for fileName in fileNames:
+            cacheFileName = os.path.join(cache_dir, fileName)
+            if not os.path.exists(fileName) and \
+                    os.path.exists(cacheFileName):
+                shutil.copyfile(cacheFileName, fileName)
+
+    if all([os.path.exists(fileName) for fileName in fileNames]):
+        return
+
+    cellPolygons = _get_cell_polygons(nEdgesOnCell, verticesOnCell, xVertex,
+                                      yVertex)
+
+    if not os.path.exists(interpWeightsFileName):
+        # the MISOMIP grid cells, indexed by xIndex + outNx*yIndex
+        xIndices, yIndices = numpy.meshgrid(numpy.arange(outNx),
+                                            numpy.arange(outNy))
+        xIndices = xIndices.ravel()
+        yIndices = yIndices.ravel()
+        outPolygons = shapely.box(x[xIndices], y[yIndices], x[xIndices + 1],
+                                  y[yIndices + 1])
+
+        cellIndices, xyIndices, intersections = _intersect(cellPolygons,
+                                                           outPolygons)
+        weights = shapely.area(intersections) / outDx**2
+
+        _write_weights(interpWeightsFileName, cellIndices, weights,
+                       {'xIndices': xIndices[xyIndices],
+                        'yIndices': yIndices[xyIndices]},
+                       xyIndices)
+
+    if not os.path.exists(xTransectFileName):
+        lines = shapely.linestrings(numpy.stack(
+            (xTransect*numpy.ones((outNy, 2)),
+             numpy.stack((y[0:-1], y[1:]), axis=1)), axis=2))
+        cellIndices, yIndices, intersections = _intersect(cellPolygons, lines)
+        weights = shapely.length(intersections) / outDx
+        _write_weights(xTransectFileName, cellIndices, weights,
+                       {'yIndices': yIndices}, yIndices)
+
+    if not os.path.exists(yTransectFileName):
+        lines = shapely.linestrings(numpy.stack(
+            (numpy.stack((x[0:-1], x[1:]), axis=1),
+             yTransect*numpy.ones((outNx, 2))), axis=2))
+        cellIndices, xIndices, intersections = _intersect(cellPolygons, lines)
+        weights = shapely.length(intersections) / outDx
+        _write_weights(yTransectFileName, cellIndices, weights,
+                       {'xIndices': xIndices}, xIndices)
+
+    if cache_dir is not None:
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            pass
+        for fileName in fileNames:
+            cacheFileName = os.path.join(cache_dir, fileName)
+            if not os.path.exists(cacheFileName):
+                # copy to a temporary file first so other test cases never
+                # see a partial file
+                tempFileName = '{}.{}.tmp'.format(cacheFileName, os.getpid())
+                shutil.copyfile(fileName, tempFileName)
+                os.replace(tempFileName, cacheFileName)
+
+
+def _get_cell_polygons(nEdgesOnCell, verticesOnCell, xVertex, yVertex):
+    """
+    Make closed polygons for all MPAS cells at once
+    """
+    nCells = len(nEdgesOnCell)
+    maxEdges = verticesOnCell.shape[1]
+    # the vertices of each cell, followed by the first vertex again to close
+    # the ring
+    edgeIndices = numpy.arange(maxEdges + 1)[numpy.newaxis, :]
+    mask = edgeIndices <= nEdgesOnCell[:, numpy.newaxis]
+    edgeIndices = numpy.where(edgeIndices < nEdgesOnCell[:, numpy.newaxis],
+                              edgeIndices, 0)
+    verts = numpy.take_along_axis(verticesOnCell, edgeIndices, axis=1)[mask]
+    ringIndices = numpy.repeat(numpy.arange(nCells), nEdgesOnCell + 1)
+    rings = shapely.linearrings(xVertex[verts], yVertex[verts],
+                                indices=ringIndices)
+    return shapely.polygons(rings)
+
+
+def _intersect(cellPolygons, outGeometries):
+    """
+    Find the intersections between MPAS cell polygons and geometries on the
+    MISOMIP grid with nonzero area (for polygons) or length (for lines),
+    using a spatial index of the MISOMIP geometries
+    """
+    tree = shapely.STRtree(outGeometries)
+    cellIndices, outIndices = tree.query(cellPolygons, predicate='intersects')
+    intersections = shapely.intersection(cellPolygons[cellIndices],
+                                         outGeometries[outIndices])
+    valid = numpy.logical_not(shapely.is_empty(intersections))
+    if shapely.get_dimensions(outGeometries[0]) == 2:
+        valid = numpy.logical_and(valid, shapely.area(intersections) > 0.)
+    else:
+        valid = numpy.logical_and(valid, shapely.length(intersections) > 0.)
+    return cellIndices[valid], outIndices[valid], intersections[valid]
 
-        sliceCount = numpy.zeros((outNy, outNx), int)
 
-        if show_progress:
-            pbar = ProgressBar(
-                widgets=[
-                    'compute MPAS and MISOMIP intersections',
-                    Percentage(),
-                    Bar(),
-                    ETA()],
-                maxval=nCells).start()
-        else:
-            pbar = None
-
-        for iCell in range(nCells):
-            verts = verticesOnCell[iCell, 0:nEdgesOnCell[iCell]]
-            verts = numpy.append(verts, verts[0])
-            xVert = xVertex[verts]
-            yVert = yVertex[verts]
-            mpasPolygon = Polygon(zip(xVert, yVert))
-
-            # find the out indices that bound the MPAS polygon
-            indices = numpy.nonzero(x < numpy.amin(xVert))[0]
-            if len(indices) == 0:
-                xl = 0
-            else:
-                xl = indices[-1]
-
-            indices = numpy.nonzero(x > numpy.amax(xVert))[0]
-            if len(indices) == 0:
-                xu = outNx
-            else:
-                xu = indices[0]
-
-            indices = numpy.nonzero(y < numpy.amin(yVert))[0]
-            if len(indices) == 0:
-                yl = 0
-            else:
-                yl = indices[-1]
-
-            indices = numpy.nonzero(y > numpy.amax(yVert))[0]
-            if len(indices) == 0:
-                yu = outNy
-            else:
-                yu = indices[0]
-
-            for yIndex in range(yl, yu):
-                for xIndex in range(xl, xu):
-                    vertices = ((x[xIndex], y[yIndex]),
-                                (x[xIndex + 1], y[yIndex]),
-                                (x[xIndex + 1], y[yIndex + 1]),
-                                (x[xIndex], y[yIndex + 1]),
-                                (x[xIndex], y[yIndex]))
-                    outPoly = Polygon(vertices)
-                    if not mpasPolygon.intersects(outPoly):
-                        continue
-                    intersectionArea = mpasPolygon.intersection(outPoly).area
-                    if intersectionArea == 0.:
-                        continue
-
-                    cellIndices.append(iCell)
-                    xIndices.append(xIndex)
-                    yIndices.append(yIndex)
-
-                    weights.append(intersectionArea / outDx**2)
-
-                    sliceIndex = sliceCount[yIndex, xIndex]
-                    sliceCount[yIndex, xIndex] += 1
-                    sliceIndices.append(sliceIndex)
-            if show_progress:
-                pbar.update(iCell + 1)
+def _write_weights(outFileName, cellIndices, weights, otherIndices,
+                   outIndices):
+    """
+    Sort intersections between MPAS cells and the MISOMIP grid first by the
+    slice index (the order of the intersection among those with the same
+    MISOMIP cell) and then by the index of the MISOMIP cell for efficiency,
+    and then write them out
+    """
+    # intersections with each MISOMIP cell are numbered in order of the MPAS
+    # cells
+    order = numpy.lexsort((cellIndices, outIndices))
+    sortedOutIndices = outIndices[order]
+    starts = numpy.ones(len(order), bool)
+    starts[1:] = sortedOutIndices[1:] != sortedOutIndices[0:-1]
+    groupStarts = numpy.nonzero(starts)[0]
+    groupIndices = numpy.cumsum(starts) - 1
+    sliceIndices = numpy.zeros(len(order), int)
+    sliceIndices[order] = numpy.arange(len(order)) - groupStarts[groupIndices]
+
+    sortedIndices = numpy.lexsort((outIndices, sliceIndices))
+
+    outFile = Dataset(outFileName, 'w', format='NETCDF4')
+    outFile.createDimension('nIntersections', len(cellIndices))
+    outFile.createVariable('cellIndices', 'i4', ('nIntersections',))
+    for varName in otherIndices:
+        outFile.createVariable(varName, 'i4', ('nIntersections',))
+    outFile.createVariable('sliceIndices', 'i4', ('nIntersections',))
+    outFile.createVariable(
+        'mpasToMisomipWeights', 'f8', ('nIntersections',))
+
+    outVars = outFile.variables
+    outVars['cellIndices'][:] = cellIndices[sortedIndices]
+    for varName in otherIndices:
+        outVars[varName][:] = otherIndices[varName][sortedIndices]
+    outVars['sliceIndices'][:] = sliceIndices[sortedIndices]
+    outVars['mpasToMisomipWeights'][:] = weights[sortedIndices]
 
-        if show_progress:
-            pbar.finish()
-
-        cellIndices = numpy.array(cellIndices)
-        xIndices = numpy.array(xIndices)
-        yIndices = numpy.array(yIndices)
-        sliceIndices = numpy.array(sliceIndices)
-        weights = numpy.array(weights)
-
-        # sort the intersections first by xIndex, then by yIndex, then by
-        # sliceIndex for efficiency
-        nSlices = numpy.amax(sliceCount)
-        sortedIndices = numpy.zeros(0, int)
-        xyIndices = xIndices + outNx * yIndices
-        for sliceIndex in range(nSlices):
-            intersectionsInSlice = numpy.nonzero(sliceIndices == sliceIndex)[0]
-            indices = numpy.argsort(xyIndices[intersectionsInSlice])
-            sortedIndices = numpy.append(
-                sortedIndices, intersectionsInSlice[indices])
-
-        outFile = Dataset(interpWeightsFileName, 'w', format='NETCDF4')
-        outFile.createDimension('nIntersections', len(cellIndices))
-        outFile.createVariable('cellIndices', 'i4', ('nIntersections',))
-        outFile.createVariable('xIndices', 'i4', ('nIntersections',))
-        outFile.createVariable('yIndices', 'i4', ('nIntersections',))
-        outFile.createVariable('sliceIndices', 'i4', ('nIntersections',))
-        outFile.createVariable(
-            'mpasToMisomipWeights', 'f8', ('nIntersections',))
-
-        outVars = outFile.variables
-        outVars['cellIndices'][:] = cellIndices[sortedIndices]
-        outVars['xIndices'][:] = xIndices[sortedIndices]
-        outVars['yIndices'][:] = yIndices[sortedIndices]
-        outVars['sliceIndices'][:] = sliceIndices[sortedIndices]
-        outVars['mpasToMisomipWeights'][:] = weights[sortedIndices]
-
-        outFile.close()
-
-    if(not os.path.exists(xTransectFileName)):
-        getTransectWeights(xTransectFileName, axis='x')
-
-    if(not os.path.exists(yTransectFileName)):
-        getTransectWeights(yTransectFileName, axis='y')
+    outFile.close()
 
 
 def _interp_misomip(in_dir, sf_dir, out_file_name, show_progress):
@@ -68,14 +68,13 @@ class Streamfunction(Step):
             '{}/timeSeriesStatsMonthly*.nc'.format(in_dir),
             concat_dim='Time', combine='nested')
 
-        _compute_barotropic_streamfunction(dsMesh, ds, out_dir,
-                                           show_progress=show_progress)
+        _compute_barotropic_streamfunction(dsMesh, ds, out_dir)
 
         _compute_overturning_streamfunction(dsMesh, ds, out_dir, dx=dx, dz=dz,
                                             show_progress=show_progress)
 
 
-def _compute_barotropic_streamfunction(dsMesh, ds, out_dir, show_progress):
+def _compute_barotropic_streamfunction(dsMesh, ds, out_dir):
     """
     compute the barotropic streamfunction for the given mesh and monthly-mean
     data set
@@ -85,8 +84,7 @@ def _compute_barotropic_streamfunction(dsMesh, ds, out_dir, show_progress):
     if file_complete(ds, bsfFileName):
         return
 
-    bsfVertex = _compute_barotropic_streamfunction_vertex(dsMesh, ds,
-                                                          show_progress)
+    bsfVertex = _compute_barotropic_streamfunction_vertex(dsMesh, ds)
     bsfCell = _compute_barotropic_streamfunction_cell(dsMesh, bsfVertex)
     dsBSF = xarray.Dataset()
     dsBSF['xtime_startMonthly'] = ds.xtime_startMonthly
@@ -138,8 +136,7 @@ def _compute_overturning_streamfunction(dsMesh, ds, out_dir, dx=2e3, dz=5.,
 
     zlevelTransportFileName = '{}/cache/osf_zlevel_transport.nc'.format(
         out_dir)
-    _interpolate_horizontal_transport_zlevel(ds, z, zlevelTransportFileName,
-                                             show_progress)
+    _interpolate_horizontal_transport_zlevel(ds, z, zlevelTransportFileName)
     ds = xarray.open_dataset(zlevelTransportFileName)
 
     cumsumTransportFileName = '{}/cache/osf_cumsum_transport.nc'.format(
@@ -181,7 +178,12 @@ def _compute_barotorpic_transport(dsMesh, ds):
     return innerEdges, transport
 
 
-def _compute_barotropic_streamfunction_vertex(dsMesh, ds, show_progress):
+def _compute_barotropic_streamfunction_vertex(dsMesh, ds):
+    """
+    Compute the barotropic streamfunction on vertices for all times at once by
+    solving the same least-squares problem with a right-hand side for each
+    time
+    """
     innerEdges, transport = _compute_barotorpic_transport(dsMesh, ds)
 
     nVertices = dsMesh.sizes['nVertices']
@@ -223,38 +225,23 @@ def _compute_barotropic_streamfunction_vertex(dsMesh, ds, show_progress):
     indices[1, 2*nInnerEdges + ind] = boundaryVertices
     data[2*nInnerEdges + ind] = 1.
 
-    bsfVertex = xarray.DataArray(numpy.zeros((nTime, nVertices)),
-                                 dims=('Time', 'nVertices'))
-
-    if show_progress:
-        widgets = ['barotropic streamfunction: ', progressbar.Percentage(),
-                   ' ', progressbar.Bar(), ' ', progressbar.ETA()]
-        bar = progressbar.ProgressBar(widgets=widgets,
-                                      maxval=nTime).start()
-    else:
-        bar = None
-
-    for tIndex in range(nTime):
-        rhs = numpy.zeros(nInnerEdges+nBoundaryVertices, dtype=float)
+    M = scipy.sparse.csr_matrix((data, indices),
+                                shape=(nInnerEdges+nBoundaryVertices,
+                                       nVertices))
 
-        # convert to Sv
-        ind = numpy.arange(nInnerEdges)
-        rhs[ind] = 1e-6*transport.isel(Time=tIndex)
+    # one column of the right-hand side for each time, converted to Sv, with
+    # zeros for the boundary vertices
+    rhs = numpy.zeros((nInnerEdges+nBoundaryVertices, nTime), dtype=float)
+    rhs[0:nInnerEdges, :] = \
+        1e-6*transport.transpose('nEdges', 'Time').values
 
-        ind = numpy.arange(nBoundaryVertices)
-        rhs[nInnerEdges + ind] = 0.
+    # The least-squares solution satisfies the normal equations, whose matrix
+    # is the same for all times, so we factor it only once
+    MT = M.transpose().tocsr()
+    solver = scipy.sparse.linalg.splu((MT @ M).tocsc())
+    solution = solver.solve(MT @ rhs)
 
-        M = scipy.sparse.csr_matrix((data, indices),
-                                    shape=(nInnerEdges+nBoundaryVertices,
-                                           nVertices))
-
-        solution = scipy.sparse.linalg.lsqr(M, rhs)
-
-        bsfVertex[tIndex, :] = -solution[0]
-        if show_progress:
-            bar.update(tIndex+1)
-    if show_progress:
-        bar.finish()
+    bsfVertex = xarray.DataArray(-solution.T, dims=('Time', 'nVertices'))
 
     return bsfVertex
 
@@ -374,8 +361,7 @@ def _compute_horizontal_transport_mpas(ds, dsMesh, outFileName):
     write_netcdf(dsOut, outFileName)
 
 
-def _interpolate_horizontal_transport_zlevel(ds, z, outFileName,
-                                             show_progress):
+def _interpolate_horizontal_transport_zlevel(ds, z, outFileName):
     """
     interpolate the horizontal transport through edges onto a z-level grid.
     """
@@ -383,95 +369,107 @@ def _interpolate_horizontal_transport_zlevel(ds, z, outFileName,
     if file_complete(ds, outFileName):
         return
 
-    ds = ds.chunk({'Time': 1, 'nInternalEdges': None, 'nVertLevels': 1,
-                   'nVertLevelsP1': 1})
-
     nz = len(z)
-    z = xarray.DataArray.from_dict({'dims': ('nz',), 'data': z})
-
-    # make sure we don't miss anything
-    z[0] = max(z[0].values, ds.zInterfaceEdge.max())
-    z[-1] = min(z[-1].values, ds.zInterfaceEdge.min())
-
-    z0 = z[0:-1].rename({'nz': 'nzM1'})
-    z1 = z[1:].rename({'nz': 'nzM1'})
-
-    nTime = ds.sizes['Time']
     nInternalEdges = ds.sizes['nInternalEdges']
-    nVertLevels = ds.sizes['nVertLevels']
-
-    if show_progress:
-        widgets = ['interpolating tansport on z-level grid: ',
-                   progressbar.Percentage(), ' ', progressbar.Bar(), ' ',
-                   progressbar.ETA()]
-        bar = progressbar.ProgressBar(widgets=widgets, maxval=nTime).start()
-    else:
-        bar = None
-
-    fileNames = []
-
-    for tIndex in range(nTime):
-        fileName = outFileName.replace('.nc', '_{}.nc'.format(tIndex))
-        fileNames.append(fileName)
-        if os.path.exists(fileName):
-            continue
-
-        outTransport = xarray.DataArray(
-            numpy.zeros((nInternalEdges, nz-1)),
-            dims=('nInternalEdges', 'nzM1'))
-
-        dzSum = xarray.DataArray(
-            numpy.zeros((nInternalEdges, nz-1)),
-            dims=('nInternalEdges', 'nzM1'))
-
-        dsIn = ds.isel(Time=tIndex)
-        for inZIndex in range(nVertLevels):
-            zTop = dsIn.zInterfaceEdge.isel(nVertLevelsP1=inZIndex)
-            zBot = dsIn.zInterfaceEdge.isel(nVertLevelsP1=inZIndex+1)
-            inTransportPerDepth = \
-                dsIn.transportPerDepth.isel(nVertLevels=inZIndex)
-
-            zt = numpy.minimum(zTop, z0)
-            zb = numpy.maximum(zBot, z1)
-            dz = numpy.maximum(zt - zb, 0.)
 
-            outTransport = outTransport + dz*inTransportPerDepth
-
-            dzSum = dzSum + dz
-
-        outTransport.compute()
-        dzSum.compute()
+    # make sure we don't miss anything
+    z = numpy.array(z)
+    z[0] = max(z[0], ds.zInterfaceEdge.max().values)
+    z[-1] = min(z[-1], ds.zInterfaceEdge.min().values)
+
+    # remap blocks of times at once, limiting the size of the remapped
+    # transport in each block
+    timeChunk = max(1, _max_remap_size // (nInternalEdges*nz))
+    ds = ds.chunk({'Time': timeChunk, 'nInternalEdges': -1,
+                   'nVertLevels': -1, 'nVertLevelsP1': -1})
+
+    transport, mask = xarray.apply_ufunc(
+        _remap_transport_zlevel, ds.zInterfaceEdge, ds.layerThicknessEdge,
+        ds.transportPerDepth, kwargs={'z': z},
+        input_core_dims=[['nVertLevelsP1'], ['nVertLevels'],
+                         ['nVertLevels']],
+        output_core_dims=[['nzM1'], ['nzM1']], dask='parallelized',
+        output_dtypes=[float, bool],
+        dask_gufunc_kwargs={'output_sizes': {'nzM1': nz-1}})
 
-        dsOut = xarray.Dataset()
-        dsOut['mask'] = dzSum > 0
-        dsOut['transport'] = outTransport
-        dsOut['transportVertSum'] = outTransport.sum('nzM1')
-        dsOut['transportVertSumCheck'] = \
-            dsIn.transportVertSum - dsOut.transportVertSum
+    dsOut = xarray.Dataset()
+    dsOut['xtime_startMonthly'] = ds.xtime_startMonthly
+    dsOut['xtime_endMonthly'] = ds.xtime_endMonthly
+    dsOut['z'] = ('nz', z)
+    dsOut['mask'] = mask
+    dsOut['transport'] = transport
+    dsOut['transportVertSum'] = transport.sum('nzM1')
+    dsOut['transportVertSumCheck'] = \
+        ds.transportVertSum - dsOut.transportVertSum
 
-        dsOut = dsOut.transpose('nzM1', 'nInternalEdges')
+    dsOut = dsOut.transpose('Time', 'nzM1', 'nz', 'nInternalEdges')
 
-        write_netcdf(dsOut, fileName)
+    print('compute and caching transport on z-level grid:')
+    write_netcdf(dsOut, outFileName)
 
+    with xarray.open_dataset(outFileName) as dsOut:
         assert(numpy.abs(dsOut.transportVertSumCheck).max().values < 1e-9)
 
-        if show_progress:
-            bar.update(tIndex + 1)
-
-    if show_progress:
-        bar.finish()
 
-    dsOut = xarray.open_mfdataset(fileNames, concat_dim='Time',
-                                  combine='nested')
+# the maximum number of values in a block of transport on the z-level grid
+_max_remap_size = 10000000
 
-    dsOut['xtime_startMonthly'] = ds.xtime_startMonthly
-    dsOut['xtime_endMonthly'] = ds.xtime_endMonthly
-    dsOut['z'] = z
 
-    dsOut = dsOut.transpose('Time', 'nzM1', 'nz', 'nInternalEdges')
+def _remap_transport_zlevel(zInterface, layerThickness, transportPerDepth, z):
+    """
+    Conservatively remap the transport per unit depth in each layer of a set
+    of columns onto the layers between the given z levels, returning the
+    transport in each z-level layer and a mask of where the z-level layer
+    overlaps with the column.  The last dimension of the input arrays is the
+    vertical dimension.
+    """
+    shape = zInterface.shape[0:-1]
+    nVertLevels = layerThickness.shape[-1]
+    nz = len(z)
 
-    print('caching transport on z-level grid:')
-    write_netcdf(dsOut, outFileName)
+    zInterface = zInterface.reshape((-1, nVertLevels+1))
+    layerThickness = layerThickness.reshape((-1, nVertLevels))
+    transportPerDepth = transportPerDepth.reshape((-1, nVertLevels))
+    nColumns = zInterface.shape[0]
+
+    # the transport integrated from the top of each column down to each
+    # interface
+    transportCumSum = numpy.zeros((nColumns, nVertLevels+1))
+    transportCumSum[:, 1:] = numpy.cumsum(layerThickness*transportPerDepth,
+                                          axis=1)
+    # padded with zero below the bottom of the column
+    transportPerDepth = numpy.concatenate(
+        (transportPerDepth, numpy.zeros((nColumns, 1))), axis=1)
+
+    # the number of interfaces in each column above each z level, found from
+    # the number of z levels above or at each interface
+    levelIndices = numpy.searchsorted(-z, -zInterface, side='right')
+    levelIndices += (nz+1)*numpy.arange(nColumns)[:, numpy.newaxis]
+    counts = numpy.bincount(levelIndices.ravel(),
+                            minlength=nColumns*(nz+1))
+    interfacesAbove = numpy.cumsum(counts.reshape((nColumns, nz+1)),
+                                   axis=1)[:, 0:nz]
+
+    # the layer that each z level falls in, and the z level clipped to the
+    # extent of the column
+    layerIndices = numpy.clip(interfacesAbove - 1, 0, nVertLevels)
+    zClipped = numpy.minimum(
+        numpy.maximum(z[numpy.newaxis, :], zInterface[:, -1:]),
+        zInterface[:, 0:1])
+
+    # the transport integrated from the top of each column down to each z
+    # level
+    transportAbove = \
+        numpy.take_along_axis(transportCumSum, layerIndices, axis=1) + \
+        numpy.take_along_axis(transportPerDepth, layerIndices, axis=1) * \
+        (numpy.take_along_axis(zInterface, layerIndices, axis=1) - zClipped)
+
+    transport = transportAbove[:, 1:] - transportAbove[:, 0:-1]
+    mask = zClipped[:, 0:-1] > zClipped[:, 1:]
+
+    transport = transport.reshape(shape + (nz-1,))
+    mask = mask.reshape(shape + (nz-1,))
+    return transport, mask
 
 
 def _vertical_cumsum_horizontal_transport(ds, outFileName):
@@ -52,6 +52,10 @@ class Viz(Step):
         frames_per_second = section.getint('frames_per_second')
         movie_format = section.get('movie_format')
         section_y = section.getfloat('section_y')
+        if config.has_option('parallel', 'threads'):
+            workers = config.getint('parallel', 'threads')
+        else:
+            workers = 1
 
         # show progress only if we're not writing to a log file
         show_progress = self.log_filename is None
@@ -86,7 +90,10 @@ class Viz(Step):
                                 outFolder='{}/plots'.format(out_dir),
                                 expt=expt, sectionY=section_y,
                                 dsMesh=dsMesh, ds=ds,
-                                showProgress=show_progress)
+                                showProgress=show_progress,
+                                movieFolder='{}/movies'.format(out_dir),
+                                framesPerSecond=frames_per_second,
+                                movieFormat=movie_format, workers=workers)
 
         mPlotter.plot_layer_interfaces()
 
@@ -103,10 +110,6 @@ class Viz(Step):
         mPlotter.plot_salinity()
         mPlotter.plot_potential_density()
 
-        mPlotter.images_to_movies(outFolder='{}/movies'.format(out_dir),
-                                  framesPerSecond=frames_per_second,
-                                  extension=movie_format)
-
 
 def file_complete(ds, fileName):
     """
@@ -1,15 +1,16 @@
 import numpy
 import xarray
 import os
-import copy
 import progressbar
 import subprocess
-import glob
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 import matplotlib.pyplot as plt
 import cmocean
-from matplotlib.patches import Polygon
-from matplotlib.collections import PatchCollection
+from matplotlib.collections import PolyCollection
+
+from compass.section import find_section_cells
 
 
 class TimeSeriesPlotter(object):
@@ -156,6 +157,19 @@ class MoviePlotter(object):
     outFolder : str
         The folder where images will be written
 
+    movieFolder : str
+        The folder where movies will be written as frames are rendered, or
+        ``None`` if frames are written as images in ``outFolder`` instead
+
+    framesPerSecond : int
+        The number of frames per second in movies
+
+    movieFormat : str
+        The file extension (and therefore format) of movies
+
+    workers : int
+        The number of processes used to render frames
+
     expt : {'Ocean0', 'Ocean1', 'Ocean2'}
         The name of the experiment
 
@@ -174,11 +188,11 @@ class MoviePlotter(object):
     cavityMask : ``numpy.ndarray``
         A mask of cells that are in the sub-ice-shelf cavity
 
-    oceanPatches : ``PatchCollection``
-        A set of polygons covering ocean cells
+    oceanVertices : ``numpy.ndarray``
+        The vertices (in km) of polygons covering ocean cells
 
-    cavityPatches : ``PatchCollection``
-        A set of polygons covering only cells in the cavity
+    cavityVertices : ``numpy.ndarray``
+        The vertices (in km) of polygons covering only cells in the cavity
 
     X, Z : ``numpy.ndarray``
         The horiz. and vert. coordinates of the x-z cross section
@@ -192,7 +206,8 @@ class MoviePlotter(object):
     """
 
     def __init__(self, inFolder, streamfunctionFolder,  outFolder, expt,
-                 sectionY, dsMesh,  ds, showProgress):
+                 sectionY, dsMesh,  ds, showProgress, movieFolder=None,
+                 framesPerSecond=30, movieFormat='mp4', workers=1):
         """
         Create a plotter object to hold on to some info needed for plotting
         images from ISOMIP+ simulation results
@@ -223,12 +238,30 @@ class MoviePlotter(object):
 
         showProgress : bool
             Whether to show a progressbar
+
+        movieFolder : str, optional
+            The folder where movies will be written.  If provided, frames are
+            piped directly to ``ffmpeg`` as they are rendered rather than
+            being written as images in ``outFolder``.
+
+        framesPerSecond : int, optional
+            The number of frames per second in movies
+
+        movieFormat : str, optional
+            The file extension (and therefore format) of movies
+
+        workers : int, optional
+            The number of processes used to render frames
         """
         plt.switch_backend('Agg')
 
         self.inFolder = inFolder
         self.streamfunctionFolder = streamfunctionFolder
         self.outFolder = outFolder
+        self.movieFolder = movieFolder
+        self.framesPerSecond = framesPerSecond
+        self.movieFormat = movieFormat
+        self.workers = workers
         self.expt = expt
         self.sectionY = sectionY
         self.showProgress = showProgress
@@ -240,9 +273,9 @@ class MoviePlotter(object):
         self.oceanMask = self.dsMesh.maxLevelCell-1 >= 0
         self.cavityMask = numpy.logical_and(self.oceanMask, landIceMask)
 
-        self.oceanPatches = _compute_cell_patches(
+        self.oceanVertices = _compute_cell_vertices(
             self.dsMesh, self.oceanMask)
-        self.cavityPatches = _compute_cell_patches(
+        self.cavityVertices = _compute_cell_vertices(
             self.dsMesh, self.cavityMask)
 
         self.sectionCellIndices = _compute_section_cell_indices(self.sectionY,
@@ -272,28 +305,11 @@ class MoviePlotter(object):
                 vmin = -0.5
                 vmax = 0.5
 
-        nTime = ds.sizes['Time']
-        if self.showProgress:
-            widgets = ['plotting barotropic streamfunction: ',
-                       progressbar.Percentage(), ' ',
-                       progressbar.Bar(), ' ', progressbar.ETA()]
-            bar = progressbar.ProgressBar(widgets=widgets,
-                                          maxval=nTime).start()
-        else:
-            bar = None
-
-        for tIndex in range(nTime):
-            self.update_date(tIndex)
-            bsf = ds.bsfCell.isel(Time=tIndex)
-            outFileName = '{}/bsf/bsf_{:04d}.png'.format(
-                self.outFolder, tIndex+1)
-            self._plot_horiz_field(bsf, title='barotropic streamfunction (Sv)',
-                                   outFileName=outFileName, oceanDomain=True,
-                                   vmin=vmin, vmax=vmax, cmap='cmo.curl')
-            if self.showProgress:
-                bar.update(tIndex+1)
-        if self.showProgress:
-            bar.finish()
+        self._plot_horiz_frames(ds.bsfCell, prefix='bsf',
+                                description='barotropic streamfunction',
+                                title='barotropic streamfunction (Sv)',
+                                oceanDomain=True, vmin=vmin, vmax=vmax,
+                                cmap='cmo.curl')
 
     def plot_overturning_streamfunction(self, vmin=-0.3, vmax=0.3):
         """
@@ -309,29 +325,19 @@ class MoviePlotter(object):
             self.streamfunctionFolder))
 
         nTime = ds.sizes['Time']
-        if self.showProgress:
-            widgets = ['plotting overturning streamfunction: ',
-                       progressbar.Percentage(), ' ',
-                       progressbar.Bar(), ' ', progressbar.ETA()]
-            bar = progressbar.ProgressBar(widgets=widgets,
-                                          maxval=nTime).start()
-        else:
-            bar = None
+        x = _interp_extrap_corner(ds.x.values)
+        z = _interp_extrap_corner(ds.z.values)
 
-        for tIndex in range(nTime):
-            self.update_date(tIndex)
-            osf = ds.osf.isel(Time=tIndex)
-            outFileName = '{}/osf/osf_{:04d}.png'.format(self.outFolder,
-                                                         tIndex+1)
-            x = _interp_extrap_corner(ds.x.values)
-            z = _interp_extrap_corner(ds.z.values)
-            self._plot_vert_field(
-                x, z, osf, title='overturning streamfunction (Sv)',
-                outFileName=outFileName, vmin=vmin, vmax=vmax, cmap='cmo.curl')
-            if self.showProgress:
-                bar.update(tIndex+1)
-        if self.showProgress:
-            bar.finish()
+        def frames():
+            for tIndex in range(nTime):
+                self.update_date(tIndex)
+                osf = ds.osf.isel(Time=tIndex).values
+                yield z, osf, self.date
+
+        self._plot_vert_frames(frames(), nTime, x, prefix='osf',
+                               description='overturning streamfunction',
+                               title='overturning streamfunction (Sv)',
+                               vmin=vmin, vmax=vmax, cmap='cmo.curl')
 
     def plot_melt_rates(self, vmin=-100., vmax=100.):
         """
@@ -474,38 +480,20 @@ class MoviePlotter(object):
             The units of the variable to be included in the title
 
         vmin, vmax : float, optional
-            The minimum and maximum values for the colorbar
+            The minimum and maximum values for the colorbar.  By default, the
+            minimum and maximum of the variable over all times
 
         cmap : Colormap or str
             A color map to plot
         """
 
-        nTime = self.ds.sizes['Time']
-        if self.showProgress:
-            widgets = ['plotting {}: '.format(nameInTitle),
-                       progressbar.Percentage(), ' ',
-                       progressbar.Bar(), ' ', progressbar.ETA()]
-            bar = progressbar.ProgressBar(widgets=widgets,
-                                          maxval=nTime).start()
+        if units is None:
+            title = nameInTitle
         else:
-            bar = None
-
-        for tIndex in range(nTime):
-            self.update_date(tIndex)
-            field = da.isel(Time=tIndex).values
-            outFileName = '{}/{}/{}_{:04d}.png'.format(
-                self.outFolder, prefix, prefix, tIndex+1)
-            if units is None:
-                title = nameInTitle
-            else:
-                title = '{} ({})'.format(nameInTitle, units)
-            self._plot_horiz_field(field, title=title, outFileName=outFileName,
-                                   oceanDomain=oceanDomain, vmin=vmin,
-                                   vmax=vmax, cmap=cmap)
-            if self.showProgress:
-                bar.update(tIndex+1)
-        if self.showProgress:
-            bar.finish()
+            title = '{} ({})'.format(nameInTitle, units)
+        self._plot_horiz_frames(da, prefix=prefix, description=nameInTitle,
+                                title=title, oceanDomain=oceanDomain,
+                                vmin=vmin, vmax=vmax, cmap=cmap)
 
     def plot_3d_field_top_bot_section(self, da, nameInTitle, prefix,
                                       units=None, vmin=None, vmax=None,
@@ -537,9 +525,9 @@ class MoviePlotter(object):
         """
 
         if vmin is None:
-            vmin = da.min()
+            vmin = float(da.min())
         if vmax is None:
-            vmax = da.max()
+            vmax = float(da.max())
 
         minLevelCell = self.dsMesh.minLevelCell-1
 
@@ -586,35 +574,25 @@ class MoviePlotter(object):
         daSection = da.isel(nCells=self.sectionCellIndices)
 
         nTime = self.ds.sizes['Time']
-        if self.showProgress:
-            widgets = ['plotting {} section: '.format(nameInTitle),
-                       progressbar.Percentage(), ' ',
-                       progressbar.Bar(), ' ', progressbar.ETA()]
-            bar = progressbar.ProgressBar(widgets=widgets,
-                                          maxval=nTime).start()
-        else:
-            bar = None
+        mask = numpy.logical_not(self.sectionMask)
 
-        for tIndex in range(nTime):
-            self.update_date(tIndex)
-            mask = numpy.logical_not(self.sectionMask)
-            field = numpy.ma.masked_array(daSection.isel(Time=tIndex).values.T,
-                                          mask=mask)
-            outFileName = '{}/section{}/section{}_{:04d}.png'.format(
-                self.outFolder, prefix, prefix, tIndex+1)
-            if units is None:
-                title = nameInTitle
-            else:
-                title = '{} ({}) along section at y={:g} km'.format(
-                    nameInTitle, units, 1e-3*self.sectionY)
-            self._plot_vert_field(self.X, self.Z[tIndex, :, :],
-                                  field, title=title,
-                                  outFileName=outFileName,
-                                  vmin=vmin, vmax=vmax, cmap=cmap)
-            if self.showProgress:
-                bar.update(tIndex+1)
-        if self.showProgress:
-            bar.finish()
+        def frames():
+            for tIndex in range(nTime):
+                self.update_date(tIndex)
+                field = numpy.ma.masked_array(
+                    daSection.isel(Time=tIndex).values.T, mask=mask)
+                yield self.Z[tIndex, :, :], field, self.date
+
+        if units is None:
+            title = nameInTitle
+        else:
+            title = '{} ({}) along section at y={:g} km'.format(
+                nameInTitle, units, 1e-3*self.sectionY)
+        self._plot_vert_frames(frames(), nTime, self.X,
+                               prefix='section{}'.format(prefix),
+                               description='{} section'.format(nameInTitle),
+                               title=title, vmin=vmin, vmax=vmax,
+                               cmap=cmap)
 
     def plot_layer_interfaces(self, figsize=(9, 5)):
         """
@@ -629,88 +607,25 @@ class MoviePlotter(object):
 
         nTime = self.Z.shape[0]
 
-        if self.showProgress:
-            widgets = ['plotting section of layer interfaces: ',
-                       progressbar.Percentage(), ' ',
-                       progressbar.Bar(), ' ', progressbar.ETA()]
-            bar = progressbar.ProgressBar(widgets=widgets,
-                                          maxval=nTime).start()
-        else:
-            bar = None
-
         z_mask = numpy.ones(self.X.shape)
         z_mask[0:-1, 0:-1] *= numpy.where(self.sectionMask, 1., numpy.nan)
         z_mask[1:, 0:-1] *= numpy.where(self.sectionMask, 1., numpy.nan)
         z_mask[0:-1, 1:] *= numpy.where(self.sectionMask, 1., numpy.nan)
         z_mask[1:, 1:] *= numpy.where(self.sectionMask, 1., numpy.nan)
 
-        for tIndex in range(nTime):
-            Z = numpy.array(self.Z[tIndex, :, :])
-            ylim = [numpy.amin(Z), 20]
-            Z *= z_mask
-            X = self.X
-            self.update_date(tIndex)
-
-            outFileName = '{}/layers/layers_{:04d}.png'.format(self.outFolder,
-                                                               tIndex+1)
-
-            if os.path.exists(outFileName):
-                continue
+        def frames():
+            for tIndex in range(nTime):
+                Z = numpy.array(self.Z[tIndex, :, :])
+                ylim = [numpy.amin(Z), 20]
+                Z *= z_mask
+                self.update_date(tIndex)
+                yield Z, ylim, self.date
 
-            try:
-                os.makedirs(os.path.dirname(outFileName))
-            except OSError:
-                pass
-
-            plt.figure(figsize=figsize)
-            ax = plt.subplot(111)
-
-            for z_index in range(1, X.shape[0]):
-                plt.plot(1e-3 * X[z_index, :], Z[z_index, :], 'k')
-            plt.plot(1e-3 * X[0, :], Z[0, :], 'g')
-            plt.plot(1e-3 * X[0, :], self.zBotSection, 'g')
-
-            ax.autoscale(tight=True)
-            plt.ylim(ylim)
-            plt.title('{} {}'.format('layer interfaces', self.date))
-            plt.tight_layout(pad=0.5)
-            plt.savefig(outFileName)
-            plt.close()
-
-            if self.showProgress:
-                bar.update(tIndex+1)
-        if self.showProgress:
-            bar.finish()
-
-    def images_to_movies(self, outFolder, framesPerSecond=30, extension='mp4',
-                         overwrite=True):
-        """
-        Convert all the image sequences into movies with ffmpeg
-        """
-        try:
-            os.makedirs('{}/logs'.format(outFolder))
-        except OSError:
-            pass
-
-        framesPerSecond = '{}'.format(framesPerSecond)
-
-        for fileName in sorted(glob.glob(
-                '{}/*/*0001.png'.format(self.outFolder))):
-            prefix = os.path.basename(fileName)[:-9]
-            outFileName = '{}/{}.{}'.format(outFolder, prefix, extension)
-            if not overwrite and os.path.exists(outFileName):
-                continue
-
-            imageFileTemplate = '{}/{}/{}_%04d.png'.format(self.outFolder,
-                                                           prefix, prefix)
-            logFileName = '{}/logs/{}.log'.format(outFolder, prefix)
-            with open(logFileName, 'w') as logFile:
-                args = ['ffmpeg', '-y', '-r', framesPerSecond,
-                        '-i', imageFileTemplate, '-b:v', '32000k',
-                        '-r', framesPerSecond, '-pix_fmt', 'yuv420p',
-                        outFileName]
-                print('running {}'.format(' '.join(args)))
-                subprocess.check_call(args, stdout=logFile, stderr=logFile)
+        settings = dict(X=self.X, zBotSection=self.zBotSection,
+                        figsize=figsize)
+        self._write_frames(frames(), nTime, prefix='layers',
+                           description='section of layer interfaces',
+                           render=_render_layers_frame, settings=settings)
 
     def update_date(self, tIndex):
         if 'xtime_startMonthly' in self.ds:
@@ -727,122 +642,220 @@ class MoviePlotter(object):
         month = xtime[5:7]
         self.date = '{}-{}'.format(year, month)
 
-    def _plot_horiz_field(self, field, title, outFileName, oceanDomain=True,
-                          vmin=None, vmax=None, figsize=(9, 3), cmap=None):
+    def _plot_horiz_frames(self, da, prefix, description, title, oceanDomain,
+                           vmin=None, vmax=None, figsize=(9, 3), cmap=None):
+        """
+        Plot a frame of a horizontal field for each time in a data array
+        """
+        if oceanDomain:
+            vertices = self.oceanVertices
+            mask = self.oceanMask
+        else:
+            vertices = self.cavityVertices
+            mask = self.cavityMask
 
-        try:
-            os.makedirs(os.path.dirname(outFileName))
-        except OSError:
-            pass
+        nTime = da.sizes['Time']
 
-        if os.path.exists(outFileName):
-            return
+        # the figure is reused for all frames, so the color limits are set
+        # once from the range over all times rather than for each frame
+        if vmin is None:
+            vmin = float(da.isel(nCells=mask.values).min())
+        if vmax is None:
+            vmax = float(da.isel(nCells=mask.values).max())
+
+        def frames():
+            for tIndex in range(nTime):
+                self.update_date(tIndex)
+                field = da.isel(Time=tIndex).values
+                yield field[mask], self.date
+
+        settings = dict(vertices=vertices, title=title, vmin=vmin, vmax=vmax,
+                        figsize=figsize, cmap=cmap)
+        self._write_frames(frames(), nTime, prefix=prefix,
+                           description=description,
+                           render=_render_horiz_frame, settings=settings)
+
+    def _plot_vert_frames(self, frames, nFrames, inX, prefix, description,
+                          title, vmin=None, vmax=None, figsize=(9, 5),
+                          cmap=None):
+        """
+        Plot a series of frames of a field in the x-z plane, where ``frames``
+        produces the vertical coordinate, field and date for each frame
+        """
+        settings = dict(inX=inX, title=title, vmin=vmin, vmax=vmax,
+                        figsize=figsize, cmap=cmap)
+        self._write_frames(frames, nFrames, prefix=prefix,
+                           description=description,
+                           render=_render_vert_frame, settings=settings)
+
+    def _write_frames(self, frames, nFrames, prefix, description, render,
+                      settings):
+        """
+        Render a series of frames (in parallel if there is more than one
+        worker) and either pipe them to ffmpeg to make a movie or write each
+        to an image file
+        """
+        if self.movieFolder is None:
+            try:
+                os.makedirs('{}/{}'.format(self.outFolder, prefix))
+            except OSError:
+                pass
+            outFileNames = ['{}/{}/{}_{:04d}.png'.format(
+                self.outFolder, prefix, prefix, tIndex+1)
+                for tIndex in range(nFrames)]
+        else:
+            outFileNames = [None]*nFrames
 
-        if oceanDomain:
-            localPatches = copy.copy(self.oceanPatches)
-            localPatches.set_array(field[self.oceanMask])
+        if self.showProgress:
+            widgets = ['plotting {}: '.format(description),
+                       progressbar.Percentage(), ' ',
+                       progressbar.Bar(), ' ', progressbar.ETA()]
+            bar = progressbar.ProgressBar(widgets=widgets,
+                                          maxval=nFrames).start()
         else:
-            localPatches = copy.copy(self.cavityPatches)
-            localPatches.set_array(field[self.cavityMask])
-
-        localPatches.set_edgecolor('face')
-        localPatches.set_clim(vmin=vmin, vmax=vmax)
-        if cmap is not None:
-            localPatches.set_cmap(cmap)
-
-        plt.figure(figsize=figsize)
-        ax = plt.subplot(111)
-        ax.add_collection(localPatches)
-        plt.colorbar(localPatches)
-        plt.axis([0, 500, 0, 1000])
-        ax.set_aspect('equal')
-        ax.autoscale(tight=True)
-        plt.title('{} {}'.format(title, self.date))
-        plt.tight_layout(pad=0.5)
-        plt.savefig(outFileName)
-        plt.close()
+            bar = None
 
-    def _plot_vert_field(self, inX, inZ, field, title, outFileName, vmin=None,
-                         vmax=None, figsize=(9, 5), cmap=None):
+        if self.workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_frame_renderer,
+                initargs=(render, settings))
+        else:
+            executor = None
+            _init_frame_renderer(render, settings)
+
+        # frames are written in order, with a limited number being rendered at
+        # a time so they don't all have to be held in memory
+        maxPending = 2*self.workers
+        pending = deque()
+        ffmpeg = None
+        frameCount = 0
         try:
-            os.makedirs(os.path.dirname(outFileName))
-        except OSError:
-            pass
+            for tIndex, args in enumerate(frames):
+                outFileName = outFileNames[tIndex]
+                if outFileName is not None and os.path.exists(outFileName):
+                    pending.append(None)
+                elif executor is None:
+                    pending.append(_render_frame(args, outFileName))
+                else:
+                    pending.append(executor.submit(_render_frame, args,
+                                                   outFileName))
+                while len(pending) > maxPending:
+                    ffmpeg = self._write_frame(pending.popleft(), prefix,
+                                               ffmpeg)
+                    frameCount += 1
+                    if self.showProgress:
+                        bar.update(frameCount)
+            while len(pending) > 0:
+                ffmpeg = self._write_frame(pending.popleft(), prefix, ffmpeg)
+                frameCount += 1
+                if self.showProgress:
+                    bar.update(frameCount)
+        finally:
+            if executor is None:
+                _close_frame_renderer()
+            else:
+                executor.shutdown()
+            if ffmpeg is not None:
+                ffmpeg.stdin.close()
+                ffmpeg.wait()
 
-        if os.path.exists(outFileName):
-            return
+        if ffmpeg is not None and ffmpeg.returncode != 0:
+            raise subprocess.CalledProcessError(ffmpeg.returncode,
+                                                ffmpeg.args)
 
-        plt.figure(figsize=figsize)
-        ax = plt.subplot(111)
-        plt.pcolormesh(1e-3*inX, inZ, field, vmin=vmin, vmax=vmax, cmap=cmap)
-        plt.colorbar()
-        ax.autoscale(tight=True)
-        plt.ylim([numpy.amin(inZ), 20])
-        plt.title('{} {}'.format(title, self.date))
-        plt.tight_layout(pad=0.5)
-        plt.savefig(outFileName)
-        plt.close()
+        if self.showProgress:
+            bar.finish()
+
+    def _write_frame(self, frame, prefix, ffmpeg):
+        """
+        Write a rendered frame to ffmpeg, starting ffmpeg with the first frame
+        """
+        if frame is not None and not isinstance(frame, tuple):
+            frame = frame.result()
+        if frame is None:
+            # the frame was written to an image file (or already existed)
+            return ffmpeg
+
+        width, height, image = frame
+        if ffmpeg is None:
+            try:
+                os.makedirs('{}/logs'.format(self.movieFolder))
+            except OSError:
+                pass
+
+            framesPerSecond = '{}'.format(self.framesPerSecond)
+            outFileName = '{}/{}.{}'.format(self.movieFolder, prefix,
+                                            self.movieFormat)
+            logFileName = '{}/logs/{}.log'.format(self.movieFolder, prefix)
+            with open(logFileName, 'w') as logFile:
+                args = ['ffmpeg', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgba',
+                        '-s', '{}x{}'.format(width, height),
+                        '-r', framesPerSecond, '-i', '-', '-b:v', '32000k',
+                        '-r', framesPerSecond, '-pix_fmt', 'yuv420p',
+                        outFileName]
+                ffmpeg = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                          stdout=logFile, stderr=logFile)
+
+        ffmpeg.stdin.write(image)
+        return ffmpeg
 
     def _compute_section_x_z(self):
-        x = _interp_extrap_corner(self.dsMesh.xCell[self.sectionCellIndices])
+        sectionCells = self.dsMesh.isel(nCells=self.sectionCellIndices)
+        x = _interp_extrap_corner(sectionCells.xCell.values)
         nx = len(x)
         nVertLevels = self.dsMesh.sizes['nVertLevels']
-        nTime = self.ds.sizes['Time']
-        self.X = numpy.zeros((nVertLevels+1, nx))
-        for zIndex in range(nVertLevels+1):
-            self.X[zIndex, :] = x
-
-        self.sectionMask = numpy.zeros((nVertLevels, nx-1), dtype=bool)
-        for zIndex in range(nVertLevels):
-            minLevelCell = self.dsMesh.minLevelCell.isel(
-                nCells=self.sectionCellIndices) - 1
-            maxLevelCell = self.dsMesh.maxLevelCell.isel(
-                nCells=self.sectionCellIndices) - 1
-            self.sectionMask[zIndex, :] = numpy.logical_and(
-                zIndex >= minLevelCell, zIndex <= maxLevelCell)
+        self.X = numpy.tile(x, (nVertLevels+1, 1))
+
+        zIndex = numpy.arange(nVertLevels)[:, numpy.newaxis]
+        minLevelCell = sectionCells.minLevelCell.values - 1
+        maxLevelCell = sectionCells.maxLevelCell.values - 1
+        self.sectionMask = numpy.logical_and(zIndex >= minLevelCell,
+                                             zIndex <= maxLevelCell)
 
-        self.Z = numpy.zeros((nTime, nVertLevels+1, nx))
         self.zBotSection = -_interp_extrap_corner(
-            self.dsMesh.bottomDepth.isel(
-                nCells=self.sectionCellIndices).values)
-        for tIndex in range(nTime):
-            if 'timeMonthly_avg_layerThickness' in self.ds:
-                var = 'timeMonthly_avg_layerThickness'
-            else:
-                var = 'layerThickness'
-            layerThickness = self.ds[var].isel(
-                Time=tIndex, nCells=self.sectionCellIndices)
-            layerThickness = layerThickness.values*self.sectionMask.T
-            layerThickness = numpy.nan_to_num(layerThickness)
-            self.Z[tIndex, -1, :] = self.zBotSection
-            for zIndex in range(nVertLevels-1, -1, -1):
-                layerThicknessSection = _interp_extrap_corner(
-                    layerThickness[:, zIndex])
-                self.Z[tIndex, zIndex, :] = self.Z[tIndex, zIndex+1, :] + \
-                    layerThicknessSection
-
-
-def _compute_cell_patches(dsMesh, mask):
-    patches = []
-    nVerticesOnCell = dsMesh.nEdgesOnCell.values
-    verticesOnCell = dsMesh.verticesOnCell.values - 1
+            sectionCells.bottomDepth.values)
+
+        if 'timeMonthly_avg_layerThickness' in self.ds:
+            var = 'timeMonthly_avg_layerThickness'
+        else:
+            var = 'layerThickness'
+        layerThickness = self.ds[var].isel(
+            nCells=self.sectionCellIndices).transpose(
+            'Time', 'nVertLevels', 'nCells').values
+        layerThickness = numpy.nan_to_num(layerThickness*self.sectionMask)
+        layerThickness = _interp_extrap_corner(layerThickness)
+
+        # interfaces are found by summing layer thicknesses upward from the
+        # bottom for all times at once
+        nTime = layerThickness.shape[0]
+        self.Z = numpy.zeros((nTime, nVertLevels+1, nx))
+        self.Z[:, -1, :] = self.zBotSection
+        self.Z[:, -2::-1, :] = layerThickness[:, ::-1, :]
+        self.Z[:, ::-1, :] = numpy.cumsum(self.Z[:, ::-1, :], axis=1)
+
+
+def _compute_cell_vertices(dsMesh, mask):
+    """
+    Compute the vertices (in km) of a polygon for each cell in the mask.
+    Polygons with fewer than ``maxEdges`` vertices are padded by repeating
+    their last vertex so all polygons can be held in a single array.
+    """
+    mask = numpy.asarray(mask)
+    nVerticesOnCell = dsMesh.nEdgesOnCell.values[mask]
+    verticesOnCell = dsMesh.verticesOnCell.values[mask, :] - 1
     xVertex = dsMesh.xVertex.values
     yVertex = dsMesh.yVertex.values
-    for iCell in range(dsMesh.sizes['nCells']):
-        if(not mask[iCell]):
-            continue
-        nVert = nVerticesOnCell[iCell]
-        vertexIndices = verticesOnCell[iCell, :nVert]
-        vertices = numpy.zeros((nVert, 2))
-        vertices[:, 0] = 1e-3*xVertex[vertexIndices]
-        vertices[:, 1] = 1e-3*yVertex[vertexIndices]
 
-        polygon = Polygon(vertices, True)
-        patches.append(polygon)
+    maxEdges = verticesOnCell.shape[1]
+    indices = numpy.minimum(numpy.arange(maxEdges),
+                            nVerticesOnCell[:, numpy.newaxis] - 1)
+    vertexIndices = numpy.take_along_axis(verticesOnCell, indices, axis=1)
 
-    p = PatchCollection(patches, alpha=1.)
+    vertices = numpy.zeros(vertexIndices.shape + (2,))
+    vertices[:, :, 0] = 1e-3*xVertex[vertexIndices]
+    vertices[:, :, 1] = 1e-3*yVertex[vertexIndices]
 
-    return p
+    return vertices
 
 
 def _compute_section_cell_indices(y, dsMesh):
@@ -850,23 +863,135 @@ def _compute_section_cell_indices(y, dsMesh):
     yCell = dsMesh.yCell.values
     xMin = numpy.amin(xCell)
     xMax = numpy.amax(xCell)
-    xs = numpy.linspace(xMin, xMax, 10000)
-    cellIndices = []
-    for x in xs:
-        distanceSquared = (x - xCell)**2 + (y-yCell)**2
-        index = numpy.argmin(distanceSquared)
-        if len(cellIndices) == 0 or cellIndices[-1] != index:
-            cellIndices.append(index)
-
-    return numpy.array(cellIndices)
+    return find_section_cells(xCell, yCell, [xMin, xMax], [y, y])
 
 
 def _interp_extrap_corner(inField):
-    """Interpolate/extrapolate a 1D field from grid centers to grid corners"""
+    """
+    Interpolate/extrapolate a field from grid centers to grid corners along
+    its last dimension
+    """
 
-    outField = numpy.zeros(len(inField) + 1)
-    outField[1:-1] = 0.5 * (inField[0:-1] + inField[1:])
+    inField = numpy.asarray(inField)
+    outField = numpy.zeros(inField.shape[:-1] + (inField.shape[-1] + 1,))
+    outField[..., 1:-1] = 0.5 * (inField[..., 0:-1] + inField[..., 1:])
     # extrapolate the ends
-    outField[0] = 1.5 * inField[0] - 0.5 * inField[1]
-    outField[-1] = 1.5 * inField[-1] - 0.5 * inField[-2]
+    outField[..., 0] = 1.5 * inField[..., 0] - 0.5 * inField[..., 1]
+    outField[..., -1] = 1.5 * inField[..., -1] - 0.5 * inField[..., -2]
     return outField
+
+
+# the settings and cached figure used to render frames in this process
+_frame_renderer = dict()
+
+
+def _init_frame_renderer(render, settings):
+    """
+    Set up this process to render a series of frames with the given function
+    and settings shared across all frames
+    """
+    plt.switch_backend('Agg')
+    _close_frame_renderer()
+    _frame_renderer.update(settings)
+    _frame_renderer['render'] = render
+
+
+def _close_frame_renderer():
+    """
+    Close the cached figure (if any) and discard the frame settings
+    """
+    if 'figure' in _frame_renderer:
+        plt.close(_frame_renderer['figure'])
+    _frame_renderer.clear()
+
+
+def _render_frame(args, outFileName):
+    """
+    Render a frame and write it to an image file or, if ``outFileName`` is
+    ``None``, return its width, height and raw RGBA pixels
+    """
+    state = _frame_renderer
+    fig = state['render'](state, *args)
+    if outFileName is None:
+        fig.canvas.draw()
+        image = numpy.asarray(fig.canvas.buffer_rgba())
+        frame = (image.shape[1], image.shape[0], image.tobytes())
+    else:
+        fig.savefig(outFileName)
+        frame = None
+
+    if fig is not state.get('figure'):
+        plt.close(fig)
+
+    return frame
+
+
+def _render_horiz_frame(state, field, date):
+    """
+    Render a frame of a horizontal field, reusing the same figure and
+    collection of cell polygons and only updating their colors and the title
+    after the first frame
+    """
+    title = '{} {}'.format(state['title'], date)
+    if 'figure' in state:
+        state['polygons'].set_array(field)
+        state['titleText'].set_text(title)
+        return state['figure']
+
+    polygons = PolyCollection(state['vertices'], alpha=1.)
+    polygons.set_array(field)
+    polygons.set_edgecolor('face')
+    polygons.set_clim(vmin=state['vmin'], vmax=state['vmax'])
+    if state['cmap'] is not None:
+        polygons.set_cmap(state['cmap'])
+
+    fig = plt.figure(figsize=state['figsize'])
+    ax = plt.subplot(111)
+    ax.add_collection(polygons)
+    plt.colorbar(polygons)
+    plt.axis([0, 500, 0, 1000])
+    ax.set_aspect('equal')
+    ax.autoscale(tight=True)
+    titleText = plt.title(title)
+    plt.tight_layout(pad=0.5)
+
+    state['figure'] = fig
+    state['polygons'] = polygons
+    state['titleText'] = titleText
+    return fig
+
+
+def _render_vert_frame(state, inZ, field, date):
+    """
+    Render a frame of a field in the x-z plane
+    """
+    fig = plt.figure(figsize=state['figsize'])
+    ax = plt.subplot(111)
+    plt.pcolormesh(1e-3*state['inX'], inZ, field, vmin=state['vmin'],
+                   vmax=state['vmax'], cmap=state['cmap'])
+    plt.colorbar()
+    ax.autoscale(tight=True)
+    plt.ylim([numpy.amin(inZ), 20])
+    plt.title('{} {}'.format(state['title'], date))
+    plt.tight_layout(pad=0.5)
+    return fig
+
+
+def _render_layers_frame(state, Z, ylim, date):
+    """
+    Render a frame of layer interfaces in the x-z plane
+    """
+    X = state['X']
+    fig = plt.figure(figsize=state['figsize'])
+    ax = plt.subplot(111)
+
+    for z_index in range(1, X.shape[0]):
+        plt.plot(1e-3 * X[z_index, :], Z[z_index, :], 'k')
+    plt.plot(1e-3 * X[0, :], Z[0, :], 'g')
+    plt.plot(1e-3 * X[0, :], state['zBotSection'], 'g')
+
+    ax.autoscale(tight=True)
+    plt.ylim(ylim)
+    plt.title('{} {}'.format('layer interfaces', date))
+    plt.tight_layout(pad=0.5)
+    return fig
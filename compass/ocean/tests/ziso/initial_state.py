@@ -5,6 +5,7 @@ from mpas_tools.planar_hex import make_planar_hex_mesh
 from mpas_tools.io import write_netcdf
 from mpas_tools.mesh.conversion import convert, cull
 
+from compass.ocean.chunking import chunk_mesh
 from compass.ocean.vertical import init_vertical_coord
 from compass.step import Step
 
@@ -45,6 +46,11 @@ class InitialState(Step):
                      'ocean.nc', 'forcing.nc']:
             self.add_output_file(file)
 
+        # the mesh and initial condition are identical across ZISO test cases
+        # with the same resolution and frazil setting
+        self.use_output_cache(attributes=['resolution', 'with_frazil'],
+                              config_sections=['ziso', 'vertical_grid'])
+
     def run(self):
         """
         Run this step of the test case
@@ -66,9 +72,13 @@ class InitialState(Step):
                          logger=logger)
         write_netcdf(dsMesh, 'culled_mesh.nc')
 
-        ds = _write_initial_state(config, dsMesh, self.with_frazil)
+        _write_initial_state(config, dsMesh, self.with_frazil)
 
-        _write_forcing(config, ds.yCell, ds.zMid)
+        # read zMid back from the initial condition (again in blocks of cells)
+        # rather than evaluating the lazy vertical coordinate a second time
+        with xarray.open_dataset('ocean.nc') as ds:
+            ds = chunk_mesh(ds)
+            _write_forcing(config, ds.yCell, ds.zMid)
 
 
 def _write_initial_state(config, dsMesh, with_frazil):
@@ -76,7 +86,10 @@ def _write_initial_state(config, dsMesh, with_frazil):
     reference_coriolis = section.getfloat('reference_coriolis')
     coriolis_gradient = section.getfloat('coriolis_gradient')
 
-    ds = dsMesh.copy()
+    # the temperature profiles (with or without the frazil anomaly) below
+    # are only computed for one block of cells at a time, when ocean.nc is
+    # written
+    ds = chunk_mesh(dsMesh)
 
     bottom_depth = config.getfloat('vertical_grid', 'bottom_depth')
 
@@ -1,7 +1,8 @@
 import numpy
 import xarray
 
-from compass.ocean.vertical.zlevel import init_z_level_vertical_coord
+from compass.ocean.vertical.zlevel import init_z_level_vertical_coord, \
+    compute_cell_mask
 from compass.ocean.vertical.zstar import init_z_star_vertical_coord
 
 
@@ -78,8 +79,8 @@ def init_vertical_coord(config, ds):
         raise ValueError('Unknown coordinate type {}'.format(coord_type))
 
     # recompute the cell mask since min/max indices may have changed
-    ds['cellMask'] = _compute_cell_mask(ds.minLevelCell, ds.maxLevelCell,
-                                        ds.sizes['nVertLevels'])
+    ds['cellMask'] = compute_cell_mask(ds.minLevelCell, ds.maxLevelCell,
+                                       ds.sizes['nVertLevels'])
 
     # mask layerThickness and restingThickness
     ds['layerThickness'] = ds.layerThickness.where(ds.cellMask)
@@ -99,20 +100,11 @@ def init_vertical_coord(config, ds):
     ds['maxLevelCell'] = ds.maxLevelCell+1
 
 
-def _compute_cell_mask(minLevelCell, maxLevelCell, nVertLevels):
-    cellMask = []
-    for zIndex in range(nVertLevels):
-        mask = numpy.logical_and(zIndex >= minLevelCell,
-                                 zIndex <= maxLevelCell)
-        cellMask.append(mask)
-    cellMask = xarray.concat(cellMask, dim='nVertLevels')
-    cellMask = cellMask.transpose('nCells', 'nVertLevels')
-    return cellMask
-
-
 def _compute_zmid_from_layer_thickness(layerThickness, ssh, cellMask):
     """
-    Compute zMid from ssh and layerThickness for any vertical coordinate
+    Compute zMid from ssh and layerThickness for any vertical coordinate.  If
+    the inputs are dask arrays, ``zMid`` is computed lazily for each chunk of
+    cells (and times) so the full 3D field never needs to fit in memory.
 
     Parameters
     ----------
@@ -131,15 +123,30 @@ def _compute_zmid_from_layer_thickness(layerThickness, ssh, cellMask):
         The elevation of layer centers
     """
 
-    zTop = ssh.copy()
-    nVertLevels = layerThickness.sizes['nVertLevels']
-    zMid = []
-    for zIndex in range(nVertLevels):
-        mask = cellMask.isel(nVertLevels=zIndex)
-        thickness = layerThickness.isel(nVertLevels=zIndex).where(mask, 0.)
-        z = (zTop - 0.5*thickness).where(mask)
-        zMid.append(z)
-        zTop -= thickness
-    zMid = xarray.concat(zMid, dim='nVertLevels').transpose('Time', 'nCells',
-                                                            'nVertLevels')
+    zMid = xarray.apply_ufunc(
+        _zmid_kernel, layerThickness, ssh, cellMask,
+        input_core_dims=[['nVertLevels'], [], ['nVertLevels']],
+        output_core_dims=[['nVertLevels']], dask='parallelized',
+        output_dtypes=[float],
+        dask_gufunc_kwargs={'allow_rechunk': True})
+    zMid = zMid.transpose('Time', 'nCells', 'nVertLevels')
+    return zMid
+
+
+def _zmid_kernel(layerThickness, ssh, cellMask):
+    """
+    Compute the elevation of layer centers with a cumulative sum of layer
+    thicknesses down from the sea surface.  The tops of layers are summed in
+    the same order as they would be one level at a time, so the results
+    don't depend on how the computation is chunked.
+    """
+    thickness = numpy.where(cellMask, layerThickness, 0.)
+    zMid = numpy.empty(thickness.shape)
+    zMid[..., 0] = ssh
+    numpy.negative(thickness[..., :-1], out=zMid[..., 1:])
+    # zMid temporarily holds the elevation of the top of each layer
+    numpy.cumsum(zMid, axis=-1, out=zMid)
+    thickness *= 0.5
+    zMid -= thickness
+    numpy.copyto(zMid, numpy.nan, where=numpy.logical_not(cellMask))
     return zMid
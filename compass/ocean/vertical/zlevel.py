@@ -127,6 +127,38 @@ def compute_min_max_level_cell(refTopDepth, refBottomDepth, ssh, bottomDepth):
     return minLevelCell, maxLevelCell, cellMask
 
 
+def compute_cell_mask(minLevelCell, maxLevelCell, nVertLevels):
+    """
+    Compute a mask of valid cells at each level from the zero-based indices
+    of the top and bottom valid levels.  If the indices are dask arrays, the
+    mask is computed lazily for each chunk of cells.
+
+    Parameters
+    ----------
+    minLevelCell : xarray.DataArray
+        The zero-based index of the top valid level
+
+    maxLevelCell : xarray.DataArray
+        The zero-based index of the bottom valid level
+
+    nVertLevels : int
+        The number of vertical levels
+
+    Returns
+    -------
+    cellMask : xarray.DataArray
+        A boolean mask of where there are valid cells
+    """
+    cellMask = xarray.apply_ufunc(
+        _cell_mask_kernel, minLevelCell, maxLevelCell,
+        kwargs={'nVertLevels': nVertLevels},
+        output_core_dims=[['nVertLevels']], dask='parallelized',
+        output_dtypes=[bool],
+        dask_gufunc_kwargs={'output_sizes': {'nVertLevels': nVertLevels}})
+    cellMask = cellMask.transpose('nCells', 'nVertLevels')
+    return cellMask
+
+
 def compute_z_level_layer_thickness(refTopDepth, refBottomDepth, ssh,
                                     bottomDepth, minLevelCell, maxLevelCell):
     """
@@ -159,15 +191,10 @@ def compute_z_level_layer_thickness(refTopDepth, refBottomDepth, ssh,
     """
 
     nVertLevels = refBottomDepth.sizes['nVertLevels']
-    layerThickness = []
-    for zIndex in range(nVertLevels):
-        mask = numpy.logical_and(zIndex >= minLevelCell,
-                                 zIndex <= maxLevelCell)
-        zTop = numpy.minimum(ssh, -refTopDepth[zIndex])
-        zBot = numpy.maximum(-bottomDepth, -refBottomDepth[zIndex])
-        thickness = (zTop - zBot).where(mask, 0.)
-        layerThickness.append(thickness)
-    layerThickness = xarray.concat(layerThickness, dim='nVertLevels')
+    mask = compute_cell_mask(minLevelCell, maxLevelCell, nVertLevels)
+    zTop = numpy.minimum(ssh, -refTopDepth)
+    zBot = numpy.maximum(-bottomDepth, -refBottomDepth)
+    layerThickness = (zTop - zBot).where(mask, 0.)
     layerThickness = layerThickness.transpose('nCells', 'nVertLevels')
     return layerThickness
 
@@ -202,16 +229,20 @@ def compute_z_level_resting_thickness(layerThickness, ssh, bottomDepth,
     """
 
     nVertLevels = layerThickness.sizes['nVertLevels']
-    restingThickness = []
+    mask = compute_cell_mask(minLevelCell, maxLevelCell, nVertLevels)
 
     layerStretch = bottomDepth / (ssh + bottomDepth)
-    for zIndex in range(nVertLevels):
-        mask = numpy.logical_and(zIndex >= minLevelCell,
-                                 zIndex <= maxLevelCell)
-        thickness = layerStretch * layerThickness.isel(
-            nVertLevels=zIndex)
-        thickness = thickness.where(mask, 0.)
-        restingThickness.append(thickness)
-    restingThickness = xarray.concat(restingThickness, dim='nVertLevels')
+    restingThickness = (layerStretch * layerThickness).where(mask, 0.)
     restingThickness = restingThickness.transpose('nCells', 'nVertLevels')
     return restingThickness
+
+
+def _cell_mask_kernel(minLevelCell, maxLevelCell, nVertLevels):
+    """
+    Compare the index of each level with the indices of the top and bottom
+    valid levels in each cell
+    """
+    zIndex = numpy.arange(nVertLevels)
+    return numpy.logical_and(
+        zIndex >= minLevelCell[..., numpy.newaxis],
+        zIndex <= maxLevelCell[..., numpy.newaxis])
@@ -1,10 +1,9 @@
 import xarray
-import numpy
 
 from compass.ocean.vertical.grid_1d import add_1d_grid
 from compass.ocean.vertical.partial_cells import alter_bottom_depth
 from compass.ocean.vertical.zlevel import compute_z_level_layer_thickness, \
-    compute_min_max_level_cell
+    compute_min_max_level_cell, compute_cell_mask
 
 
 def init_z_star_vertical_coord(config, ds):
@@ -109,15 +108,9 @@ def _compute_z_star_layer_thickness(restingThickness, ssh, bottomDepth,
     """
 
     nVertLevels = restingThickness.sizes['nVertLevels']
-    layerThickness = []
+    mask = compute_cell_mask(minLevelCell, maxLevelCell, nVertLevels)
 
     layerStretch = (ssh + bottomDepth) / bottomDepth
-    for zIndex in range(nVertLevels):
-        mask = numpy.logical_and(zIndex >= minLevelCell,
-                                 zIndex <= maxLevelCell)
-        thickness = layerStretch*restingThickness.isel(nVertLevels=zIndex)
-        thickness = thickness.where(mask, 0.)
-        layerThickness.append(thickness)
-    layerThickness = xarray.concat(layerThickness, dim='nVertLevels')
+    layerThickness = (layerStretch*restingThickness).where(mask, 0.)
     layerThickness = layerThickness.transpose('nCells', 'nVertLevels')
     return layerThickness
@@ -0,0 +1,142 @@
+import argparse
+import sys
+import os
+import re
+import json
+
+import numpy
+
+
+def show_performance(database='performance_history.jsonl', test_expr=None,
+                     timer_expr=None, threshold=0.1, history=5):
+    """
+    Show trends in the timers recorded in a performance database by
+    :py:func:`compass.validate.compare_timers()` and flag regressions
+
+    Parameters
+    ----------
+    database : str, optional
+        The performance database, with one JSON record per line
+
+    test_expr : str, optional
+        A regular expression for test case paths to show
+
+    timer_expr : str, optional
+        A regular expression for timer names to show
+
+    threshold : float, optional
+        The fractional increase in the wall time of the latest run compared
+        with the median of previous runs above which a regression is flagged
+
+    history : int, optional
+        The number of previous runs to compare the latest run with
+
+    Returns
+    -------
+    regressions : int
+        The number of timers that regressed in the latest run
+    """
+    if not os.path.exists(database):
+        raise OSError('Performance database {} not found.'.format(database))
+
+    # records are grouped by everything that should lead to comparable
+    # timing, and are kept in the order they were recorded
+    groups = dict()
+    with open(database) as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            record = json.loads(line)
+            test_path = record['test case']
+            if test_path is None:
+                test_path = record['run dir']
+            if test_expr is not None and not re.match(test_expr, test_path):
+                continue
+            if timer_expr is not None and \
+                    not re.match(timer_expr, record['timer']):
+                continue
+            key = (test_path, record['run dir'], record['timer'],
+                   record['machine'], record['cores'], record['threads'])
+            if key not in groups:
+                groups[key] = list()
+            groups[key].append(record)
+
+    # ANSI fail text: https://stackoverflow.com/a/287944/7728169
+    start_fail = '\033[91m'
+    start_pass = '\033[92m'
+    end = '\033[0m'
+    ok_str = '{}OK{}'.format(start_pass, end)
+    regression_str = '{}REGRESSION{}'.format(start_fail, end)
+
+    regressions = 0
+    for key in sorted(groups, key=str):
+        test_path, rundir, timer, machine, cores, threads = key
+        records = groups[key]
+        latest = records[-1]
+        previous = [record['wall time'] for record in
+                    records[-(history + 1):-1]]
+
+        print('{} ({})'.format(test_path, rundir))
+        print('  timer: {}'.format(timer))
+        print('  machine: {}, cores: {}, threads: {}'.format(
+            machine, cores, threads))
+        for record in records[-(history + 1):]:
+            print('    {}  {:12.5f}  {}'.format(
+                record['date'], record['wall time'],
+                record['compass git version']))
+        if len(previous) == 0:
+            print('  no previous runs to compare with\n')
+            continue
+
+        reference = numpy.median(previous)
+        if reference > 0.:
+            change = (latest['wall time'] - reference) / reference
+        else:
+            change = 0.
+        if change > threshold:
+            status = regression_str
+            regressions += 1
+        else:
+            status = ok_str
+        print('  {} change from median of previous {} run(s): '
+              '{:+.1f}%\n'.format(status, len(previous), 100. * change))
+
+    if regressions > 0:
+        print('{} timer(s) regressed by more than {:.1f}%'.format(
+            regressions, 100. * threshold))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Show performance trends recorded by test cases and flag '
+                    'regressions',
+        prog='compass perf')
+    parser.add_argument("-f", "--database", dest="database",
+                        default='performance_history.jsonl',
+                        help="The performance database to read from",
+                        metavar="FILE")
+    parser.add_argument("-t", "--test_expr", dest="test_expr",
+                        help="A regular expression for a test path name to "
+                             "search for",
+                        metavar="TEST")
+    parser.add_argument("--timer_expr", dest="timer_expr",
+                        help="A regular expression for a timer name to "
+                             "search for",
+                        metavar="TIMER")
+    parser.add_argument("--threshold", dest="threshold", type=float,
+                        default=0.1,
+                        help="The fractional slowdown compared with the "
+                             "median of previous runs above which a "
+                             "regression is flagged")
+    parser.add_argument("--history", dest="history", type=int, default=5,
+                        help="The number of previous runs to compare with")
+    args = parser.parse_args(sys.argv[2:])
+    regressions = show_performance(
+        database=args.database, test_expr=args.test_expr,
+        timer_expr=args.timer_expr, threshold=args.threshold,
+        history=args.history)
+    if regressions > 0:
+        sys.exit(1)
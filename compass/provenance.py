@@ -3,6 +3,7 @@ import sys
 import subprocess
 import configparser
 
+import compass
 from compass.config import add_config
 
 
@@ -33,12 +34,7 @@ def write(work_dir, test_cases, mpas_core=None, config_filename=None,
     """
     compass_git_version = None
     if os.path.exists('.git'):
-        try:
-            args = ['git', 'describe', '--tags', '--dirty', '--always']
-            compass_git_version = subprocess.check_output(args).decode('utf-8')
-            compass_git_version = compass_git_version.strip('\n')
-        except subprocess.CalledProcessError:
-            pass
+        compass_git_version = _get_git_version(os.getcwd())
 
     if mpas_core is None:
         # this is a call to clean and we don't need to document the MPAS
@@ -111,6 +107,39 @@ def write(work_dir, test_cases, mpas_core=None, config_filename=None,
     provenance_file.close()
 
 
+def get_versions(config):
+    """
+    Get the versions of compass and the MPAS model, as used to document the
+    provenance of performance records
+
+    Parameters
+    ----------
+    config : configparser.ConfigParser
+        Configuration options for the test case, used to find the MPAS model
+
+    Returns
+    -------
+    versions : dict
+        The ``compass`` version, along with the git versions of ``compass``
+        (if it is installed in development mode from a git repository) and of
+        the MPAS model (if it could be determined)
+    """
+    compass_path = os.path.dirname(os.path.abspath(compass.__file__))
+    compass_git_version = None
+    if os.path.exists(os.path.join(os.path.dirname(compass_path), '.git')):
+        compass_git_version = _get_git_version(compass_path)
+
+    mpas_git_version = None
+    if config.has_option('paths', 'mpas_model'):
+        mpas_model_path = config.get('paths', 'mpas_model')
+        if os.path.exists(mpas_model_path):
+            mpas_git_version = _get_git_version(mpas_model_path)
+
+    return {'compass version': compass.__version__,
+            'compass git version': compass_git_version,
+            'MPAS git version': mpas_git_version}
+
+
 def _get_mpas_git_version(mpas_core, config_filename, mpas_model_path):
 
     if mpas_model_path is None:
@@ -128,15 +157,16 @@ def _get_mpas_git_version(mpas_core, config_filename, mpas_model_path):
 
     mpas_model_path = os.path.abspath(mpas_model_path)
 
-    cwd = os.getcwd()
-    os.chdir(mpas_model_path)
+    return _get_git_version(mpas_model_path)
+
 
+def _get_git_version(directory):
+    """ Get the git version of the repository containing a directory """
     try:
         args = ['git', 'describe', '--tags', '--dirty', '--always']
-        mpas_git_version = subprocess.check_output(args).decode('utf-8')
-        mpas_git_version = mpas_git_version.strip('\n')
-    except subprocess.CalledProcessError:
-        mpas_git_version = None
-    os.chdir(cwd)
-
-    return mpas_git_version
+        git_version = subprocess.check_output(
+            args, cwd=directory, stderr=subprocess.DEVNULL).decode('utf-8')
+        git_version = git_version.strip('\n')
+    except (subprocess.CalledProcessError, OSError):
+        git_version = None
+    return git_version
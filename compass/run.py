@@ -9,8 +9,11 @@ import glob
 
 from mpas_tools.logging import LoggingContext
 
+from compass.parallel import get_available_cores_and_nodes
+from compass.scheduler import run_steps_concurrently
 
-def run_suite(suite_name):
+
+def run_suite(suite_name, concurrent=False, incremental=False):
     """
     Run the given test suite
 
@@ -18,16 +21,16 @@ def run_suite(suite_name):
     ----------
     suite_name : str
         The name of the test suite
-    """
-    # ANSI fail text: https://stackoverflow.com/a/287944/7728169
-    start_fail = '\033[91m'
-    start_pass = '\033[92m'
-    end = '\033[0m'
-    pass_str = '{}PASS{}'.format(start_pass, end)
-    success_str = '{}SUCCESS{}'.format(start_pass, end)
-    fail_str = '{}FAIL{}'.format(start_fail, end)
-    error_str = '{}ERROR{}'.format(start_fail, end)
 
+    concurrent : bool, optional
+        Whether to run steps from all test cases in the suite concurrently,
+        as allowed by their dependencies on one another and the number of
+        available cores, rather than running one test case at a time
+
+    incremental : bool, optional
+        Whether to skip steps whose inputs, settings and outputs are unchanged
+        since they last ran successfully
+    """
     # Allow a suite name to either include or not the .pickle suffix
     if suite_name.endswith('.pickle'):
         # code below assumes no suffix, so remove it
@@ -39,6 +42,9 @@ def run_suite(suite_name):
     with open('{}.pickle'.format(suite_name), 'rb') as handle:
         test_suite = pickle.load(handle)
 
+    for test_case in test_suite['test_cases'].values():
+        test_case.incremental = incremental
+
     # start logging to stdout/stderr
     with LoggingContext(suite_name) as logger:
 
@@ -49,95 +55,15 @@ def run_suite(suite_name):
         except OSError:
             pass
 
-        failures = 0
         cwd = os.getcwd()
         suite_start = time.time()
-        test_times = dict()
-        success = dict()
-        for test_name in test_suite['test_cases']:
-            test_case = test_suite['test_cases'][test_name]
-
-            logger.info('{}'.format(test_name))
-
-            test_name = test_case.path.replace('/', '_')
-            log_filename = '{}/case_outputs/{}.log'.format(cwd, test_name)
-            with LoggingContext(test_name, log_filename=log_filename) as \
-                    test_logger:
-                test_case.logger = test_logger
-                test_case.log_filename = log_filename
-                test_case.new_step_log_file = False
-
-                os.chdir(test_case.work_dir)
-
-                config = configparser.ConfigParser(
-                    interpolation=configparser.ExtendedInterpolation())
-                config.read(test_case.config_filename)
-                test_case.config = config
-
-                test_case.steps_to_run = config.get(
-                    'test_case', 'steps_to_run').replace(',', ' ').split()
-
-                test_start = time.time()
-                try:
-                    test_case.run()
-                    run_status = success_str
-                    test_pass = True
-                except BaseException:
-                    run_status = error_str
-                    test_pass = False
-                    test_logger.exception('Exception raised in run()')
-
-                if test_pass:
-                    try:
-                        test_case.validate()
-                    except BaseException:
-                        run_status = error_str
-                        test_pass = False
-                        test_logger.exception('Exception raised in validate()')
-
-                baseline_status = None
-                internal_status = None
-                if test_case.validation is not None:
-                    internal_pass = test_case.validation['internal_pass']
-                    baseline_pass = test_case.validation['baseline_pass']
-
-                    if internal_pass is not None:
-                        if internal_pass:
-                            internal_status = pass_str
-                        else:
-                            internal_status = fail_str
-                            test_logger.exception(
-                                'Internal test case validation failed')
-                            test_pass = False
-
-                    if baseline_pass is not None:
-                        if baseline_pass:
-                            baseline_status = pass_str
-                        else:
-                            baseline_status = fail_str
-                            test_logger.exception('Baseline validation failed')
-                            test_pass = False
-
-                status = '  test execution:      {}'.format(run_status)
-                if internal_status is not None:
-                    status = '{}\n  test validation:     {}'.format(
-                        status, internal_status)
-                if baseline_status is not None:
-                    status = '{}\n  baseline comparison: {}'.format(
-                        status, baseline_status)
-
-                if test_pass:
-                    logger.info(status)
-                    success[test_name] = pass_str
-                else:
-                    logger.error(status)
-                    logger.error('  see: case_outputs/{}.log'.format(
-                        test_name))
-                    success[test_name] = fail_str
-                    failures += 1
-
-                test_times[test_name] = time.time() - test_start
-
+        if concurrent:
+            success, test_times = _run_test_cases_concurrently(
+                test_suite['test_cases'], logger)
+        else:
+            success, test_times = _run_test_cases_serially(
+                test_suite['test_cases'], logger)
+        failures = sum(status == _fail_str for status in success.values())
         suite_time = time.time() - suite_start
 
         os.chdir(cwd)
@@ -165,7 +91,8 @@ def run_suite(suite_name):
             sys.exit(1)
 
 
-def run_test_case(steps_to_run=None, steps_not_to_run=None):
+def run_test_case(steps_to_run=None, steps_not_to_run=None,
+                  incremental=False):
     """
     Used by the framework to run a test case when ``compass run`` gets called
     in the test case's work directory
@@ -179,6 +106,10 @@ def run_test_case(steps_to_run=None, steps_not_to_run=None):
     steps_not_to_run : list of str, optional
         A list of steps not to run.  Typically, these are steps to remove from
         the defaults
+
+    incremental : bool, optional
+        Whether to skip steps whose inputs, settings and outputs are unchanged
+        since they last ran successfully
     """
     with open('test_case.pickle', 'rb') as handle:
         test_case = pickle.load(handle)
@@ -210,6 +141,7 @@ def run_test_case(steps_to_run=None, steps_not_to_run=None):
                         steps_not_to_run]
 
     test_case.steps_to_run = steps_to_run
+    test_case.incremental = incremental
 
     # start logging to stdout/stderr
     test_name = test_case.path.replace('/', '_')
@@ -221,15 +153,22 @@ def run_test_case(steps_to_run=None, steps_not_to_run=None):
         test_case.validate()
 
 
-def run_step():
+def run_step(incremental=False):
     """
     Used by the framework to run a step when ``compass run`` gets called in the
     step's work directory
+
+    Parameters
+    ----------
+    incremental : bool, optional
+        Whether to skip the step if its inputs, settings and outputs are
+        unchanged since it last ran successfully
     """
     with open('step.pickle', 'rb') as handle:
         test_case, step = pickle.load(handle)
     test_case.steps_to_run = [step.name]
     test_case.new_step_log_file = False
+    test_case.incremental = incremental
 
     config = configparser.ConfigParser(
         interpolation=configparser.ExtendedInterpolation())
@@ -251,6 +190,16 @@ def main():
     parser.add_argument("suite", nargs='?', default=None,
                         help="The name of a test suite to run. Can exclude "
                         "or include the .pickle filename suffix.")
+    parser.add_argument("--concurrent", dest="concurrent",
+                        action="store_true",
+                        help="Run the steps of all test cases in a suite "
+                             "concurrently, as dependencies between steps and "
+                             "available cores allow")
+    parser.add_argument("--incremental", dest="incremental",
+                        action="store_true",
+                        help="Skip steps whose inputs, settings and outputs "
+                             "are unchanged since they last ran "
+                             "successfully")
     parser.add_argument("--steps", dest="steps", nargs='+', default=None,
                         help="The steps of a test case to run")
     parser.add_argument("--no-steps", dest="no_steps", nargs='+', default=None,
@@ -258,19 +207,219 @@ def main():
                              "steps_to_run in the config file for defaults.")
     args = parser.parse_args(sys.argv[2:])
     if args.suite is not None:
-        run_suite(args.suite)
+        run_suite(args.suite, concurrent=args.concurrent,
+                  incremental=args.incremental)
     elif os.path.exists('test_case.pickle'):
-        run_test_case(args.steps, args.no_steps)
+        run_test_case(args.steps, args.no_steps,
+                      incremental=args.incremental)
     elif os.path.exists('step.pickle'):
-        run_step()
+        run_step(incremental=args.incremental)
     else:
         pickles = glob.glob('*.pickle')
         if len(pickles) == 1:
             suite = os.path.splitext(os.path.basename(pickles[0]))[0]
-            run_suite(suite)
+            run_suite(suite, concurrent=args.concurrent,
+                      incremental=args.incremental)
         elif len(pickles) == 0:
             raise OSError('No pickle files were found. Are you sure this is '
                           'a compass suite, test-case or step work directory?')
         else:
             raise ValueError('More than one suite was found. Please specify '
                              'which to run: compass run <suite>')
+
+
+# ANSI fail text: https://stackoverflow.com/a/287944/7728169
+_start_fail = '\033[91m'
+_start_pass = '\033[92m'
+_end = '\033[0m'
+_pass_str = '{}PASS{}'.format(_start_pass, _end)
+_success_str = '{}SUCCESS{}'.format(_start_pass, _end)
+_fail_str = '{}FAIL{}'.format(_start_fail, _end)
+_error_str = '{}ERROR{}'.format(_start_fail, _end)
+
+
+def _run_test_cases_serially(test_cases, logger):
+    """ Run each test case in turn, running its steps one at a time """
+    cwd = os.getcwd()
+    test_times = dict()
+    success = dict()
+    for test_name in test_cases:
+        test_case = test_cases[test_name]
+
+        logger.info('{}'.format(test_name))
+
+        test_name = test_case.path.replace('/', '_')
+        log_filename = '{}/case_outputs/{}.log'.format(cwd, test_name)
+        with LoggingContext(test_name, log_filename=log_filename) as \
+                test_logger:
+            _prepare_test_case(test_case, test_logger, log_filename)
+
+            test_start = time.time()
+            try:
+                test_case.run()
+                run_pass = True
+            except BaseException:
+                run_pass = False
+                test_logger.exception('Exception raised in run()')
+
+            success[test_name] = _validate_test_case(
+                test_case, run_pass, logger, test_logger)
+
+            test_times[test_name] = time.time() - test_start
+
+    return success, test_times
+
+
+def _run_test_cases_concurrently(test_cases, logger):
+    """
+    Prepare all test cases, run their steps concurrently and then validate
+    each test case
+    """
+    cwd = os.getcwd()
+    log_dir = '{}/case_outputs'.format(cwd)
+    steps = dict()
+    run_pass = dict()
+    available_cores = None
+    for test_case in test_cases.values():
+        test_name = test_case.path.replace('/', '_')
+        log_filename = '{}/{}.log'.format(log_dir, test_name)
+        with LoggingContext(test_name, log_filename=log_filename) as \
+                test_logger:
+            _prepare_test_case(test_case, test_logger, log_filename)
+            if available_cores is None:
+                available_cores, _ = get_available_cores_and_nodes(
+                    test_case.config)
+
+            # steps are collected but not run
+            test_case.defer_steps = True
+            try:
+                test_case.run()
+                run_pass[test_name] = True
+            except BaseException:
+                run_pass[test_name] = False
+                test_logger.exception('Exception raised in run()')
+                continue
+
+            for step_name in test_case.steps_to_run:
+                step = test_case.steps[step_name]
+                steps[step.path] = (test_case, step)
+
+    os.chdir(cwd)
+    logger.info('Running steps on {} cores:'.format(available_cores))
+    step_success, step_times = run_steps_concurrently(
+        steps, available_cores, logger, log_dir)
+
+    test_times = dict()
+    success = dict()
+    for test_name in test_cases:
+        test_case = test_cases[test_name]
+
+        logger.info('{}'.format(test_name))
+
+        test_name = test_case.path.replace('/', '_')
+        log_filename = '{}/{}.log'.format(log_dir, test_name)
+        test_steps = [test_case.steps[step_name].path for step_name in
+                      test_case.steps_to_run]
+        times = [step_times[path] for path in test_steps
+                 if path in step_times]
+        if len(times) > 0:
+            test_times[test_name] = (max(end for _, end in times) -
+                                     min(start for start, _ in times))
+        else:
+            test_times[test_name] = 0.
+
+        with LoggingContext(test_name, log_filename=log_filename) as \
+                test_logger:
+            test_case.logger = test_logger
+            os.chdir(test_case.work_dir)
+            test_pass = run_pass[test_name]
+            if test_pass:
+                for path in test_steps:
+                    if not step_success[path]:
+                        test_pass = False
+                        test_logger.error(
+                            'Step {} failed, see: case_outputs/{}.log'.format(
+                                path, path.replace('/', '_')))
+
+            success[test_name] = _validate_test_case(
+                test_case, test_pass, logger, test_logger)
+
+    return success, test_times
+
+
+def _prepare_test_case(test_case, test_logger, log_filename):
+    """ Read the config file and set up logging for running a test case """
+    test_case.logger = test_logger
+    test_case.log_filename = log_filename
+    test_case.new_step_log_file = False
+
+    os.chdir(test_case.work_dir)
+
+    config = configparser.ConfigParser(
+        interpolation=configparser.ExtendedInterpolation())
+    config.read(test_case.config_filename)
+    test_case.config = config
+
+    test_case.steps_to_run = config.get(
+        'test_case', 'steps_to_run').replace(',', ' ').split()
+
+
+def _validate_test_case(test_case, run_pass, logger, test_logger):
+    """
+    Validate a test case that has been run and log its status, returning
+    the string to use for the test case's status in the runtime summary
+    """
+    test_name = test_case.path.replace('/', '_')
+    if run_pass:
+        run_status = _success_str
+        test_pass = True
+    else:
+        run_status = _error_str
+        test_pass = False
+
+    if test_pass:
+        try:
+            test_case.validate()
+        except BaseException:
+            run_status = _error_str
+            test_pass = False
+            test_logger.exception('Exception raised in validate()')
+
+    baseline_status = None
+    internal_status = None
+    if test_case.validation is not None:
+        internal_pass = test_case.validation['internal_pass']
+        baseline_pass = test_case.validation['baseline_pass']
+
+        if internal_pass is not None:
+            if internal_pass:
+                internal_status = _pass_str
+            else:
+                internal_status = _fail_str
+                test_logger.exception(
+                    'Internal test case validation failed')
+                test_pass = False
+
+        if baseline_pass is not None:
+            if baseline_pass:
+                baseline_status = _pass_str
+            else:
+                baseline_status = _fail_str
+                test_logger.exception('Baseline validation failed')
+                test_pass = False
+
+    status = '  test execution:      {}'.format(run_status)
+    if internal_status is not None:
+        status = '{}\n  test validation:     {}'.format(
+            status, internal_status)
+    if baseline_status is not None:
+        status = '{}\n  baseline comparison: {}'.format(
+            status, baseline_status)
+
+    if test_pass:
+        logger.info(status)
+        return _pass_str
+    else:
+        logger.error(status)
+        logger.error('  see: case_outputs/{}.log'.format(test_name))
+        return _fail_str
@@ -0,0 +1,164 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from mpas_tools.logging import LoggingContext
+
+
+def get_step_dependencies(steps):
+    """
+    Build a dependency graph between steps from their inputs and outputs.  A
+    step depends on another if one of its inputs is an output of the other.
+
+    Parameters
+    ----------
+    steps : dict
+        A dictionary with the paths of steps as keys and tuples of the test
+        case and step (``compass.TestCase`` and ``compass.Step``) as values.
+        The ``inputs`` and ``outputs`` of each step must already be absolute
+        paths, as is the case after the step has been set up.
+
+    Returns
+    -------
+    dependencies : dict of set
+        For each step path, the paths of other steps in ``steps`` that produce
+        one or more of its inputs
+    """
+    producers = dict()
+    for path, (_, step) in steps.items():
+        for output in step.outputs:
+            producers[output] = path
+
+    dependencies = dict()
+    for path, (_, step) in steps.items():
+        dependencies[path] = set()
+        for input_file in step.inputs:
+            if input_file in producers and producers[input_file] != path:
+                dependencies[path].add(producers[input_file])
+
+    return dependencies
+
+
+def run_steps_concurrently(steps, available_cores, logger, log_dir):
+    """
+    Run steps (possibly from several test cases) concurrently, launching each
+    step as soon as all steps that produce its inputs have completed
+    successfully and enough cores are free.  Steps are considered in the
+    order they are given, so earlier steps get priority but later steps can
+    fill in cores that would otherwise be idle.
+
+    Parameters
+    ----------
+    steps : dict
+        A dictionary with the paths of steps as keys and tuples of the test
+        case and step (``compass.TestCase`` and ``compass.Step``) as values
+
+    available_cores : int
+        The total number of cores available for running steps
+
+    logger : logging.Logger
+        A logger for reporting when steps start and finish
+
+    log_dir : str
+        A directory where a log file for each step will be written
+
+    Returns
+    -------
+    success : dict of bool
+        Whether each step ran successfully.  Steps that were not run because
+        a step they depend on failed are marked as unsuccessful.
+
+    times : dict of tuple
+        The start and end times of each step that was run
+    """
+    dependencies = get_step_dependencies(steps)
+
+    success = dict()
+    times = dict()
+    pending = list(steps)
+    running = dict()
+    free_cores = available_cores
+
+    workers = max(1, min(available_cores, len(steps)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while len(pending) > 0 or len(running) > 0:
+            for path in list(pending):
+                deps = dependencies[path]
+                if any(dep in success and not success[dep] for dep in deps):
+                    logger.error('  {} skipped because a step it depends on '
+                                 'failed'.format(path))
+                    success[path] = False
+                    pending.remove(path)
+                    continue
+
+                if not all(dep in success for dep in deps):
+                    continue
+
+                test_case, step = steps[path]
+                cores = _get_required_cores(step, available_cores)
+                if cores > free_cores:
+                    continue
+
+                log_filename = '{}/{}.log'.format(
+                    log_dir, path.replace('/', '_'))
+                logger.info('  {} started on {} core(s)'.format(path, cores))
+                future = executor.submit(_run_step, test_case, step,
+                                         log_filename)
+                running[future] = (path, cores)
+                times[path] = (time.time(), None)
+                free_cores -= cores
+                pending.remove(path)
+
+            if len(running) == 0:
+                if len(pending) > 0:
+                    raise ValueError('Could not schedule steps, there may be '
+                                     'a circular dependency: {}'.format(
+                                         ', '.join(pending)))
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, cores = running.pop(future)
+                free_cores += cores
+                start, _ = times[path]
+                times[path] = (start, time.time())
+                try:
+                    success[path] = future.result()
+                except BaseException:
+                    logger.exception('  {} could not be run'.format(path))
+                    success[path] = False
+                if success[path]:
+                    logger.info('  {} complete'.format(path))
+                else:
+                    logger.error('  {} failed, see: {}.log'.format(
+                        path, path.replace('/', '_')))
+
+    return success, times
+
+
+def _get_required_cores(step, available_cores):
+    """
+    The number of cores to reserve for a step, accounting for threading but
+    never more than are available
+    """
+    cores = min(step.cores, available_cores)
+    if step.min_cores is not None:
+        cores = max(cores, step.min_cores)
+    return min(cores * step.threads, available_cores)
+
+
+def _run_step(test_case, step, log_filename):
+    """
+    Run a step in a worker process, logging to the given file
+    """
+    test_name = step.path.replace('/', '_')
+    with LoggingContext(test_name, log_filename=log_filename) as logger:
+        test_case.logger = logger
+        test_case.log_filename = log_filename
+        test_case.new_step_log_file = False
+        step.log_filename = log_filename
+        try:
+            test_case._run_step(step, new_log_file=False)
+        except BaseException:
+            logger.exception('Exception raised in run()')
+            return False
+    return True
@@ -0,0 +1,49 @@
+import numpy
+from scipy.spatial import cKDTree
+
+
+def find_section_cells(xCell, yCell, xSection, ySection, samples=10000):
+    """
+    Find the sequence of cells along a section, a polyline through points in
+    the x-y plane.  The section is sampled at evenly spaced points and the
+    nearest cell center to each sample is found with a k-d tree.
+
+    Parameters
+    ----------
+    xCell, yCell : numpy.ndarray
+        The x and y coordinates of cell centers
+
+    xSection, ySection : list or numpy.ndarray
+        The x and y coordinates of the points along the section
+
+    samples : int, optional
+        The number of points along the section at which to find the nearest
+        cell
+
+    Returns
+    -------
+    cellIndices : numpy.ndarray
+        The indices of the cells along the section, in order from the first
+        point to the last, with consecutive repeats removed
+    """
+    xSection = numpy.asarray(xSection, dtype=float)
+    ySection = numpy.asarray(ySection, dtype=float)
+    if len(xSection) < 2 or len(xSection) != len(ySection):
+        raise ValueError('A section needs x and y coordinates for at least 2 '
+                         'points')
+
+    # sample evenly in distance along the section
+    distance = numpy.zeros(len(xSection))
+    distance[1:] = numpy.cumsum(numpy.sqrt(numpy.diff(xSection)**2 +
+                                           numpy.diff(ySection)**2))
+    sampleDistance = numpy.linspace(0., distance[-1], samples)
+    x = numpy.interp(sampleDistance, distance, xSection)
+    y = numpy.interp(sampleDistance, distance, ySection)
+
+    tree = cKDTree(numpy.vstack((numpy.asarray(xCell),
+                                 numpy.asarray(yCell))).T)
+    _, cellIndices = tree.query(numpy.vstack((x, y)).T)
+
+    keep = numpy.ones(len(cellIndices), dtype=bool)
+    keep[1:] = cellIndices[1:] != cellIndices[:-1]
+    return cellIndices[keep]
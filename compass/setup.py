@@ -3,15 +3,20 @@ import sys
 import configparser
 import os
 import pickle
-
-from compass.mpas_cores import get_mpas_cores
-from compass.config import add_config, ensure_absolute_paths
-from compass.io import symlink
+from io import StringIO
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+from compass.mpas_cores import get_test_case_index, get_test_cases
+from compass.config import add_config, add_config_file, duplicate_config, \
+    ensure_absolute_paths
+from compass.io import symlink, download_files
 from compass import provenance
 
 
 def setup_cases(tests=None, numbers=None, config_file=None, machine=None,
-                work_dir=None, baseline_dir=None, mpas_model_path=None):
+                work_dir=None, baseline_dir=None, mpas_model_path=None,
+                workers=1):
     """
     Set up one or more test cases
 
@@ -41,6 +46,11 @@ def setup_cases(tests=None, numbers=None, config_file=None, machine=None,
         The relative or absolute path to the root of a branch where the MPAS
         model has been built
 
+    workers : int, optional
+        The number of processes to use to set up test cases in parallel.
+        Output from setting up each test case is printed in order once it has
+        been set up.
+
     Returns
     -------
     test_cases : dict of compass.TestCase
@@ -59,30 +69,29 @@ def setup_cases(tests=None, numbers=None, config_file=None, machine=None,
     if work_dir is None:
         work_dir = os.getcwd()
 
-    mpas_cores = get_mpas_cores()
-
-    all_test_cases = dict()
-    for mpas_core in mpas_cores:
-        for test_group in mpas_core.test_groups.values():
-            for test_case in test_group.test_cases.values():
-                all_test_cases[test_case.path] = test_case
+    # only the test groups of the requested test cases are imported
+    all_paths = [test_case['path'] for test_case in get_test_case_index()]
 
-    test_cases = dict()
+    paths = list()
     if numbers is not None:
-        keys = list(all_test_cases)
         for number in numbers:
-            if number >= len(keys):
+            if number >= len(all_paths):
                 raise ValueError('test number {} is out of range.  There are '
-                                 'only {} tests.'.format(number, len(keys)))
-            path = keys[number]
-            test_cases[path] = all_test_cases[path]
+                                 'only {} tests.'.format(number,
+                                                         len(all_paths)))
+            path = all_paths[number]
+            if path not in paths:
+                paths.append(path)
 
     if tests is not None:
         for path in tests:
-            if path not in all_test_cases:
+            if path not in all_paths:
                 raise ValueError('Test case with path {} is not in '
                                  'test_cases'.format(path))
-            test_cases[path] = all_test_cases[path]
+            if path not in paths:
+                paths.append(path)
+
+    test_cases = get_test_cases(paths)
 
     # get the MPAS core of the first test case.  We'll assume all tests are
     # for this core
@@ -93,9 +102,28 @@ def setup_cases(tests=None, numbers=None, config_file=None, machine=None,
                      mpas_model_path=mpas_model_path)
 
     print('Setting up test cases:')
-    for path, test_case in test_cases.items():
-        setup_case(path, test_case, config_file, machine, work_dir,
-                   baseline_dir, mpas_model_path)
+    workers = min(workers, len(test_cases))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            _map_in_processes(
+                executor, test_cases, _setup_steps_in_process, config_file,
+                machine, work_dir, baseline_dir, mpas_model_path)
+
+            # download the files needed by all test cases at once, so files
+            # shared between test cases are only downloaded once
+            _download_files(test_cases)
+
+            _map_in_processes(executor, test_cases,
+                              _process_inputs_in_process)
+    else:
+        for path, test_case in test_cases.items():
+            _setup_steps(path, test_case, config_file, machine, work_dir,
+                         baseline_dir, mpas_model_path)
+
+        _download_files(test_cases)
+
+        for test_case in test_cases.values():
+            _process_inputs(test_case)
 
     return test_cases
 
@@ -132,28 +160,30 @@ def setup_case(path, test_case, config_file, machine, work_dir, baseline_dir,
         model has been built
     """
 
-    print('  {}'.format(path))
+    _setup_steps(path, test_case, config_file, machine, work_dir,
+                 baseline_dir, mpas_model_path)
+
+    _download_files({path: test_case})
 
-    config = configparser.ConfigParser(
-        interpolation=configparser.ExtendedInterpolation())
+    _process_inputs(test_case)
 
-    # start with default compass config options
-    add_config(config, 'compass', 'default.cfg')
 
-    # add the machine config file
+def _setup_steps(path, test_case, config_file, machine, work_dir, baseline_dir,
+                 mpas_model_path):
+    """
+    Configure a test case, write its config file and set up its steps, up to
+    the point where files need to be downloaded
+    """
+    print('  {}'.format(path))
+
+    # start with a copy of the config options shared by all test cases in the
+    # test group
     if machine is None:
         machine = 'default'
-    add_config(config, 'compass.machines', '{}.cfg'.format(machine))
-
-    # add the config options for the MPAS core
     mpas_core = test_case.mpas_core.name
-    add_config(config, 'compass.{}'.format(mpas_core),
-               '{}.cfg'.format(mpas_core))
-
-    # add the config options for the test group (if defined)
     test_group = test_case.test_group.name
-    add_config(config, 'compass.{}.tests.{}'.format(mpas_core, test_group),
-               '{}.cfg'.format(test_group), exception=False)
+    config = duplicate_config(_get_shared_config(machine, mpas_core,
+                                                 test_group))
 
     # add the config options for the test case (if defined)
     add_config(config, test_case.__module__,
@@ -170,7 +200,7 @@ def setup_case(path, test_case, config_file, machine, work_dir, baseline_dir,
     # add the custom config file once before calling configure() in case we
     # need to use the config options from there
     if config_file is not None:
-        config.read(config_file)
+        add_config_file(config, config_file)
 
     # add config options specific to the test case
     test_case.config = config
@@ -179,7 +209,7 @@ def setup_case(path, test_case, config_file, machine, work_dir, baseline_dir,
     # add the custom config file (again) last, so these options are the
     # defaults
     if config_file is not None:
-        config.read(config_file)
+        add_config_file(config, config_file)
 
     # add the baseline directory for this test case
     if baseline_dir is not None:
@@ -195,6 +225,14 @@ def setup_case(path, test_case, config_file, machine, work_dir, baseline_dir,
     # absolute paths
     ensure_absolute_paths(config)
 
+    # the performance database is relative to the base work directory, so all
+    # test cases in a work directory record to the same file
+    if config.has_option('performance', 'database'):
+        database = config.get('performance', 'database')
+        if database != '':
+            config.set('performance', 'database',
+                       os.path.abspath(os.path.join(work_dir, database)))
+
     # write out the config file
     test_case_config = '{}.cfg'.format(test_case.name)
     test_case.config_filename = test_case_config
@@ -221,6 +259,27 @@ def setup_case(path, test_case, config_file, machine, work_dir, baseline_dir,
         # set up the step
         step.setup()
 
+
+def _download_files(test_cases):
+    """
+    Download the files needed by the steps of all the given test cases at
+    once, so a file shared between test cases is only downloaded once
+    """
+    downloads = list()
+    for test_case in test_cases.values():
+        for step in test_case.steps.values():
+            downloads.extend(step.get_downloads())
+    if len(downloads) > 0:
+        config = next(iter(test_cases.values())).config
+        download_files(downloads, config)
+
+
+def _process_inputs(test_case):
+    """
+    Process the inputs and outputs of the steps in a test case once any files
+    have been downloaded, then pickle the test case and its steps
+    """
+    for step in test_case.steps.values():
         # process input, output, namelist and streams files
         step.process_inputs_and_outputs()
 
@@ -242,10 +301,84 @@ def setup_case(path, test_case, config_file, machine, work_dir, baseline_dir,
     if 'LOAD_COMPASS_ENV' in os.environ:
         script_filename = os.environ['LOAD_COMPASS_ENV']
         # make a symlink to the script for loading the compass conda env.
-        symlink(script_filename, os.path.join(test_case_dir,
+        symlink(script_filename, os.path.join(test_case.work_dir,
                                               'load_compass_env.sh'))
 
 
+def _map_in_processes(executor, test_cases, func, *args):
+    """
+    Call a setup function on each test case in a worker process, printing
+    the output in order and keeping the updated copies of the test cases
+    """
+    futures = [executor.submit(func, path, test_case, *args)
+               for path, test_case in test_cases.items()]
+    for path, future in zip(list(test_cases), futures):
+        test_case, output = future.result()
+        print(output, end='')
+        # the test case was set up in another process so we need to keep its
+        # updated copy
+        test_cases[path] = test_case
+
+
+def _setup_steps_in_process(path, test_case, config_file, machine, work_dir,
+                            baseline_dir, mpas_model_path):
+    """
+    Set up the steps of a test case in a worker process, capturing its output
+    to be printed by the main process
+    """
+    output = StringIO()
+    with redirect_stdout(output):
+        _setup_steps(path, test_case, config_file, machine, work_dir,
+                     baseline_dir, mpas_model_path)
+    return test_case, output.getvalue()
+
+
+def _process_inputs_in_process(path, test_case):
+    """
+    Process the inputs and outputs of a test case in a worker process,
+    capturing its output to be printed by the main process
+    """
+    output = StringIO()
+    with redirect_stdout(output):
+        _process_inputs(test_case)
+    return test_case, output.getvalue()
+
+
+def _get_shared_config(machine, mpas_core, test_group):
+    """
+    Get the config options from the default, machine, MPAS core and test group
+    config files, which are only combined once per process for each test
+    group.  Callers must not modify the result, only a copy of it.
+    """
+    key = (machine, mpas_core, test_group)
+    if key not in _shared_configs:
+        config = configparser.ConfigParser(
+            interpolation=configparser.ExtendedInterpolation())
+
+        # start with default compass config options
+        add_config(config, 'compass', 'default.cfg')
+
+        # add the machine config file
+        add_config(config, 'compass.machines', '{}.cfg'.format(machine))
+
+        # add the config options for the MPAS core
+        add_config(config, 'compass.{}'.format(mpas_core),
+                   '{}.cfg'.format(mpas_core))
+
+        # add the config options for the test group (if defined)
+        add_config(config,
+                   'compass.{}.tests.{}'.format(mpas_core, test_group),
+                   '{}.cfg'.format(test_group), exception=False)
+
+        _shared_configs[key] = config
+
+    return _shared_configs[key]
+
+
+# config options shared by the test cases in each test group
+_shared_configs = dict()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Set up one or more test cases', prog='compass setup')
@@ -274,6 +407,10 @@ def main():
                         help="The path to the build of the MPAS model for the "
                              "core.",
                         metavar="PATH")
+    parser.add_argument("--workers", dest="workers", type=int, default=1,
+                        help="The number of processes to use to set up test "
+                             "cases in parallel",
+                        metavar="NUM")
 
     args = parser.parse_args(sys.argv[2:])
     if args.test is None:
@@ -283,4 +420,4 @@ def main():
     setup_cases(tests=tests, numbers=args.case_num,
                 config_file=args.config_file, machine=args.machine,
                 work_dir=args.work_dir, baseline_dir=args.baseline_dir,
-                mpas_model_path=args.mpas_model)
+                mpas_model_path=args.mpas_model, workers=args.workers)
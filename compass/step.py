@@ -1,5 +1,4 @@
 import os
-from lxml import etree
 import configparser
 from importlib.resources import path
 import shutil
@@ -90,6 +89,11 @@ class Step:
         a dictionary used internally to keep track of updates to the default
         streams from calls to :py:meth:`compass.Step.add_streams_file`
 
+    output_cache : dict or None
+        the step attributes and config sections that determine the step's
+        outputs if they can be taken from the step-output cache, set by
+        :py:meth:`compass.Step.use_output_cache`
+
     config : configparser.ConfigParser
         Configuration options for this test case, a combination of the defaults
         for the machine, core and configuration
@@ -175,6 +179,7 @@ class Step:
         self.outputs = list()
         self.namelist_data = dict()
         self.streams_data = dict()
+        self.output_cache = None
 
         # these will be set later during setup
         self.config = None
@@ -274,6 +279,32 @@ class Step:
         """
         self.outputs.append(filename)
 
+    def use_output_cache(self, attributes=None, config_sections=None):
+        """
+        Allow the outputs of this step to be taken from the step-output cache
+        if another step has already produced them, and to be added to the
+        cache once this step has run.  Outputs are cached under a hash of the
+        step's class and module source, the given attributes and config
+        sections, and the contents of its input files, so these must
+        determine the outputs completely.
+
+        Parameters
+        ----------
+        attributes : list of str, optional
+            The names of attributes of the step (typically set from arguments
+            to its constructor) that affect its outputs
+
+        config_sections : list of str, optional
+            The config sections with options that affect the step's outputs.
+            The default is the section named after the test group
+        """
+        if attributes is None:
+            attributes = list()
+        if config_sections is None:
+            config_sections = [self.test_group.name]
+        self.output_cache = dict(attributes=list(attributes),
+                                 config_sections=list(config_sections))
+
     def add_model_as_input(self):
         """
         make a link to the model executable and add it to the inputs
@@ -450,57 +481,12 @@ class Step:
 
         Also generates namelist and streams files
        """
-        mpas_core = self.mpas_core.name
         step_dir = self.work_dir
         config = self.config
 
         inputs = []
         for entry in self.input_data:
-            filename = entry['filename']
-            target = entry['target']
-            database = entry['database']
-            url = entry['url']
-            work_dir_target = entry['work_dir_target']
-            package = entry['package']
-            copy = entry['copy']
-
-            if filename == '<<<model>>>':
-                model = self.config.get('executables', 'model')
-                filename = os.path.basename(model)
-                target = os.path.abspath(model)
-
-            if package is not None:
-                if target is None:
-                    target = filename
-                with path(package, target) as package_path:
-                    target = str(package_path)
-
-            if work_dir_target is not None:
-                target = os.path.join(self.base_work_dir, work_dir_target)
-
-            if target is not None:
-                download_target = target
-            else:
-                download_target = filename
-
-            download_path = None
-
-            if database is not None:
-                # we're downloading a file to a cache of a database (if it's
-                # not already there.
-                if url is None:
-                    base_url = config.get('download', 'server_base_url')
-                    core_path = config.get('download', 'core_path')
-                    url = '{}/{}/{}'.format(base_url, core_path, database)
-
-                    url = '{}/{}'.format(url, target)
-
-                database_root = config.get(
-                    'paths', '{}_database_root'.format(mpas_core))
-                download_path = os.path.join(database_root, database,
-                                             download_target)
-            elif url is not None:
-                download_path = download_target
+            filename, target, url, download_path = self._resolve_input(entry)
 
             if url is not None:
                 download_target = download(url, download_path, config)
@@ -510,7 +496,7 @@ class Step:
 
             if target is not None:
                 filepath = os.path.join(step_dir, filename)
-                if copy:
+                if entry['copy']:
                     shutil.copy(target, filepath)
                 else:
                     symlink(target, filepath)
@@ -528,6 +514,81 @@ class Step:
         self._generate_namelists()
         self._generate_streams()
 
+    def get_downloads(self):
+        """
+        Get the files that need to be downloaded for the inputs to the step
+        added with :py:meth:`compass.Step.add_input_file`.  The framework
+        uses this to download the files for all steps in a test case at once
+        before calling :py:meth:`compass.Step.process_inputs_and_outputs`.
+
+        Returns
+        -------
+        downloads : list of tuple
+            The URL and the absolute path of the local destination for each
+            file to download
+        """
+        downloads = list()
+        for entry in self.input_data:
+            _, _, url, download_path = self._resolve_input(entry)
+            if url is not None:
+                downloads.append((url, os.path.abspath(download_path)))
+        return downloads
+
+    def _resolve_input(self, entry):
+        """
+        Determine the local file name, the target of the symlink (if any),
+        and the URL and local path for downloading (if any) for an input file
+        """
+        mpas_core = self.mpas_core.name
+        config = self.config
+
+        filename = entry['filename']
+        target = entry['target']
+        database = entry['database']
+        url = entry['url']
+        work_dir_target = entry['work_dir_target']
+        package = entry['package']
+
+        if filename == '<<<model>>>':
+            model = config.get('executables', 'model')
+            filename = os.path.basename(model)
+            target = os.path.abspath(model)
+
+        if package is not None:
+            if target is None:
+                target = filename
+            with path(package, target) as package_path:
+                target = str(package_path)
+
+        if work_dir_target is not None:
+            target = os.path.join(self.base_work_dir, work_dir_target)
+
+        if target is not None:
+            download_target = target
+        else:
+            download_target = filename
+
+        download_path = None
+
+        if database is not None:
+            # we're downloading a file to a cache of a database (if it's
+            # not already there.
+            if url is None:
+                base_url = config.get('download', 'server_base_url')
+                core_path = config.get('download', 'core_path')
+                url = '{}/{}/{}'.format(base_url, core_path, database)
+
+                url = '{}/{}'.format(url, target)
+
+            database_root = config.get(
+                'paths', '{}_database_root'.format(mpas_core))
+            download_path = os.path.join(database_root, database,
+                                         download_target)
+        elif url is not None:
+            download_path = download_target
+
+        return filename, target, url, download_path
+
     def _generate_namelists(self):
         """
         Writes out a namelist file in the work directory with new values given
@@ -559,7 +620,7 @@ class Step:
             defaults_filename = config.get('namelists', mode)
             out_filename = '{}/{}'.format(step_work_dir, out_name)
 
-            namelist = compass.namelist.ingest(defaults_filename)
+            namelist = compass.namelist.read_defaults(defaults_filename)
 
             namelist = compass.namelist.replace(namelist, replacements)
 
@@ -595,22 +656,11 @@ class Step:
             defaults_filename = config.get('streams', mode)
             out_filename = '{}/{}'.format(step_work_dir, out_name)
 
-            defaults_tree = etree.parse(defaults_filename)
+            defaults_tree = compass.streams.read_defaults(defaults_filename)
 
             defaults = next(defaults_tree.iter('streams'))
             streams = next(tree.iter('streams'))
 
-            for stream in streams:
-                compass.streams.update_defaults(stream, defaults)
-
-            # remove any streams that aren't requested
-            for default in defaults:
-                found = False
-                for stream in streams:
-                    if stream.attrib['name'] == default.attrib['name']:
-                        found = True
-                        break
-                if not found:
-                    defaults.remove(default)
+            compass.streams.update_all_defaults(streams, defaults)
 
             compass.streams.write(defaults_tree, out_filename)
@@ -1,3 +1,4 @@
+import os
 from lxml import etree
 from copy import deepcopy
 from importlib import resources
@@ -42,6 +43,32 @@ def read(package, streams_filename, tree=None, replacements=None):
     return tree
 
 
+def read_defaults(defaults_filename):
+    """
+    Parse a defaults streams file.  Parsed files are cached by their path,
+    size and modification time, so each defaults file is only parsed once no
+    matter how many steps use it.
+
+    Parameters
+    ----------
+    defaults_filename : str
+        The name of the streams file to read
+
+    Returns
+    -------
+    tree : lxml.etree
+        A tree of XML data describing MPAS i/o streams.  This is a copy that
+        the caller is free to modify.
+    """
+    stats = os.stat(defaults_filename)
+    key = os.path.abspath(defaults_filename)
+    version = (stats.st_size, stats.st_mtime_ns)
+    if key not in _defaults_cache or _defaults_cache[key][0] != version:
+        _defaults_cache[key] = (version, etree.parse(defaults_filename))
+
+    return deepcopy(_defaults_cache[key][1])
+
+
 def write(streams, out_filename):
     """ write the streams XML data to the file """
 
@@ -99,40 +126,104 @@ def write(streams, out_filename):
         stream_file.write('</streams>\n')
 
 
-def update_defaults(new_child, defaults):
+def update_defaults(new_child, defaults, children=None):
     """
     Update a stream or its children (sub-stream, var, etc.) starting from the
     defaults or add it if it's new.
+
+    Parameters
+    ----------
+    new_child : lxml.etree.Element
+        The stream or child of a stream to update or add
+
+    defaults : lxml.etree.Element
+        The element containing the default version of ``new_child``
+
+    children : dict, optional
+        The children of ``defaults`` indexed by name from
+        :py:func:`compass.streams.get_children_by_name()`, which can be passed
+        in (and is kept up to date) when updating many children of the same
+        element
     """
     if 'name' not in new_child.attrib:
         return
 
+    if children is None:
+        children = get_children_by_name(defaults)
+
     name = new_child.attrib['name']
-    found = False
-    for child in defaults:
-        if child.attrib['name'] == name:
-            found = True
-            if child.tag != new_child.tag:
-                raise ValueError('Trying to update stream "{}" with '
-                                 'inconsistent tags {} vs. {}.'.format(
-                                     name, child.tag, new_child.tag))
-
-            # copy the attributes
-            for attr, value in new_child.attrib.items():
-                child.attrib[attr] = value
-
-            if len(new_child) > 0:
-                # we don't want default grandchildren
-                for grandchild in child:
-                    child.remove(grandchild)
-
-            # copy or add the grandchildren's contents
-            for new_grandchild in new_child:
-                update_defaults(new_grandchild, child)
-
-    if not found:
+    if name in children:
+        child = children[name]
+        if child.tag != new_child.tag:
+            raise ValueError('Trying to update stream "{}" with '
+                             'inconsistent tags {} vs. {}.'.format(
+                                 name, child.tag, new_child.tag))
+
+        # copy the attributes
+        for attr, value in new_child.attrib.items():
+            child.attrib[attr] = value
+
+        if len(new_child) > 0:
+            # we don't want default grandchildren
+            for grandchild in list(child):
+                child.remove(grandchild)
+
+        # copy or add the grandchildren's contents
+        grandchildren = get_children_by_name(child)
+        for new_grandchild in new_child:
+            update_defaults(new_grandchild, child, grandchildren)
+
+    else:
         # add a deep copy of the element
-        defaults.append(deepcopy(new_child))
+        child = deepcopy(new_child)
+        defaults.append(child)
+        children[name] = child
+
+
+def update_all_defaults(streams, defaults):
+    """
+    Update the default streams with the given streams, and remove any default
+    streams that were not given
+
+    Parameters
+    ----------
+    streams : lxml.etree.Element
+        The ``streams`` element with the streams to update or add
+
+    defaults : lxml.etree.Element
+        The ``streams`` element from the defaults streams file
+    """
+    children = get_children_by_name(defaults)
+    for stream in streams:
+        update_defaults(stream, defaults, children)
+
+    # remove any streams that aren't requested
+    names = set(stream.attrib['name'] for stream in streams)
+    for default in list(defaults):
+        if default.get('name') not in names:
+            defaults.remove(default)
+
+
+def get_children_by_name(element):
+    """
+    Index the children of an XML element by their ``name`` attribute
+
+    Parameters
+    ----------
+    element : lxml.etree.Element
+        An element such as ``streams`` or a ``stream``
+
+    Returns
+    -------
+    children : dict
+        The children of ``element`` that have a name, with their names as keys
+    """
+    children = dict()
+    for child in element:
+        name = child.get('name')
+        if name is not None and name not in children:
+            children[name] = child
+    return children
 
 
 def _update_tree(tree, new_tree):
@@ -143,13 +234,14 @@ def _update_tree(tree, new_tree):
         streams = next(tree.iter('streams'))
         new_streams = next(new_tree.iter('streams'))
 
+        children = get_children_by_name(streams)
         for new_stream in new_streams:
-            _update_element(new_stream, streams)
+            _update_element(new_stream, streams, children)
 
     return tree
 
 
-def _update_element(new_child, elements):
+def _update_element(new_child, elements, children):
     """
     add the new child/grandchildren or add/update attributes if they exist
     """
@@ -157,23 +249,29 @@ def _update_element(new_child, elements):
         return
 
     name = new_child.attrib['name']
-    found = False
-    for child in elements:
-        if child.attrib['name'] == name:
-            found = True
-            if child.tag != new_child.tag:
-                raise ValueError('Trying to update stream "{}" with '
-                                 'inconsistent tags {} vs. {}.'.format(
-                                     name, child.tag, new_child.tag))
-
-            # copy the attributes
-            for attr, value in new_child.attrib.items():
-                child.attrib[attr] = value
-
-            # copy or add the grandchildren's contents
-            for new_grandchild in new_child:
-                _update_element(new_grandchild, child)
-
-    if not found:
+    if name in children:
+        child = children[name]
+        if child.tag != new_child.tag:
+            raise ValueError('Trying to update stream "{}" with '
+                             'inconsistent tags {} vs. {}.'.format(
+                                 name, child.tag, new_child.tag))
+
+        # copy the attributes
+        for attr, value in new_child.attrib.items():
+            child.attrib[attr] = value
+
+        # copy or add the grandchildren's contents
+        grandchildren = get_children_by_name(child)
+        for new_grandchild in new_child:
+            _update_element(new_grandchild, child, grandchildren)
+
+    else:
         # add a deep copy of the element
-        elements.append(deepcopy(new_child))
+        child = deepcopy(new_child)
+        elements.append(child)
+        children[name] = child
+
+
+# parsed defaults streams files, with the size and modification time of each
+# file when it was parsed
+_defaults_cache = dict()
@@ -10,7 +10,8 @@ from compass.clean import clean_cases
 
 
 def setup_suite(mpas_core, suite_name, config_file=None, machine=None,
-                work_dir=None, baseline_dir=None, mpas_model_path=None):
+                work_dir=None, baseline_dir=None, mpas_model_path=None,
+                workers=1):
     """
     Set up a test suite
 
@@ -42,6 +43,9 @@ def setup_suite(mpas_core, suite_name, config_file=None, machine=None,
     mpas_model_path : str, optional
         The relative or absolute path to the root of a branch where the MPAS
         model has been built
+
+    workers : int, optional
+        The number of processes to use to set up test cases in parallel
     """
     if machine is None and 'COMPASS_MACHINE' in os.environ:
         machine = os.environ['COMPASS_MACHINE']
@@ -64,7 +68,7 @@ def setup_suite(mpas_core, suite_name, config_file=None, machine=None,
 
     test_cases = setup_cases(tests, config_file=config_file, machine=machine,
                              work_dir=work_dir, baseline_dir=baseline_dir,
-                             mpas_model_path=mpas_model_path)
+                             mpas_model_path=mpas_model_path, workers=workers)
 
     test_suite = {'name': suite_name,
                   'test_cases': test_cases,
@@ -158,6 +162,10 @@ def main():
                         help="The path to the build of the MPAS model for the "
                              "core.",
                         metavar="PATH")
+    parser.add_argument("--workers", dest="workers", type=int, default=1,
+                        help="The number of processes to use to set up test "
+                             "cases in parallel",
+                        metavar="NUM")
     args = parser.parse_args(sys.argv[2:])
 
     if not args.clean and not args.setup:
@@ -172,7 +180,7 @@ def main():
         setup_suite(mpas_core=args.core, suite_name=args.test_suite,
                     config_file=args.config_file, machine=args.machine,
                     work_dir=args.work_dir, baseline_dir=args.baseline_dir,
-                    mpas_model_path=args.mpas_model)
+                    mpas_model_path=args.mpas_model, workers=args.workers)
 
 
 def _get_required_cores(test_cases):
@@ -3,6 +3,9 @@ import configparser
 
 from mpas_tools.logging import LoggingContext
 from compass.parallel import get_available_cores_and_nodes
+from compass.cache import get_step_cache_key, restore_step_outputs, \
+    store_step_outputs, remove_linked_outputs, get_step_fingerprint, \
+    check_step_fingerprint, write_step_fingerprint, remove_step_fingerprint
 
 
 class TestCase:
@@ -72,6 +75,15 @@ class TestCase:
         A dictionary with the status of internal and baseline comparisons, used
         by the ``compass`` framework to determine whether the test case passed
         or failed internal and baseline validation.
+
+    defer_steps : bool
+        Whether ``run()`` should only prepare the steps to run, leaving it to
+        the framework to run them later (e.g. concurrently with steps from
+        other test cases in a test suite)
+
+    incremental : bool
+        Whether to skip steps whose inputs, settings and outputs are unchanged
+        since they last ran successfully
     """
 
     def __init__(self, test_group, name, subdir=None):
@@ -117,6 +129,8 @@ class TestCase:
         self.logger = None
         self.log_filename = None
         self.validation = None
+        self.defer_steps = False
+        self.incremental = False
 
     def configure(self):
         """
@@ -146,6 +160,9 @@ class TestCase:
         for step_name in self.steps_to_run:
             step = self.steps[step_name]
             step.config = self.config
+            if self.defer_steps:
+                # the framework will take care of running the step
+                continue
             new_log_file = self.new_step_log_file
             if self.log_filename is not None:
                 step.log_filename = self.log_filename
@@ -267,7 +284,29 @@ class TestCase:
                             log_filename=log_filename) as step_logger:
             step.logger = step_logger
             os.chdir(step.work_dir)
-            step.run()
+            fingerprint = None
+            if self.incremental:
+                # the inputs don't change while the step runs, so the
+                # fingerprint is only computed once
+                fingerprint = get_step_fingerprint(step)
+                if check_step_fingerprint(step, fingerprint):
+                    step_logger.info(
+                        'Inputs, settings and outputs of {} are unchanged '
+                        'since it last ran successfully, so it will be '
+                        'skipped'.format(step.name))
+                    return
+
+            remove_step_fingerprint(step)
+            cache_key = get_step_cache_key(step)
+            if cache_key is not None and \
+                    restore_step_outputs(step, cache_key):
+                step_logger.info('Outputs restored from the step-output '
+                                 'cache: {}'.format(cache_key))
+                cache_key = None
+            else:
+                if cache_key is not None:
+                    remove_linked_outputs(step)
+                step.run()
 
         missing_files = list()
         for output_file in step.outputs:
@@ -279,3 +318,9 @@ class TestCase:
                 'output file(s) missing in step {} of {}/{}/{}: {}'.format(
                     step.name, step.mpas_core.name, step.test_group.name,
                     step.test_case.subdir, missing_files))
+
+        if cache_key is not None:
+            store_step_outputs(step, cache_key)
+
+        if self.incremental:
+            write_step_fingerprint(step, fingerprint)
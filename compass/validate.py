@@ -3,11 +3,19 @@ import numpy
 import xarray
 import re
 import fnmatch
+import json
+import pickle
+import datetime
+import platform
+from concurrent.futures import ProcessPoolExecutor
+
+from compass import provenance
 
 
 def compare_variables(test_case, variables, filename1, filename2=None,
                       l1_norm=0.0, l2_norm=0.0, linf_norm=0.0, quiet=True,
-                      check_outputs=True, skip_if_step_not_run=True):
+                      check_outputs=True, skip_if_step_not_run=True,
+                      workers=None):
     """
     Compare variables between files in the current test case and/or with the
     baseline results.  The results of the comparison are added to the
@@ -64,9 +72,27 @@ def compare_variables(test_case, variables, filename1, filename2=None,
         both) of the steps involved in the comparison.  This would happen if
         users are running steps individually or has edited ``steps_to_run``
         in the config file to exclude one of the steps.
+
+    workers : int, optional
+        The number of worker processes to use to compare variables in
+        parallel.  By default, the ``threads`` config option from the
+        ``parallel`` section is used, but only if the files being compared
+        are large enough that starting a pool of processes pays off.  Output
+        for each variable is printed in the order of ``variables`` regardless
+        of the number of workers.
     """
     work_dir = test_case.work_dir
 
+    if workers is None:
+        config = test_case.config
+        if config is not None and config.has_option('parallel', 'threads'):
+            workers = config.getint('parallel', 'threads')
+        else:
+            workers = 1
+        min_parallel_size = _min_parallel_size
+    else:
+        min_parallel_size = 0
+
     path1 = os.path.abspath(os.path.join(work_dir, filename1))
     if filename2 is not None:
         path2 = os.path.abspath(os.path.join(work_dir, filename2))
@@ -122,7 +148,8 @@ def compare_variables(test_case, variables, filename1, filename2=None,
 
     if filename2 is not None:
         internal_pass = _compare_variables(
-            variables, path1, path2, l1_norm, l2_norm, linf_norm, quiet)
+            variables, path1, path2, l1_norm, l2_norm, linf_norm, quiet,
+            workers, min_parallel_size)
 
         if validation['internal_pass'] is None:
             validation['internal_pass'] = internal_pass
@@ -137,14 +164,16 @@ def compare_variables(test_case, variables, filename1, filename2=None,
         result = _compare_variables(
             variables, os.path.join(work_dir, filename1),
             os.path.join(baseline_root, filename1), l1_norm=0.0, l2_norm=0.0,
-            linf_norm=0.0, quiet=quiet)
+            linf_norm=0.0, quiet=quiet, workers=workers,
+            min_parallel_size=min_parallel_size)
         baseline_pass = baseline_pass and result
 
         if filename2 is not None:
             result = _compare_variables(
                 variables, os.path.join(work_dir, filename2),
                 os.path.join(baseline_root, filename2), l1_norm=0.0,
-                l2_norm=0.0, linf_norm=0.0, quiet=quiet)
+                l2_norm=0.0, linf_norm=0.0, quiet=quiet, workers=workers,
+                min_parallel_size=min_parallel_size)
             baseline_pass = baseline_pass and result
 
         if validation['baseline_pass'] is None:
@@ -184,8 +213,17 @@ def compare_timers(timers, config, work_dir, rundir1, rundir2=None):
         between files within the current test case.  If a baseline directory
         was provided, the ``timers`` from this file will also be compared with
         those in the corresponding baseline directory.
+
+    The timers found in ``rundir1`` and ``rundir2`` are also appended to the
+    performance database given by the ``database`` config option in the
+    ``performance`` section, so that performance can be tracked across runs
+    with ``compass perf``.
     """
 
+    _record_timers(timers, config, work_dir, rundir1)
+    if rundir2 is not None:
+        _record_timers(timers, config, work_dir, rundir2)
+
     if rundir2 is not None:
         _compute_timers(os.path.join(work_dir, rundir1),
                         os.path.join(work_dir, rundir2), timers)
@@ -202,123 +240,303 @@ def compare_timers(timers, config, work_dir, rundir1, rundir2=None):
 
 
 def _compare_variables(variables, filename1, filename2, l1_norm, l2_norm,
-                       linf_norm, quiet):
-    """ compare fields in the two files """
+                       linf_norm, quiet, workers=1, min_parallel_size=0):
+    """
+    compare fields in the two files, optionally comparing variables in
+    parallel with a pool of worker processes if the files together are at
+    least ``min_parallel_size`` bytes
+    """
 
     for filename in [filename1, filename2]:
         if not os.path.exists(filename):
             raise OSError('File {} does not exist.'.format(filename))
 
-    ds1 = xarray.open_dataset(filename1)
-    ds2 = xarray.open_dataset(filename2)
+    size = os.path.getsize(filename1) + os.path.getsize(filename2)
+    if size < min_parallel_size:
+        workers = 1
+    workers = min(workers, len(variables))
+    if workers > 1:
+        args = [(variable, filename1, filename2, l1_norm, l2_norm, linf_norm,
+                 quiet) for variable in variables]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map() returns results in the order of the variables
+            results = list(executor.map(_compare_variable_in_files, *zip(
+                *args)))
+    else:
+        with xarray.open_dataset(filename1) as ds1, \
+                xarray.open_dataset(filename2) as ds2:
+            results = [_compare_variable(variable, ds1, ds2, filename1,
+                                         filename2, l1_norm, l2_norm,
+                                         linf_norm, quiet)
+                       for variable in variables]
 
     all_pass = True
+    for variable_pass, output in results:
+        for line in output:
+            print(line)
+        all_pass = all_pass and variable_pass
+
+    return all_pass
+
+
+# the smallest total size (in bytes) of two files for which variables are
+# compared in parallel by default, since starting a pool of processes takes
+# longer than comparing small files
+_min_parallel_size = 100 * 1024**2
+
+
+def _compare_variable_in_files(variable, filename1, filename2, l1_norm,
+                               l2_norm, linf_norm, quiet):
+    """ compare a field in the two files, opening them in a worker process """
+    with xarray.open_dataset(filename1) as ds1, \
+            xarray.open_dataset(filename2) as ds2:
+        return _compare_variable(variable, ds1, ds2, filename1, filename2,
+                                 l1_norm, l2_norm, linf_norm, quiet)
 
-    for variable in variables:
-        for ds, filename in [(ds1, filename1), (ds2, filename2)]:
-            if variable not in ds:
-                raise ValueError('Variable {} not in {}.'.format(
-                    variable, filename))
 
-        da1 = ds1[variable]
-        da2 = ds2[variable]
+def _compare_variable(variable, ds1, ds2, filename1, filename2, l1_norm,
+                      l2_norm, linf_norm, quiet):
+    """
+    compare a field in the two datasets, returning whether the comparison
+    passed and the lines of output to print
+    """
+    output = list()
+
+    for ds, filename in [(ds1, filename1), (ds2, filename2)]:
+        if variable not in ds:
+            raise ValueError('Variable {} not in {}.'.format(
+                variable, filename))
 
-        if not numpy.all(da1.dims == da2.dims):
-            raise ValueError("Dimensions for variable {} don't match between "
+    da1 = ds1[variable]
+    da2 = ds2[variable]
+
+    if not numpy.all(da1.dims == da2.dims):
+        raise ValueError("Dimensions for variable {} don't match between "
+                         "files {} and {}.".format(
+                             variable, filename1, filename2))
+
+    for dim in da1.sizes:
+        if da1.sizes[dim] != da2.sizes[dim]:
+            raise ValueError("Field sizes for variable {} don't match "
                              "files {} and {}.".format(
                                  variable, filename1, filename2))
 
-        for dim in da1.sizes:
-            if da1.sizes[dim] != da2.sizes[dim]:
-                raise ValueError("Field sizes for variable {} don't match "
-                                 "files {} and {}.".format(
-                                     variable, filename1, filename2))
-
-        if not quiet:
-            print("    Pass thresholds are:")
-            if l1_norm is not None:
-                print("       L1: {:16.14e}".format(l1_norm))
-            if l2_norm is not None:
-                print("       L2: {:16.14e}".format(l2_norm))
-            if linf_norm is not None:
-                print("       L_Infinity: {:16.14e}".format(
-                    linf_norm))
-        variable_pass = True
-        if 'Time' in da1.dims:
-            time_range = range(0, da1.sizes['Time'])
-            time_str = ', '.join(['{}'.format(j) for j in time_range])
-            print('{} Time index: {}'.format(variable.ljust(20), time_str))
-            for time_index in time_range:
-                slice1 = da1.isel(Time=time_index)
-                slice2 = da2.isel(Time=time_index)
-                result = _compute_norms(slice1, slice2, quiet, l1_norm,
-                                        l2_norm, linf_norm,
-                                        time_index=time_index)
-                variable_pass = variable_pass and result
-
-        else:
-            print('{}'.format(variable))
+    if not quiet:
+        output.append("    Pass thresholds are:")
+        if l1_norm is not None:
+            output.append("       L1: {:16.14e}".format(l1_norm))
+        if l2_norm is not None:
+            output.append("       L2: {:16.14e}".format(l2_norm))
+        if linf_norm is not None:
+            output.append("       L_Infinity: {:16.14e}".format(
+                linf_norm))
+    variable_pass = True
+    if 'Time' in da1.dims:
+        time_axis = da1.dims.index('Time')
+        time_range = range(0, da1.sizes['Time'])
+        time_str = ', '.join(['{}'.format(j) for j in time_range])
+        output.append('{} Time index: {}'.format(variable.ljust(20),
+                                                 time_str))
+        for time_index in time_range:
             result = _compute_norms(da1, da2, quiet, l1_norm, l2_norm,
-                                    linf_norm)
+                                    linf_norm, output, time_axis=time_axis,
+                                    time_index=time_index)
             variable_pass = variable_pass and result
+            if not variable_pass and _stop_at_first_difference(
+                    quiet, l1_norm, l2_norm, linf_norm):
+                # we only need to know that the comparison failed
+                break
 
-        # ANSI fail text: https://stackoverflow.com/a/287944/7728169
-        start_fail = '\033[91m'
-        start_pass = '\033[92m'
-        end = '\033[0m'
-        pass_str = '{}PASS{}'.format(start_pass, end)
-        fail_str = '{}FAIL{}'.format(start_fail, end)
-
-        if variable_pass:
-            print('  {} {}\n'.format(pass_str, filename1))
-        else:
-            print('  {} {}\n'.format(fail_str, filename1))
-        print('       {}\n'.format(filename2))
-        all_pass = all_pass and variable_pass
+    else:
+        output.append('{}'.format(variable))
+        result = _compute_norms(da1, da2, quiet, l1_norm, l2_norm,
+                                linf_norm, output)
+        variable_pass = variable_pass and result
+
+    # ANSI fail text: https://stackoverflow.com/a/287944/7728169
+    start_fail = '\033[91m'
+    start_pass = '\033[92m'
+    end = '\033[0m'
+    pass_str = '{}PASS{}'.format(start_pass, end)
+    fail_str = '{}FAIL{}'.format(start_fail, end)
+
+    if variable_pass:
+        output.append('  {} {}\n'.format(pass_str, filename1))
+    else:
+        output.append('  {} {}\n'.format(fail_str, filename1))
+    output.append('       {}\n'.format(filename2))
 
-    return all_pass
+    return variable_pass, output
 
 
 def _compute_norms(da1, da2, quiet, max_l1_norm, max_l2_norm, max_linf_norm,
-                   time_index=None):
-    """ Compute norms between variables in two DataArrays """
-
-    da1 = _rename_duplicate_dims(da1)
-    da2 = _rename_duplicate_dims(da2)
+                   output, time_axis=None, time_index=None):
+    """
+    Compute norms between variables in two DataArrays (optionally at a single
+    time index) in a single pass over chunks of the data, so that only one
+    chunk needs to be in memory at a time.  Chunks that are bit-for-bit
+    identical are skipped without computing norms.  If ``quiet=True`` and all
+    the maximum norms are zero (a bit-for-bit comparison), reading stops at
+    the first difference.  Lines to print are appended to ``output``.
+    """
 
     result = True
-    diff = numpy.abs(da1 - da2).values.ravel()
-
-    l1_norm = numpy.linalg.norm(diff, ord=1)
-    l2_norm = numpy.linalg.norm(diff, ord=2)
-    linf_norm = numpy.linalg.norm(diff, ord=numpy.inf)
+    stop_early = _stop_at_first_difference(quiet, max_l1_norm, max_l2_norm,
+                                           max_linf_norm)
+    stopped = False
+    first_diff = None
+    l1_norm = 0.
+    l2_norm_squared = 0.
+    linf_norm = 0.
+    for start, slice1, slice2 in _read_chunks(da1, da2, time_axis,
+                                              time_index):
+        index = _first_difference(slice1, slice2)
+        if index is None:
+            # the chunks are identical so they don't contribute to the norms
+            continue
+
+        if first_diff is None:
+            index = list(numpy.unravel_index(index, slice1.shape))
+            if time_axis is not None:
+                index.insert(time_axis, 0)
+            first_diff = tuple(int(offset + local) for offset, local in
+                               zip(start, index))
+
+        # accumulate in double precision so differences in integer variables
+        # (e.g. maxLevelCell or masks) can't overflow
+        diff = numpy.abs(slice1.astype(numpy.float64) - slice2).ravel()
+
+        l1_norm = l1_norm + numpy.sum(diff)
+        l2_norm_squared = l2_norm_squared + numpy.dot(diff, diff)
+        linf_norm = numpy.maximum(linf_norm, numpy.max(diff))
+
+        result = _check_norms(l1_norm, numpy.sqrt(l2_norm_squared),
+                              linf_norm, max_l1_norm, max_l2_norm,
+                              max_linf_norm)
+        if stop_early and not result:
+            stopped = True
+            break
+
+    l2_norm = numpy.sqrt(l2_norm_squared)
 
     if time_index is None:
         diff_str = ''
     else:
         diff_str = '{:d}: '.format(time_index)
 
+    diff_str = '{} l1: {:16.14e} '.format(diff_str, l1_norm)
+    diff_str = '{} l2: {:16.14e} '.format(diff_str, l2_norm)
+    diff_str = '{} linf: {:16.14e} '.format(diff_str, linf_norm)
+    if stopped:
+        diff_str = '{} (lower bounds, stopped at first exceedance)'.format(
+            diff_str)
+
+    if not quiet or not result:
+        output.append(diff_str)
+        if first_diff is not None:
+            index_str = ', '.join(['{}={}'.format(dim, index) for dim, index
+                                   in zip(da1.dims, first_diff)])
+            output.append('    first difference at: {}'.format(index_str))
+
+    return result
+
+
+def _stop_at_first_difference(quiet, max_l1_norm, max_l2_norm,
+                              max_linf_norm):
+    """
+    Whether only pass/fail is needed for a comparison with zero tolerance, so
+    that it can stop at the first difference rather than computing the norms
+    """
+    return quiet and all(norm is None or norm == 0. for norm in
+                         [max_l1_norm, max_l2_norm, max_linf_norm])
+
+
+def _first_difference(slice1, slice2):
+    """
+    Find the flat index of the first element that differs bitwise between two
+    arrays with the same shape, or ``None`` if they are identical
+    """
+    slice1 = numpy.ascontiguousarray(slice1).ravel()
+    slice2 = numpy.ascontiguousarray(slice2).ravel()
+    if slice1.dtype != slice2.dtype:
+        # we can't compare the bits so fall back on comparing values
+        differs = numpy.logical_not(slice1 == slice2)
+    else:
+        if slice1.tobytes() == slice2.tobytes():
+            return None
+        itemsize = slice1.dtype.itemsize
+        if itemsize in [1, 2, 4, 8]:
+            view_type = 'u{}'.format(itemsize)
+            differs = slice1.view(view_type) != slice2.view(view_type)
+        else:
+            differs = numpy.logical_not(slice1 == slice2)
+
+    indices = numpy.flatnonzero(differs)
+    if len(indices) == 0:
+        return None
+    return indices[0]
+
+
+def _check_norms(l1_norm, l2_norm, linf_norm, max_l1_norm, max_l2_norm,
+                 max_linf_norm):
+    """ Check whether norms are within their maximum values """
+    result = True
     if max_l1_norm is not None:
         if max_l1_norm < l1_norm:
             result = False
-    diff_str = '{} l1: {:16.14e} '.format(diff_str, l1_norm)
 
     if max_l2_norm is not None:
         if max_l2_norm < l2_norm:
             result = False
-    diff_str = '{} l2: {:16.14e} '.format(diff_str, l2_norm)
 
     if max_linf_norm is not None:
         if max_linf_norm < linf_norm:
             result = False
-    diff_str = '{} linf: {:16.14e} '.format(diff_str, linf_norm)
-
-    if not quiet or not result:
-        print(diff_str)
 
     return result
 
 
+def _read_chunks(da1, da2, time_axis=None, time_index=None):
+    """
+    Read matching chunks of two DataArrays with the same shape, optionally
+    at a single time index, yielding the start index of the chunk in each
+    dimension and numpy arrays for each chunk.  Chunks are made up of blocks
+    along the first (non-time) dimension so that each has no more than about
+    ``_max_chunk_size`` elements.
+    """
+    shape = list(da1.shape)
+    key = [slice(None)] * len(shape)
+    start = [0] * len(shape)
+    if time_axis is not None:
+        key[time_axis] = time_index
+        start[time_axis] = time_index
+        shape[time_axis] = 1
+
+    axes = [axis for axis in range(len(shape)) if axis != time_axis]
+    if len(axes) == 0:
+        yield start, da1.values[tuple(key)], da2.values[tuple(key)]
+        return
+
+    block_axis = axes[0]
+    block_count = shape[block_axis]
+    other_size = int(numpy.prod(shape)) // max(block_count, 1)
+    block_size = max(1, _max_chunk_size // max(other_size, 1))
+
+    for block_start in range(0, max(block_count, 1), block_size):
+        key[block_axis] = slice(block_start, block_start + block_size)
+        start[block_axis] = block_start
+        # positional indexing on the underlying variables reads only the
+        # requested chunk from disk
+        slice1 = numpy.asarray(da1.variable[tuple(key)].values)
+        slice2 = numpy.asarray(da2.variable[tuple(key)].values)
+        yield list(start), slice1, slice2
+
+
+# the approximate maximum number of elements of each variable to read into
+# memory at once when computing norms
+_max_chunk_size = 10000000
+
+
 def _compute_timers(base_directory, comparison_directory, timers):
     """ Find timers and compute speedup between two run directories """
     for timer in timers:
@@ -340,63 +558,165 @@ def _compute_timers(base_directory, comparison_directory, timers):
             print("          Speedup: {}".format(speedup))
 
 
+def _record_timers(timers, config, work_dir, rundir):
+    """
+    Append records of timers in a run directory to the performance database
+    """
+    if not config.has_option('performance', 'database'):
+        return
+    database = config.get('performance', 'database')
+    if database == '':
+        return
+
+    directory = os.path.join(work_dir, rundir)
+
+    # the step that was run in this directory tells us the test case and the
+    # resources that were used
+    test_path = None
+    cores = None
+    threads = None
+    pickle_filename = os.path.join(directory, 'step.pickle')
+    if os.path.exists(pickle_filename):
+        with open(pickle_filename, 'rb') as handle:
+            _, step = pickle.load(handle)
+        test_path = step.test_case.path
+        cores = step.cores
+        threads = step.threads
+
+    versions = None
+    records = list()
+    for timer in timers:
+        timer_found, wall_time = _find_timer_value(timer, directory)
+        if not timer_found:
+            continue
+        if versions is None:
+            versions = provenance.get_versions(config)
+        record = {'date': datetime.datetime.now().isoformat(),
+                  'test case': test_path,
+                  'run dir': rundir,
+                  'timer': timer,
+                  'wall time': wall_time,
+                  'cores': cores,
+                  'threads': threads,
+                  'machine': platform.node()}
+        record.update(versions)
+        records.append(record)
+
+    if len(records) == 0:
+        return
+
+    # relative paths were made relative to the base work directory when the
+    # test case was set up
+    database = os.path.abspath(database)
+    try:
+        os.makedirs(os.path.dirname(database))
+    except OSError:
+        pass
+    with open(database, 'a') as f:
+        for record in records:
+            f.write('{}\n'.format(json.dumps(record)))
+
+
 def _find_timer_value(timer_name, directory):
     """ Find a timer in the given directory """
-    # Build a regular expression for any two characters with a space between
-    # them.
-    regex = re.compile(r'(\S) (\S)')
 
     sub_timer_name = timer_name.replace(' ', '_')
 
     timer = 0.0
     timer_found = False
-    for file in os.listdir(directory):
-        if not timer_found:
-            # Compare files written using built in MPAS timers
-            if fnmatch.fnmatch(file, "log.*.out"):
-                timer_line_size = 6
-                name_index = 1
-                total_index = 2
-            # Compare files written using GPTL timers
-            elif fnmatch.fnmatch(file, "timing.*"):
-                timer_line_size = 6
-                name_index = 0
-                total_index = 3
-            else:
-                continue
-
-            with open(os.path.join(directory, file), "r") as stats_file:
-                for block in iter(lambda: stats_file.readline(), ""):
-                    new_block = regex.sub(r"\1_\2", block[2:])
-                    new_block_arr = new_block.split()
-                    if len(new_block_arr) >= timer_line_size:
-                        if sub_timer_name.find(new_block_arr[name_index]) >= 0:
-                            try:
-                                timer = \
-                                    timer + float(new_block_arr[total_index])
-                                timer_found = True
-                            except ValueError:
-                                pass
+    for timer_file in _get_timer_index(directory):
+        for entry in timer_file['timers']:
+            if sub_timer_name.find(entry['name']) >= 0:
+                timer = timer + entry['total']
+                timer_found = True
+        if timer_found:
+            break
 
     return timer_found, timer
 
 
-def _rename_duplicate_dims(da):
-    dims = list(da.dims)
-    new_dims = list(dims)
-    duplicates = False
-    for index, dim in enumerate(dims):
-        if dim in dims[index+1:]:
-            duplicates = True
-            suffix = 2
-            for other_index, other in enumerate(dims[index+1:]):
-                if other == dim:
-                    new_dims[other_index + index + 1] = \
-                        '{}_{}'.format(dim, suffix)
-                    suffix += 1
-
-    if not duplicates:
-        return da
-
-    da = xarray.DataArray(data=da.values, dims=new_dims)
-    return da
+def _get_timer_index(directory):
+    """
+    Get a table of the timers in each MPAS (``log.*.out``) or GPTL
+    (``timing.*``) timer file in a directory, parsing each file only once and
+    caching the result until the files in the directory change.  Each table
+    also has the MPI rank that wrote the file (if it can be determined from
+    the file name), so timers can be compared between ranks.
+    """
+    directory = os.path.abspath(directory)
+    files = list()
+    for filename in os.listdir(directory):
+        if fnmatch.fnmatch(filename, "log.*.out") or \
+                fnmatch.fnmatch(filename, "timing.*"):
+            stat = os.stat(os.path.join(directory, filename))
+            files.append((filename, stat.st_mtime, stat.st_size))
+
+    signature = tuple(files)
+    if directory in _timer_index_cache:
+        cached_signature, index = _timer_index_cache[directory]
+        if cached_signature == signature:
+            return index
+
+    index = [dict(filename=filename, rank=_get_timer_file_rank(filename),
+                  timers=_parse_timer_file(os.path.join(directory, filename)))
+             for filename, _, _ in files]
+    _timer_index_cache[directory] = (signature, index)
+    return index
+
+
+def _get_timer_file_rank(filename):
+    """
+    Get the MPI rank from the name of a timer file (e.g. ``log.ocean.0003.out``
+    or ``timing.3``), or ``None`` if there is no rank in the name
+    """
+    match = re.search(r'\.(\d+)(\.out)?$', filename)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def _parse_timer_file(filename):
+    """
+    Parse the timers in an MPAS or GPTL timer file into a list of
+    dictionaries with the name, total time and (if available) the number of
+    calls and the minimum and maximum times for each timer
+    """
+    # Build a regular expression for any two characters with a space between
+    # them.
+    regex = re.compile(r'(\S) (\S)')
+
+    timer_line_size = 6
+    # Compare files written using built in MPAS timers
+    if fnmatch.fnmatch(os.path.basename(filename), "log.*.out"):
+        indices = dict(name=1, total=2, calls=3, min=4, max=5)
+    # Compare files written using GPTL timers
+    else:
+        indices = dict(name=0, total=3, calls=1, max=4, min=5)
+
+    timers = list()
+    with open(filename, "r") as stats_file:
+        for block in stats_file:
+            new_block = regex.sub(r"\1_\2", block[2:])
+            new_block_arr = new_block.split()
+            if len(new_block_arr) < timer_line_size:
+                continue
+            try:
+                total = float(new_block_arr[indices['total']])
+            except (ValueError, OverflowError):
+                continue
+            entry = dict(name=new_block_arr[indices['name']], total=total)
+            for field, field_type in [('calls', int), ('min', float),
+                                      ('max', float)]:
+                try:
+                    entry[field] = field_type(
+                        float(new_block_arr[indices[field]]))
+                except (ValueError, OverflowError):
+                    # e.g. "inf" calls can't be converted to an int
+                    entry[field] = None
+            timers.append(entry)
+
+    return timers
+
+
+# timer tables for run directories that have already been parsed
+_timer_index_cache = dict()
@@ -32,7 +32,7 @@ install_requires = \
      'pyamg',
      'requests',
      'scipy',
-     'shapely',
+     'shapely>=2.0',
      'xarray']
 
 here = os.path.abspath(os.path.dirname(__file__))